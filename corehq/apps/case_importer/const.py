@@ -8,5 +8,15 @@ MAX_CASE_IMPORTER_COLUMNS = 300
 # Special case type used to identify when doing a bulk case import
 ALL_CASE_TYPE_IMPORT = 'commcare-all-case-types'
 
+# Rows whose cases and owners are looked up together, for domains with the
+# CASE_IMPORTER_LOOKAHEAD toggle enabled
+CASE_LOOKUP_WINDOW_SIZE = 500
+
+# Threads that submit chunks of caseblocks, and chunks that may be in
+# flight at a time, for domains with the CASE_IMPORTER_PIPELINE toggle
+# enabled
+CASE_IMPORT_SUBMISSION_WORKERS = 3
+CASE_IMPORT_MAX_PENDING_CHUNKS = 6
+
 class LookupErrors(object):
     NotFound, MultipleResults = list(range(2))
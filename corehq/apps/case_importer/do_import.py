@@ -1,7 +1,10 @@
+import itertools
 import time
 import uuid
-from collections import Counter, defaultdict, namedtuple
+from collections import Counter, defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
+from django.db import connections
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
@@ -22,12 +25,15 @@ from corehq.apps.hqcase.utils import CASEBLOCK_CHUNKSIZE, submit_case_blocks
 from corehq.apps.locations.models import SQLLocation
 from corehq.apps.receiverwrapper.rate_limiter import rate_limit_submission
 from corehq.apps.users.cases import get_wrapped_owner
+from corehq.apps.users.dbaccessors import get_user_docs_by_username
 from corehq.apps.users.models import CouchUser
 from corehq.apps.users.util import format_username
 from corehq.form_processor.models import STANDARD_CHARFIELD_LENGTH
 from corehq.toggles import (
     BULK_UPLOAD_DATE_OPENED,
     CASE_IMPORT_DATA_DICTIONARY_VALIDATION,
+    CASE_IMPORTER_LOOKAHEAD,
+    CASE_IMPORTER_PIPELINE,
     DOMAIN_PERMISSIONS_MIRROR,
 )
 from corehq.util.metrics import metrics_counter, metrics_histogram
@@ -36,9 +42,14 @@ from corehq.util.soft_assert import soft_assert
 from corehq.util.timer import TimingContext
 
 from . import exceptions
-from .const import LookupErrors
+from .const import (
+    CASE_IMPORT_MAX_PENDING_CHUNKS,
+    CASE_IMPORT_SUBMISSION_WORKERS,
+    CASE_LOOKUP_WINDOW_SIZE,
+    LookupErrors,
+)
 from .extension_points import custom_case_import_operations
-from .util import EXTERNAL_ID, RESERVED_FIELDS, lookup_case
+from .util import EXTERNAL_ID, RESERVED_FIELDS, lookup_case, lookup_cases
 
 RowAndCase = namedtuple('RowAndCase', ['row', 'case'])
 ALL_LOCATIONS = 'ALL_LOCATIONS'
@@ -84,10 +95,15 @@ class _Importer(object):
         self.record_form_callback = record_form_callback
         self.results = import_results or _ImportResults()
         self.config = config
-        self.submission_handler = SubmitCaseBlockHandler(
+        if CASE_IMPORTER_PIPELINE.enabled(domain):
+            handler_class = PipelinedSubmitCaseBlockHandler
+        else:
+            handler_class = SubmitCaseBlockHandler
+        self.submission_handler = handler_class(
             domain, self.results, self.config.case_type, self.user, record_form_callback, throttle=False
         )
         self.owner_accessor = _OwnerAccessor(domain, self.user)
+        self.case_lookups = _CaseLookups(domain)
         self._unsubmitted_caseblocks = []
         self.multi_domain = multi_domain
         if CASE_IMPORT_DATA_DICTIONARY_VALIDATION.enabled(self.domain):
@@ -101,7 +117,10 @@ class _Importer(object):
         with TaskProgressManager(self.task, src="case_importer") as progress_manager:
             # context to be used by extensions to keep during import
             import_context = {}
-            for row_num, row in enumerate(spreadsheet.iter_row_dicts(), start=1):
+            rows = enumerate(spreadsheet.iter_row_dicts(), start=1)
+            if CASE_IMPORTER_LOOKAHEAD.enabled(self.domain):
+                rows = self._iter_rows_with_lookahead(rows)
+            for row_num, row in rows:
                 progress_manager.set_progress(row_num - 1, spreadsheet.max_row)
                 if row_num == 1:
                     continue  # skip first row (header row)
@@ -118,9 +137,44 @@ class _Importer(object):
                 except exceptions.CaseRowError as error:
                     self.results.add_error(row_num, error)
 
-            self.submission_handler.commit_caseblocks()
+            self.submission_handler.flush_caseblocks()
             return self.results.to_json()
 
+    def _iter_rows_with_lookahead(self, rows):
+        """
+        Yield the numbered rows, looking up the cases and owners of the
+        next CASE_LOOKUP_WINDOW_SIZE rows together whenever the cases of
+        the next row have not been looked up yet
+        """
+        window = deque(itertools.islice(rows, CASE_LOOKUP_WINDOW_SIZE))
+        prefetched_count = 0
+        while window:
+            if not prefetched_count:
+                self._prefetch(window)
+                prefetched_count = len(window)
+            yield window.popleft()
+            prefetched_count -= 1
+            window.extend(itertools.islice(rows, 1))
+
+    def _prefetch(self, rows):
+        lookups = []
+        owner_names = []
+        for row_num, raw_row in rows:
+            if row_num == 1 or self.multi_domain and self.domain != raw_row.get('domain'):
+                continue
+            try:
+                fields_to_update = self._populate_updated_fields(raw_row)
+            except (exceptions.CaseRowError, exceptions.CaseRowErrorList):
+                # the row fails again when it is imported
+                continue
+            parent_type = fields_to_update.get('parent_type', self.config.case_type)
+            lookups.append((self.config.search_field, self._parse_search_id(raw_row), self.config.case_type))
+            lookups.append(('case_id', fields_to_update.get('parent_id'), parent_type))
+            lookups.append((EXTERNAL_ID, fields_to_update.get('parent_external_id'), parent_type))
+            owner_names.append(fields_to_update.get('owner_name'))
+        self.case_lookups.prefetch(lookups)
+        self.owner_accessor.prefetch_users([name for name in owner_names if name])
+
     def import_row(self, row_num, raw_row, import_context):
         search_id = self._parse_search_id(raw_row)
         fields_to_update = self._populate_updated_fields(raw_row)
@@ -138,9 +192,10 @@ class _Importer(object):
             domain=self.domain,
             user_id=self.user.user_id,
             owner_accessor=self.owner_accessor,
+            case_lookups=self.case_lookups,
         )
         if row.relies_on_uncreated_case(self.submission_handler.uncreated_external_ids):
-            self.submission_handler.commit_caseblocks()
+            self.submission_handler.flush_caseblocks()
         if row.is_new_case and not self.config.create_new_cases:
             return
 
@@ -156,6 +211,7 @@ class _Importer(object):
         except CaseBlockError as e:
             raise exceptions.CaseGeneration(message=str(e))
 
+        self.case_lookups.discard_case(caseblock.case_id, caseblock.external_id)
         self.submission_handler.add_caseblock(RowAndCase(row_num, caseblock))
 
     def _has_custom_case_import_operations(self):
@@ -340,36 +396,48 @@ class SubmitCaseBlockHandler(object):
             self._unsubmitted_caseblocks = []
             self.uncreated_external_ids = set()
 
+    def flush_caseblocks(self):
+        """
+        Submit the unsubmitted caseblocks, and wait until all of the
+        submitted caseblocks have been processed
+        """
+        self.commit_caseblocks()
+
     def submit_and_process_caseblocks(self, caseblocks):
         if not caseblocks:
             return
         self.pre_submit_hook()
         try:
             form, cases = self.submit_case_blocks(caseblocks)
-            if form.is_error:
-                raise Exception("Form error during case import: {}".format(form.problem))
+            _check_form(form)
         except Exception:
-            notify_exception(None, "Case Importer: Uncaught failure submitting caseblocks")
-            for row_number, case in caseblocks:
-                self.results.add_error(row_number, exceptions.ImportErrorMessage())
+            self.handle_submission_failure(caseblocks)
         else:
-            if self.record_form_callback:
-                self.record_form_callback(form.form_id)
-            properties = {p for c in cases for p in c.dynamic_case_properties().keys()}
-            if self.case_type and len(properties):
-                add_inferred_export_properties.delay(
-                    'CaseImporter',
-                    self.domain,
-                    self.case_type,
-                    properties,
-                )
-            else:
-                _soft_assert = soft_assert(notify_admins=True)
-                _soft_assert(
-                    len(properties) == 0,
-                    'error adding inferred export properties in domain '
-                    '({}): {}'.format(self.domain, ", ".join(properties))
-                )
+            self.process_submission(form, cases)
+
+    def handle_submission_failure(self, caseblocks):
+        notify_exception(None, "Case Importer: Uncaught failure submitting caseblocks")
+        for row_number, case in caseblocks:
+            self.results.add_error(row_number, exceptions.ImportErrorMessage())
+
+    def process_submission(self, form, cases):
+        if self.record_form_callback:
+            self.record_form_callback(form.form_id)
+        properties = {p for c in cases for p in c.dynamic_case_properties().keys()}
+        if self.case_type and len(properties):
+            add_inferred_export_properties.delay(
+                'CaseImporter',
+                self.domain,
+                self.case_type,
+                properties,
+            )
+        else:
+            _soft_assert = soft_assert(notify_admins=True)
+            _soft_assert(
+                len(properties) == 0,
+                'error adding inferred export properties in domain '
+                '({}): {}'.format(self.domain, ", ".join(properties))
+            )
 
     def pre_submit_hook(self):
         if not self.throttle:
@@ -418,14 +486,113 @@ class SubmitCaseBlockHandler(object):
         )
 
 
+_PendingChunk = namedtuple('_PendingChunk', ['caseblocks', 'case_ids', 'external_ids', 'future'])
+
+
+class PipelinedSubmitCaseBlockHandler(SubmitCaseBlockHandler):
+    """
+    Submits chunks of caseblocks from a pool of threads, so that rows
+    are parsed and validated while earlier chunks are processed.
+
+    Chunks are submitted in order, and throttled by ``pre_submit_hook``
+    like ``SubmitCaseBlockHandler``. Chunks that update the same cases
+    as chunks in flight wait for those to be processed first.
+    ``uncreated_external_ids`` includes the external IDs of the cases
+    created by chunks in flight, so that the importer flushes them
+    before the rows that rely on them (see ``flush_caseblocks``).
+    Submission results are processed in order, in the calling thread.
+    """
+
+    def __init__(self, *args, max_workers=CASE_IMPORT_SUBMISSION_WORKERS,
+                 max_pending_chunks=CASE_IMPORT_MAX_PENDING_CHUNKS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_workers = max_workers
+        self.max_pending_chunks = max_pending_chunks
+        self._executor = None
+        # chunks in flight, in the order they were submitted
+        self._pending = deque()
+
+    def commit_caseblocks(self):
+        if not self._unsubmitted_caseblocks:
+            return
+        caseblocks = self._unsubmitted_caseblocks
+        self._unsubmitted_caseblocks = []
+        case_ids = {caseblock.case.case_id for caseblock in caseblocks}
+        self._process_done()
+        while self._pending and (
+            len(self._pending) >= self.max_pending_chunks
+            or any(case_ids & chunk.case_ids for chunk in self._pending)
+        ):
+            self._process_next()
+        self.pre_submit_hook()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='case-import')
+        future = self._executor.submit(self._submit_in_thread, caseblocks)
+        self._pending.append(
+            _PendingChunk(caseblocks, case_ids, _get_created_external_ids(caseblocks), future))
+        self._update_uncreated_external_ids()
+
+    def flush_caseblocks(self):
+        self.commit_caseblocks()
+        while self._pending:
+            self._process_next()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _submit_in_thread(self, caseblocks):
+        try:
+            return self.submit_case_blocks(caseblocks)
+        finally:
+            connections.close_all()
+
+    def _process_done(self):
+        while self._pending and self._pending[0].future.done():
+            self._process_next()
+
+    def _process_next(self):
+        chunk = self._pending.popleft()
+        try:
+            form, cases = chunk.future.result()
+            _check_form(form)
+        except Exception:
+            self.handle_submission_failure(chunk.caseblocks)
+        else:
+            self.process_submission(form, cases)
+        self.results.num_chunks += 1
+        self._update_uncreated_external_ids()
+
+    def _update_uncreated_external_ids(self):
+        self.uncreated_external_ids = _get_created_external_ids(self._unsubmitted_caseblocks)
+        for chunk in self._pending:
+            self.uncreated_external_ids.update(chunk.external_ids)
+
+
+def _check_form(form):
+    if form.is_error:
+        raise Exception("Form error during case import: {}".format(form.problem))
+
+
+def _get_created_external_ids(caseblocks):
+    return {
+        caseblock.case.external_id
+        for caseblock in caseblocks
+        if caseblock.case.create and isinstance(caseblock.case.external_id, str)
+        and caseblock.case.external_id
+    }
+
+
 class _CaseImportRow(object):
-    def __init__(self, search_id, fields_to_update, config, domain, user_id, owner_accessor):
+    def __init__(self, search_id, fields_to_update, config, domain, user_id, owner_accessor,
+                 case_lookups=None):
         self.search_id = search_id
         self.fields_to_update = fields_to_update
         self.config = config
         self.domain = domain
         self.user_id = user_id
         self.owner_accessor = owner_accessor
+        self.case_lookups = case_lookups or _CaseLookups(domain)
 
         self.case_name = fields_to_update.pop('name', None)
         self._check_case_name()
@@ -474,10 +641,9 @@ class _CaseImportRow(object):
 
     @cached_property
     def existing_case(self):
-        case, error = lookup_case(
+        case, error = self.case_lookups.lookup_case(
             self.config.search_field,
             self.search_id,
-            self.domain,
             self.config.case_type
         )
         _log_case_lookup(self.domain)
@@ -505,8 +671,8 @@ class _CaseImportRow(object):
                 ('parent_external_id', 'external_id', self.parent_external_id),
         ]:
             if search_id:
-                parent_case, error = lookup_case(
-                    search_field, search_id, self.domain, self.parent_type)
+                parent_case, error = self.case_lookups.lookup_case(
+                    search_field, search_id, self.parent_type)
                 _log_case_lookup(self.domain)
                 if parent_case:
                     self.validate_parent_column()
@@ -563,6 +729,65 @@ class _CaseImportRow(object):
         )
 
 
+class _CaseLookups(object):
+    """
+    Looks up cases like ``lookup_case``, from the results of the lookups
+    prefetched in bulk where possible.
+
+    Cases that the import creates or updates are always looked up again,
+    because their prefetched results may no longer be valid once their
+    caseblocks are submitted.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self._results = {}
+        # keys of the results by their search ID and by their case's ID
+        self._keys_by_id = defaultdict(list)
+        # case IDs and external IDs of the cases in caseblocks
+        self._discarded_ids = set()
+
+    def prefetch(self, lookups):
+        """
+        :param lookups: (search_field, search_id, case_type) tuples
+        """
+        search_ids = defaultdict(set)
+        for search_field, search_id, case_type in lookups:
+            if search_id and search_id not in self._discarded_ids:
+                search_ids[(search_field, case_type)].add(search_id)
+        self._results = {}
+        self._keys_by_id = defaultdict(list)
+        for (search_field, case_type), field_search_ids in search_ids.items():
+            results = lookup_cases(search_field, field_search_ids, self.domain, case_type)
+            for search_id, (case, error) in results.items():
+                if case is not None and case.case_id in self._discarded_ids:
+                    continue
+                key = (search_field, search_id, case_type)
+                self._results[key] = (case, error)
+                self._keys_by_id[search_id].append(key)
+                if case is not None:
+                    self._keys_by_id[case.case_id].append(key)
+
+    def discard_case(self, case_id, external_id=None):
+        """
+        Discard the prefetched results of a case whose caseblock will be
+        submitted, and do not prefetch it again
+        """
+        search_ids = {case_id}
+        if isinstance(external_id, str) and external_id:
+            search_ids.add(external_id)
+        self._discarded_ids.update(search_ids)
+        for search_id in search_ids:
+            for key in self._keys_by_id.pop(search_id, []):
+                self._results.pop(key, None)
+
+    def lookup_case(self, search_field, search_id, case_type):
+        key = (search_field, search_id, case_type)
+        if key in self._results:
+            return self._results[key]
+        return lookup_case(search_field, search_id, self.domain, case_type)
+
+
 def _log_case_lookup(domain):
     case_load_counter("case_importer", domain)
 
@@ -633,6 +858,33 @@ class _OwnerAccessor(object):
         self.user = user
         self.id_cache = {}
         self.name_cache = {}
+        # CouchUser (or None) by owner name
+        self.users_by_name = {}
+
+    def prefetch_users(self, names):
+        """Look up the users of owner names in bulk, for ``get_id_from_name``"""
+        usernames_by_name = {
+            name: self._get_username(name)
+            for name in set(names)
+            if name not in self.name_cache and name not in self.users_by_name
+        }
+        if not usernames_by_name:
+            return
+        docs_by_username = defaultdict(list)
+        for doc in get_user_docs_by_username(set(usernames_by_name.values())):
+            if doc:
+                docs_by_username[doc['username']].append(doc)
+        for name, username in usernames_by_name.items():
+            docs = docs_by_username.get(username, [])
+            if len(docs) > 1:
+                # CouchUser.get_by_username raises an error
+                continue
+            self.users_by_name[name] = CouchUser.wrap_correctly(docs[0]) if docs else None
+
+    def _get_username(self, name):
+        if '@' not in name:
+            return format_username(name, self.domain)
+        return name
 
     def get_id_from_name(self, name):
         return cached_function_call(self._get_id_from_name, name, self.name_cache)
@@ -646,11 +898,10 @@ class _OwnerAccessor(object):
         '''
 
         def get_user(name):
+            if name in self.users_by_name:
+                return self.users_by_name[name]
             try:
-                name_as_address = name
-                if '@' not in name_as_address:
-                    name_as_address = format_username(name, self.domain)
-                return CouchUser.get_by_username(name_as_address)
+                return CouchUser.get_by_username(self._get_username(name))
             except NoResultFound:
                 return None
 
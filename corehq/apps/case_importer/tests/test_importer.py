@@ -1,3 +1,4 @@
+import threading
 import uuid
 from contextlib import contextmanager
 from unittest.mock import Mock, patch
@@ -9,11 +10,18 @@ from celery import states
 from celery.exceptions import Ignore
 
 from casexml.apps.case.const import CASE_TAG_DATE_OPENED
-from casexml.apps.case.mock import CaseFactory, CaseStructure
+from casexml.apps.case.mock import CaseBlock, CaseFactory, CaseStructure
 from casexml.apps.case.tests.util import delete_all_cases
 
 from corehq.apps.case_importer import exceptions
-from corehq.apps.case_importer.do_import import _CaseImportRow, do_import
+from corehq.apps.case_importer.do_import import (
+    PipelinedSubmitCaseBlockHandler,
+    RowAndCase,
+    _CaseImportRow,
+    _CaseLookups,
+    _ImportResults,
+    do_import,
+)
 from corehq.apps.case_importer.tasks import bulk_import_async
 from corehq.apps.case_importer.tracking.models import CaseUploadRecord
 from corehq.apps.case_importer.util import (
@@ -758,6 +766,142 @@ class ImporterTest(TestCase):
         self.assertIn(exceptions.ExternalIdTooLong.title, res['errors'])
 
 
+@flag_enabled('CASE_IMPORTER_LOOKAHEAD')
+class ImporterLookaheadTest(ImporterTest):
+    """Runs the importer tests with cases looked up in bulk"""
+
+
+class TestCaseLookups(SimpleTestCase):
+
+    def setUp(self):
+        self.case_lookups = _CaseLookups('importer-test')
+        for name, target in [
+            ('lookup_cases', lambda field, search_ids, domain, case_type: {
+                search_id: (_FakeCase(f'{search_id}-case'), None) for search_id in search_ids
+            }),
+            ('lookup_case', lambda field, search_id, domain, case_type: ('live', None)),
+        ]:
+            patcher = patch(f'corehq.apps.case_importer.do_import.{name}', target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_prefetched(self):
+        self.case_lookups.prefetch([('case_id', 'abc', 'person'), ('case_id', None, 'person')])
+        case, error = self.case_lookups.lookup_case('case_id', 'abc', 'person')
+        self.assertEqual(case.case_id, 'abc-case')
+
+    def test_not_prefetched(self):
+        self.case_lookups.prefetch([('case_id', 'abc', 'person')])
+        self.assertEqual(self.case_lookups.lookup_case('case_id', 'abc', 'household'), ('live', None))
+        self.assertEqual(self.case_lookups.lookup_case('external_id', 'abc', 'person'), ('live', None))
+
+    def test_discard_case(self):
+        self.case_lookups.prefetch([
+            ('external_id', 'abc', 'person'),
+            ('external_id', 'def', 'person'),
+            ('external_id', 'ghi', 'person'),
+        ])
+        # by the case's ID, and by its external ID
+        self.case_lookups.discard_case('abc-case')
+        self.case_lookups.discard_case('new-case', 'def')
+        self.assertEqual(self.case_lookups.lookup_case('external_id', 'abc', 'person'), ('live', None))
+        self.assertEqual(self.case_lookups.lookup_case('external_id', 'def', 'person'), ('live', None))
+        case, error = self.case_lookups.lookup_case('external_id', 'ghi', 'person')
+        self.assertEqual(case.case_id, 'ghi-case')
+
+        # discarded cases are not prefetched again
+        self.case_lookups.prefetch([('external_id', 'abc', 'person'), ('external_id', 'def', 'person')])
+        self.assertEqual(self.case_lookups.lookup_case('external_id', 'abc', 'person'), ('live', None))
+        self.assertEqual(self.case_lookups.lookup_case('external_id', 'def', 'person'), ('live', None))
+
+
+class _FakeCase(object):
+
+    def __init__(self, case_id):
+        self.case_id = case_id
+
+
+@flag_enabled('CASE_IMPORTER_PIPELINE')
+class ImporterPipelineTest(ImporterTest):
+    """Runs the importer tests with caseblocks submitted concurrently"""
+
+
+class TestPipelinedSubmitCaseBlockHandler(SimpleTestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.submitted = []
+        self.fail = set()
+        self.handler = PipelinedSubmitCaseBlockHandler(
+            'importer-test', _ImportResults(), 'person', Mock(), max_workers=2)
+        patcher = patch.object(self.handler, '_submit_case_blocks', self._submit_case_blocks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _submit_case_blocks(self, caseblocks):
+        with self.lock:
+            self.submitted.append([caseblock.row for caseblock in caseblocks])
+        if caseblocks[0].row in self.fail:
+            raise Exception("submission failed")
+        return Mock(is_error=False), []
+
+    def _add(self, row, case_id, **kwargs):
+        self.handler.add_caseblock(RowAndCase(row, CaseBlock(case_id, **kwargs)))
+
+    def test_chunks_are_submitted_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def submit_case_blocks(caseblocks):
+            # fails with BrokenBarrierError unless 2 chunks are in flight
+            barrier.wait()
+            return Mock(is_error=False), []
+
+        with patch.object(self.handler, '_submit_case_blocks', submit_case_blocks):
+            self._add(1, 'case1')
+            self.handler.commit_caseblocks()
+            self._add(2, 'case2')
+            self.handler.flush_caseblocks()
+        self.assertEqual(self.handler.results.to_json()['num_chunks'], 2)
+        self.assertFalse(self.handler.results.to_json()['errors'])
+
+    def test_chunks_updating_the_same_case_wait(self):
+        first_done = threading.Event()
+
+        def submit_case_blocks(caseblocks):
+            if caseblocks[0].row == 1:
+                first_done.wait(timeout=0.1)
+                first_done.set()
+            else:
+                self.assertTrue(first_done.is_set())
+            return Mock(is_error=False), []
+
+        with patch.object(self.handler, '_submit_case_blocks', submit_case_blocks):
+            self._add(1, 'case1')
+            self.handler.commit_caseblocks()
+            self._add(2, 'case1')
+            self.handler.flush_caseblocks()
+        self.assertFalse(self.handler.results.to_json()['errors'])
+
+    def test_failed_chunk(self):
+        self.fail = {2}
+        for row in range(1, 4):
+            self._add(row, f'case{row}')
+            self.handler.commit_caseblocks()
+        self.handler.flush_caseblocks()
+        results = self.handler.results.to_json()
+        self.assertEqual(results['num_chunks'], 3)
+        [error] = results['errors'].values()
+        self.assertEqual(error[None]['rows'], [2])
+
+    def test_uncreated_external_ids_in_flight(self):
+        self.handler.uncreated_external_ids.add('ext1')
+        self._add(1, 'case1', create=True, external_id='ext1')
+        self.handler.commit_caseblocks()
+        self.assertEqual(self.handler.uncreated_external_ids, {'ext1'})
+        self.handler.flush_caseblocks()
+        self.assertEqual(self.handler.uncreated_external_ids, set())
+
+
 def make_worksheet_wrapper(*rows):
     return WorksheetWrapper(make_worksheet(rows))
 
@@ -1,5 +1,5 @@
 import json
-from collections import OrderedDict, namedtuple
+from collections import OrderedDict, defaultdict, namedtuple
 from contextlib import contextmanager
 
 from celery import states
@@ -17,6 +17,7 @@ from corehq.apps.case_importer.exceptions import (
 )
 from corehq.form_processor.exceptions import CaseNotFound
 from corehq.form_processor.models import CommCareCase
+from corehq.sql_db.util import get_db_aliases_for_partitioned_query
 from corehq.util.workbook_reading import (
     SpreadsheetFileEncrypted,
     SpreadsheetFileInvalidError,
@@ -161,6 +162,39 @@ def lookup_case(search_field, search_id, domain, case_type):
     return (None, LookupErrors.NotFound)
 
 
+def lookup_cases(search_field, search_ids, domain, case_type):
+    """
+    Find the cases of many search IDs at once, like ``lookup_case``.
+
+    Returns a dict of the ``lookup_case`` result of each search ID.
+    """
+    search_ids = list(set(search_ids))
+    cases_by_search_id = defaultdict(list)
+    if search_field == 'case_id':
+        for case in CommCareCase.objects.get_cases(search_ids, domain):
+            if case.domain == domain and case.type == case_type:
+                cases_by_search_id[case.case_id].append(case)
+    elif search_field == EXTERNAL_ID:
+        for db_name in get_db_aliases_for_partitioned_query():
+            queryset = CommCareCase.objects.using(db_name).filter(
+                domain=domain, external_id__in=search_ids, deleted=False)
+            if case_type:
+                queryset = queryset.filter(type=case_type)
+            for case in queryset:
+                cases_by_search_id[case.external_id].append(case)
+
+    results = {}
+    for search_id in search_ids:
+        cases = cases_by_search_id.get(search_id)
+        if not cases:
+            results[search_id] = (None, LookupErrors.NotFound)
+        elif len(cases) > 1:
+            results[search_id] = (None, LookupErrors.MultipleResults)
+        else:
+            results[search_id] = (cases[0], None)
+    return results
+
+
 def open_spreadsheet_download_ref(filename):
     """
     open a spreadsheet download ref just to test there are no errors opening it
@@ -0,0 +1,118 @@
+import threading
+from datetime import datetime
+
+from django.core.management import BaseCommand
+
+from pillowtop.feed.interface import ChangeMeta
+
+from corehq.apps.change_feed import data_sources, topics
+from corehq.apps.change_feed.producer import ChangeProducer
+
+
+class Command(BaseCommand):
+    help = """
+        Compare publishing the changes of a form submission one at a time
+        with publishing them as a batch, against a stub broker that
+        acknowledges messages after a fixed round trip time.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--changes', type=int, default=30,
+                            help='Number of changes per submission')
+        parser.add_argument('--submissions', type=int, default=20)
+        parser.add_argument('--latency-ms', type=float, default=2,
+                            help='Simulated broker round trip time in milliseconds')
+
+    def handle(self, changes, submissions, latency_ms, **options):
+        stub = StubKafkaProducer(latency_ms / 1000)
+        producer = ChangeProducer()
+        producer._producer = stub
+        batch = [(topics.CASE_SQL, _change_meta(i)) for i in range(changes)]
+        try:
+            with Timer('one at a time'):
+                for i in range(submissions):
+                    for topic, change_meta in batch:
+                        producer.send_change(topic, change_meta)
+            with Timer('batched'):
+                for i in range(submissions):
+                    producer.send_changes(batch)
+        finally:
+            stub.close()
+        print("{} messages acknowledged".format(stub.acknowledged))
+
+
+def _change_meta(i):
+    return ChangeMeta(
+        document_id='case-{}'.format(i),
+        data_source_type=data_sources.SOURCE_SQL,
+        data_source_name=data_sources.CASE_SQL,
+        document_type='CommCareCase',
+        domain='benchmark',
+    )
+
+
+class StubKafkaProducer(object):
+    """Stands in for ``KafkaProducer``: every ``latency`` seconds, all
+    messages sent since the previous round trip are acknowledged, like a
+    broker receiving batched produce requests"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.acknowledged = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def send(self, topic, value, key=None):
+        future = StubFuture()
+        with self._lock:
+            self._pending.append(future)
+        return future
+
+    def flush(self, timeout=None):
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.get(timeout)
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._closed.wait(self.latency):
+            with self._lock:
+                pending, self._pending = self._pending, []
+            for future in pending:
+                future.success()
+            self.acknowledged += len(pending)
+
+
+class StubFuture(object):
+
+    def __init__(self):
+        self._done = threading.Event()
+
+    def success(self):
+        self._done.set()
+
+    def get(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError
+
+    def add_errback(self, fn, *args, **kwargs):
+        pass
+
+
+class Timer(object):
+
+    def __init__(self, label):
+        self.label = label
+
+    def __enter__(self):
+        self.start = datetime.utcnow()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        print("{}: {}".format(self.label, datetime.utcnow() - self.start))
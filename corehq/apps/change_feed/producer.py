@@ -14,6 +14,9 @@ CHANGE_PRE_SEND = 'PRE-SEND'
 CHANGE_ERROR = 'ERROR'
 CHANGE_SENT = 'SENT'
 
+# seconds to wait for a batch of changes to be acknowledged
+BATCH_FLUSH_TIMEOUT = 30
+
 
 class ChangeProducer(object):
 
@@ -37,11 +40,8 @@ class ChangeProducer(object):
         return self._producer
 
     def send_change(self, topic, change_meta):
-        message = change_meta.to_json()
-        message_json_dump = json.dumps(message).encode('utf-8')
-        change_meta._transaction_id = uuid.uuid4().hex
         try:
-            future = self.producer.send(topic, message_json_dump, key=change_meta.document_id)
+            future = self._send(topic, change_meta)
             if self.auto_flush:
                 future.get()
         except Exception as e:
@@ -51,6 +51,39 @@ class ChangeProducer(object):
             on_error = partial(_on_error, change_meta)
             future.add_errback(on_error)
 
+    def send_changes(self, changes, timeout=BATCH_FLUSH_TIMEOUT):
+        """Send a batch of changes, waiting for them together
+
+        With ``auto_flush`` enabled each change sent by ``send_change`` waits
+        for the broker to acknowledge it before the next change is sent.
+        Here all changes are sent before a single flush waits for all
+        acknowledgements (at most ``timeout`` seconds), after which any
+        change that was not acknowledged raises ``KafkaPublishingError``
+        as ``send_change`` would.
+
+        :param changes: list of ``(topic, change_meta)`` tuples
+        """
+        futures = []
+        try:
+            for topic, change_meta in changes:
+                future = self._send(topic, change_meta)
+                if not self.auto_flush:
+                    future.add_errback(partial(_on_error, change_meta))
+                futures.append(future)
+            if self.auto_flush:
+                self.flush(timeout=timeout)
+                for future in futures:
+                    # raises the send error, or a timeout if still pending
+                    future.get(timeout=0)
+        except Exception as e:
+            raise KafkaPublishingError(e)
+
+    def _send(self, topic, change_meta):
+        message = change_meta.to_json()
+        message_json_dump = json.dumps(message).encode('utf-8')
+        change_meta._transaction_id = uuid.uuid4().hex
+        return self.producer.send(topic, message_json_dump, key=change_meta.document_id)
+
     def flush(self, timeout=None):
         self.producer.flush(timeout=timeout)
 
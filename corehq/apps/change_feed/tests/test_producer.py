@@ -0,0 +1,80 @@
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase
+
+from pillowtop.feed.interface import ChangeMeta
+
+from corehq.apps.change_feed import data_sources, topics
+from corehq.apps.change_feed.producer import ChangeProducer
+from corehq.form_processor.exceptions import KafkaPublishingError
+
+
+def _change_meta(doc_id):
+    return ChangeMeta(
+        document_id=doc_id,
+        data_source_type=data_sources.SOURCE_SQL,
+        data_source_name=data_sources.CASE_SQL,
+        document_type='CommCareCase',
+        domain='producer-test',
+    )
+
+
+class SendChangesTest(SimpleTestCase):
+
+    def setUp(self):
+        self.kafka_producer = Mock()
+        self.futures = []
+
+        def send(topic, value, key=None):
+            future = Mock()
+            self.futures.append(future)
+            return future
+
+        self.kafka_producer.send.side_effect = send
+        self.producer = ChangeProducer()
+        self.producer._producer = self.kafka_producer
+        self.changes = [(topics.CASE_SQL, _change_meta('a')), (topics.LEDGER, _change_meta('b'))]
+
+    def test_send_changes_flushes_once(self):
+        self.producer.send_changes(self.changes, timeout=5)
+        self.assertEqual(
+            [c[0][0] for c in self.kafka_producer.send.call_args_list],
+            [topics.CASE_SQL, topics.LEDGER],
+        )
+        self.kafka_producer.flush.assert_called_once_with(timeout=5)
+        for future in self.futures:
+            future.get.assert_called_once_with(timeout=0)
+            # failures are raised, so they are not also reported async
+            future.add_errback.assert_not_called()
+
+    def test_failed_change_raises(self):
+        def send(topic, value, key=None):
+            future = Mock()
+            if key == 'b':
+                future.get.side_effect = Exception('not acknowledged')
+            return future
+
+        self.kafka_producer.send.side_effect = send
+        with self.assertRaises(KafkaPublishingError):
+            self.producer.send_changes(self.changes)
+
+    def test_flush_timeout_raises(self):
+        self.kafka_producer.flush.side_effect = Exception('timed out')
+        with self.assertRaises(KafkaPublishingError):
+            self.producer.send_changes(self.changes)
+
+    def test_no_flush_without_auto_flush(self):
+        self.producer.auto_flush = False
+        self.producer.send_changes(self.changes)
+        self.kafka_producer.flush.assert_not_called()
+        for future in self.futures:
+            future.get.assert_not_called()
+            future.add_errback.assert_called_once()
+
+    def test_error_callback(self):
+        self.producer.auto_flush = False
+        self.producer.send_changes(self.changes)
+        errback = self.futures[1].add_errback.call_args[0][0]
+        with patch('corehq.apps.change_feed.producer.notify_exception') as notify:
+            errback(Exception('broker error'))
+        self.assertEqual(notify.call_args[1]['details']['document_id'], 'b')
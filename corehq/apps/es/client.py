@@ -2,7 +2,12 @@
 import copy
 import json
 import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from enum import Enum
+from queue import Full, Queue
+from threading import Event
 from functools import cached_property
 
 from django.conf import settings
@@ -20,7 +25,7 @@ from corehq.util.es.elasticsearch import (
     TransportError,
     bulk,
 )
-from corehq.util.metrics import metrics_counter
+from corehq.util.metrics import metrics_counter, metrics_gauge, metrics_histogram
 
 from .const import (
     INDEX_CONF_REINDEX,
@@ -652,6 +657,32 @@ class ElasticDocumentAdapter(BaseAdapter):
         except ElasticsearchException as e:
             raise ESError(e)
 
+    def sliced_scroll(self, query, slices, scroll=SCROLL_KEEPALIVE, size=None, max_restarts=3):
+        """Perform a scrolling search split in ``slices`` slices which are
+        scrolled concurrently, yielding each doc (in no particular order) until
+        all slices are exhausted.
+
+        Sliced scrolls require Elasticsearch 5 or later. On older versions, or
+        when ``slices`` is less than two, this is equivalent to ``scroll()``.
+
+        :param query: ``dict`` raw search query.
+        :param slices: ``int`` number of slices (and concurrent scrolls). Each
+                       one uses a connection from the client's pool, which has
+                       10 connections per host.
+        :param scroll: ``str`` time value specifying how long the Elastic
+                       cluster should keep the search contexts alive.
+        :param size: ``int`` scroll size (number of documents per "scroll"
+                     page of each slice)
+        :param max_restarts: ``int`` number of times a slice whose scroll
+                             fails is scrolled again from the start, skipping
+                             the docs that were already yielded.
+        :yields: ``dict`` documents
+        """
+        if slices < 2 or self.elastic_major_version < 5:
+            yield from self.scroll(query, scroll=scroll, size=size)
+            return
+        yield from _SlicedScroll(self, query, slices, scroll, size, max_restarts)
+
     def _scroll(self, query, scroll, size):
         """Perform one or more scroll requests to completely exhaust a scrolling
         search context.
@@ -846,6 +877,24 @@ class ElasticDocumentAdapter(BaseAdapter):
             raise_on_error=raise_errors,
         )
 
+    def adaptive_bulk(self, actions, refresh=False, raise_errors=True, **indexer_kw):
+        """Process bulk actions with an ``AdaptiveBulkIndexer``, which sizes
+        the bulk requests by their serialized bytes and observed latency,
+        sends several requests concurrently and retries the items rejected by
+        a busy node.
+
+        :param actions: iterable of ``BulkActionItem`` instances
+        :param refresh: ``bool`` refresh the effected shards to make this
+                        operation visible to search
+        :param raise_errors: whether or not exceptions should be raised if bulk
+            actions fail.
+        :param indexer_kw: extra parameters passed verbatim to
+            ``AdaptiveBulkIndexer``.
+        :returns: ``(success_count, errors)`` tuple, like the ``bulk()`` method
+        """
+        indexer = AdaptiveBulkIndexer(self, refresh=refresh, **indexer_kw)
+        return indexer.run(actions, raise_errors)
+
     def bulk_index(self, docs, **bulk_kw):
         """Convenience method for bulk indexing many documents without the
         BulkActionItem boilerplate.
@@ -1055,6 +1104,324 @@ class BulkActionItem:
         return f"<{self.__class__.__name__} op_type={self.op_type.name}, {doc_info}>"
 
 
+class AdaptiveBulkIndexer:
+    """Index bulk actions in requests sized by their serialized bytes.
+
+    The target request size starts at ``initial_bytes`` and adapts to the
+    observed request latency: it is doubled while requests complete faster
+    than ``target_latency`` and halved when they are slower (or when
+    Elasticsearch rejects a request as too large or too busy). Up to
+    ``max_in_flight`` requests are sent concurrently over the client's
+    connection pool, which keeps its connections open between requests.
+
+    Items of a bulk response that fail with a retryable status (the node
+    was too busy to process them) are sent again in a later request, up
+    to ``max_retries`` times. All other failures are reported as errors in
+    the same format as the ``bulk()`` helper function.
+
+    Actions on the same document are never in flight concurrently, so they
+    are applied in the order they were provided.
+    """
+
+    RETRY_STATUSES = frozenset([429, 503])
+    TOO_LARGE_STATUS = 413
+
+    def __init__(self, adapter, *, refresh=False, initial_bytes=1024 * 1024,
+                 min_bytes=64 * 1024, max_bytes=16 * 1024 * 1024, max_actions=5000,
+                 target_latency=1.0, max_in_flight=4, max_retries=3, retry_backoff=0.5):
+        # The client's connection pool holds 10 connections per host by default.
+        assert 0 < max_in_flight <= 10, max_in_flight
+        assert min_bytes <= initial_bytes <= max_bytes, (min_bytes, initial_bytes, max_bytes)
+        self.adapter = adapter
+        self.refresh = refresh
+        self.target_bytes = initial_bytes
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.max_actions = max_actions
+        self.target_latency = target_latency
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.success_count = 0
+        self.errors = []
+        self._serializer = adapter._es.transport.serializer
+        self._retries = deque()
+        self._next_item = None
+        self._in_flight_ids = set()
+        self._metric_tags = {"index": adapter.canonical_name or adapter.index_name}
+
+    def run(self, actions, raise_errors=True):
+        """Index ``actions``, returning the same ``(success_count, errors)``
+        tuple as the ``ElasticDocumentAdapter.bulk()`` method.
+
+        :param actions: iterable of ``BulkActionItem`` instances
+        :param raise_errors: raise ``BulkIndexError`` if any action fails
+        """
+        items = (self._render_item(action) for action in actions)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            while True:
+                batch = self._next_batch(items)
+                if batch:
+                    future = executor.submit(self._send, batch)
+                    in_flight[future] = batch
+                if not in_flight:
+                    break
+                if not batch or len(in_flight) >= self.max_in_flight:
+                    # wait for a request to complete before building the next batch
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._process_result(in_flight.pop(future), future, raise_errors)
+        if raise_errors and self.errors:
+            # raise the same as elasticsearch-py does
+            raise BulkIndexError(f"{len(self.errors)} document(s) failed to index.", self.errors)
+        return self.success_count, self.errors
+
+    def _render_item(self, action):
+        rendered = self.adapter._render_bulk_action(action)
+        op_type = rendered["_op_type"]
+        meta = {op_type: {key: rendered[key] for key in ("_index", "_type", "_id")}}
+        lines = [self._serializer.dumps(meta)]
+        if "_source" in rendered:
+            lines.append(self._serializer.dumps(rendered["_source"]))
+        body = "".join(f"{line}\n" for line in lines).encode("utf-8")
+        return _BulkItem(rendered, body)
+
+    def _next_batch(self, items):
+        """Return the next batch of items to send. The batch is empty if
+        the next item must wait for the requests in flight to complete.
+        """
+        batch = []
+        size = 0
+        batch_ids = set()
+
+        def add(item):
+            nonlocal size
+            batch.append(item)
+            batch_ids.add(item.doc_key)
+            size += len(item.body)
+
+        def is_full():
+            return len(batch) >= self.max_actions or size >= self.target_bytes
+
+        while self._retries and not is_full():
+            item = self._retries[0]
+            if item.doc_key in self._in_flight_ids or item.doc_key in batch_ids:
+                break
+            add(self._retries.popleft())
+        while not self._retries and not is_full():
+            if self._next_item is None:
+                self._next_item = next(items, None)
+                if self._next_item is None:
+                    break
+            item = self._next_item
+            if item.doc_key in self._in_flight_ids or item.doc_key in batch_ids:
+                break
+            if batch and size + len(item.body) > self.target_bytes:
+                break
+            self._next_item = None
+            add(item)
+        self._in_flight_ids.update(batch_ids)
+        return batch
+
+    def _send(self, batch):
+        attempt = max(item.attempt for item in batch)
+        if attempt:
+            time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+        body = b"".join(item.body for item in batch)
+        start = time.monotonic()
+        result = self.adapter._es.bulk(body=body, refresh=self.adapter._refresh_value(self.refresh))
+        return result, len(body), time.monotonic() - start
+
+    def _process_result(self, batch, future, raise_errors):
+        self._in_flight_ids.difference_update(item.doc_key for item in batch)
+        try:
+            result, size, latency = future.result()
+        except TransportError as exc:
+            self._process_request_error(batch, exc, raise_errors)
+            return
+        except Exception as exc:
+            if raise_errors:
+                raise
+            self._fail(batch, exc)
+            return
+        metrics_counter("commcare.es.adaptive_bulk.requests", tags=self._metric_tags)
+        metrics_histogram(
+            "commcare.es.adaptive_bulk.request_bytes", size,
+            bucket_tag="size", buckets=(64, 256, 1024, 4096, 16384), bucket_unit="KiB",
+            tags=self._metric_tags,
+        )
+        metrics_histogram(
+            "commcare.es.adaptive_bulk.latency", latency * 1000,
+            bucket_tag="duration", buckets=(100, 500, 1000, 5000, 30000), bucket_unit="ms",
+            tags=self._metric_tags,
+        )
+        retry = []
+        for item, response in zip(batch, result["items"]):
+            op_type, info = next(iter(response.items()))
+            status = info.get("status", 500)
+            if 200 <= status < 300:
+                self.success_count += 1
+            elif status in self.RETRY_STATUSES and item.attempt < self.max_retries:
+                retry.append(item)
+            else:
+                if item.op_type == "index":
+                    info = dict(info, data=item.rendered["_source"])
+                self.errors.append({op_type: info})
+        if retry:
+            self._retry(retry)
+            self._resize(self.target_bytes / 2)
+        elif latency > self.target_latency:
+            self._resize(self.target_bytes / 2)
+        elif latency < self.target_latency / 2 and size >= self.target_bytes * 0.75:
+            # only grow when the batch was limited by the target size
+            self._resize(self.target_bytes * 2)
+
+    def _process_request_error(self, batch, exc, raise_errors):
+        status = exc.status_code if isinstance(exc.status_code, int) else None
+        if status == self.TOO_LARGE_STATUS and len(batch) > 1:
+            self._resize(self.target_bytes / 2)
+            metrics_counter("commcare.es.adaptive_bulk.too_large", tags=self._metric_tags)
+            # send again as smaller requests, without counting an attempt
+            self.max_actions = max(1, min(self.max_actions, len(batch) // 2))
+            self._retries.extendleft(reversed(batch))
+        elif status in self.RETRY_STATUSES and all(item.attempt < self.max_retries for item in batch):
+            self._resize(self.target_bytes / 2)
+            self._retry(batch)
+        elif raise_errors:
+            raise exc
+        else:
+            self._fail(batch, exc)
+
+    def _retry(self, items):
+        metrics_counter("commcare.es.adaptive_bulk.retried_items", len(items), tags=self._metric_tags)
+        for item in items:
+            item.attempt += 1
+        # retried items are sent before any new items
+        self._retries.extend(items)
+
+    def _fail(self, batch, exc):
+        # same format as the errors of the ``bulk()`` helper function
+        for item in batch:
+            info = {key: item.rendered[key] for key in ("_index", "_type", "_id")}
+            info.update(error=str(exc), exception=exc, status=getattr(exc, "status_code", None))
+            if item.op_type == "index":
+                info["data"] = item.rendered["_source"]
+            self.errors.append({item.op_type: info})
+
+    def _resize(self, target_bytes):
+        self.target_bytes = int(min(self.max_bytes, max(self.min_bytes, target_bytes)))
+        metrics_gauge("commcare.es.adaptive_bulk.target_bytes", self.target_bytes,
+                      tags=self._metric_tags)
+
+
+class _BulkItem:
+
+    def __init__(self, rendered, body):
+        self.rendered = rendered
+        self.body = body
+        self.attempt = 0
+
+    @property
+    def op_type(self):
+        return self.rendered["_op_type"]
+
+    @property
+    def doc_key(self):
+        return self.rendered["_index"], self.rendered["_id"]
+
+
+class _SlicedScroll:
+    """Iterate the hits of a scroll query split in ``slices`` slices, each
+    scrolled by its own thread. Pages of hits are passed to the consumer
+    through a bounded queue as they arrive, so hits are yielded in no
+    particular order.
+
+    A slice whose scroll fails (e.g. the scroll context expired because the
+    consumer was slow) is scrolled again from the start, skipping the hits it
+    already yielded. The slice a document belongs to only depends on its ID,
+    so the new scroll has the same documents (apart from index changes made
+    since the first one). This keeps the IDs of the yielded documents in
+    memory.
+    """
+
+    PAGES_PER_SLICE = 2
+
+    _HITS, _DONE, _ERROR = "hits", "done", "error"
+
+    def __init__(self, adapter, query, slices, scroll, size, max_restarts):
+        self.adapter = adapter
+        self.query = query
+        self.slices = slices
+        self.scroll = scroll
+        self.size = size
+        self.max_restarts = max_restarts
+
+    def __iter__(self):
+        queue = Queue(maxsize=self.PAGES_PER_SLICE * self.slices)
+        stop = Event()
+        with ThreadPoolExecutor(max_workers=self.slices) as executor:
+            for slice_id in range(self.slices):
+                executor.submit(self._scroll_slice, slice_id, queue, stop)
+            try:
+                finished = 0
+                while finished < self.slices:
+                    kind, value = queue.get()
+                    if kind == self._HITS:
+                        yield from value
+                    elif kind == self._DONE:
+                        finished += 1
+                    else:
+                        raise value
+            finally:
+                stop.set()
+
+    def _scroll_slice(self, slice_id, queue, stop):
+        query = dict(self.query, slice={"id": slice_id, "max": self.slices})
+        yielded_ids = set()
+        restarts = 0
+        try:
+            while True:
+                results = self.adapter._scroll(query, self.scroll, self.size)
+                try:
+                    for result in results:
+                        self.adapter._report_and_fail_on_shard_failures(result)
+                        self.adapter._fix_hits_in_result(result)
+                        hits = [hit for hit in result["hits"]["hits"] if hit["_id"] not in yielded_ids]
+                        yielded_ids.update(hit["_id"] for hit in hits)
+                        if not self._put(queue, stop, (self._HITS, hits)):
+                            return
+                    break
+                except ElasticsearchException:
+                    if restarts >= self.max_restarts:
+                        raise
+                    restarts += 1
+                    log.warning("Restarting scroll of slice %s of %s", slice_id, self.adapter, exc_info=True)
+                    metrics_counter("commcare.es.sliced_scroll.restarts",
+                                    tags={"index": self.adapter.canonical_name or self.adapter.index_name})
+                finally:
+                    results.close()
+            self._put(queue, stop, (self._DONE, None))
+        except ElasticsearchException as exc:
+            self._put(queue, stop, (self._ERROR, ESError(exc)))
+        except Exception as exc:
+            self._put(queue, stop, (self._ERROR, exc))
+
+    @staticmethod
+    def _put(queue, stop, item):
+        """Put ``item`` on the queue unless the consumer stopped iterating
+
+        :returns: ``False`` if the consumer stopped iterating
+        """
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+
 class ElasticMultiplexAdapter(BaseAdapter):
 
     def __init__(self, primary_adapter, secondary_adapter):
@@ -1118,6 +1485,9 @@ class ElasticMultiplexAdapter(BaseAdapter):
     def scroll(self, *args, **kw):
         return self.primary.scroll(*args, **kw)
 
+    def sliced_scroll(self, *args, **kw):
+        return self.primary.sliced_scroll(*args, **kw)
+
     def search(self, *args, **kw):
         return self.primary.search(*args, **kw)
 
@@ -1174,6 +1544,13 @@ class ElasticMultiplexAdapter(BaseAdapter):
             success_count += (len(chunk) - len(deduped_errs))
         return success_count, errors
 
+    def adaptive_bulk(self, actions, refresh=False, raise_errors=True, **indexer_kw):
+        """Apply bulk actions with the ``bulk()`` method, which pairs the
+        actions on the primary and secondary (and creates tombstones) in a way
+        that requests sized by the ``AdaptiveBulkIndexer`` would not preserve.
+        """
+        return self.bulk(actions, refresh=refresh, raise_errors=raise_errors)
+
     @staticmethod
     def _parse_bulk_error(error):
         """Returns tuple ``(doc_id, index_name)`` for the provided bulk action
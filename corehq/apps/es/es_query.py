@@ -226,6 +226,21 @@ class ESQuery(object):
         for result in self.adapter.scroll(raw_query):
             yield ESQuerySet.normalize_result(self, result)
 
+    def sliced_scroll(self, slices):
+        """
+        Like ``scroll()``, but the query is split in ``slices`` slices that
+        are scrolled concurrently. Documents are yielded in no particular order.
+        """
+        if self.uses_aggregations():
+            raise InvalidQueryError(
+                "aggregation scroll queries will yield invalid hits if the "
+                "scroll requires more than one request."
+            )
+        raw_query = self.raw_query
+        raw_query["size"] = SCROLL_SIZE if self._size is None else self._size
+        for result in self.adapter.sliced_scroll(raw_query, slices):
+            yield ESQuerySet.normalize_result(self, result)
+
     @property
     def _filters(self):
         return self.es_query['query']['bool']['filter']
@@ -515,6 +530,19 @@ class ESQuery(object):
                     yield from self.adapter.iter_docs(doc_ids)
         return ScanResult(self.count(), iter_export_docs())
 
+    def sliced_scroll_and_iter_docs(self, slices):
+        """Returns a ``ScanResult`` for all matched documents, fetched by
+        ``sliced_scroll()``.
+
+        An alternative to ``scroll_ids_to_disk_and_iter_docs()`` for very large
+        queries: the documents are fetched in a single pass by concurrent
+        scrolls, and a slice whose scroll context expires is scrolled again
+        (skipping the documents it already yielded) rather than failing.
+
+        The same caveat about the ``count`` property applies.
+        """
+        return ScanResult(self.count(), self.sliced_scroll(slices))
+
 
 class ScanResult(object):
 
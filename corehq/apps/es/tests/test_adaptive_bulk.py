@@ -0,0 +1,137 @@
+import json
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase
+
+from corehq.util.es.elasticsearch import BulkIndexError, TransportError
+
+from ..client import AdaptiveBulkIndexer, BulkActionItem
+from ..utils import ElasticJSONSerializer
+from .utils import TestDoc, TestDocumentAdapter
+
+
+class StubBulkClient:
+    """Parses the bulk request bodies and responds with the status returned
+    by ``get_status(op_type, doc_id, attempt)`` for each item"""
+
+    def __init__(self, get_status=None):
+        self.get_status = get_status or (lambda op_type, doc_id, attempt: 200)
+        self.requests = []
+        self.transport = Mock(serializer=ElasticJSONSerializer())
+
+    def bulk(self, body, refresh):
+        lines = body.decode("utf-8").splitlines()
+        actions = []
+        while lines:
+            (op_type, meta), = json.loads(lines.pop(0)).items()
+            if op_type == "index":
+                lines.pop(0)
+            actions.append((op_type, meta["_id"]))
+        previous = [action for request in self.requests for action in request]
+        self.requests.append(actions)
+        items = []
+        for op_type, doc_id in actions:
+            status = self.get_status(op_type, doc_id, previous.count((op_type, doc_id)))
+            if isinstance(status, Exception):
+                raise status
+            item = {"_index": "adaptive-bulk", "_type": "test_doc", "_id": doc_id, "status": status}
+            if status >= 300:
+                item["error"] = f"status {status}"
+            items.append({op_type: item})
+        return {"took": 1, "errors": any(i["status"] >= 300 for i in items), "items": items}
+
+
+class TestAdaptiveBulkIndexer(SimpleTestCase):
+
+    def setUp(self):
+        self.adapter = TestDocumentAdapter("adaptive-bulk", "test_doc")
+        self.client = self.adapter._es = StubBulkClient()
+        patcher = patch("corehq.apps.es.client.time.sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _index_actions(self, count):
+        return [BulkActionItem.index(TestDoc(str(i), "value")) for i in range(count)]
+
+    def _indexer(self, **kw):
+        # room for two index actions
+        kw.setdefault("initial_bytes", 2 * len(b"".join(self._render_lines(self._index_actions(1)[0]))))
+        kw.setdefault("min_bytes", 1)
+        kw.setdefault("max_in_flight", 1)
+        kw.setdefault("target_latency", 60)
+        return AdaptiveBulkIndexer(self.adapter, **kw)
+
+    def _render_lines(self, action):
+        rendered = self.adapter._render_bulk_action(action)
+        meta = {"index": {key: rendered[key] for key in ("_index", "_type", "_id")}}
+        return [json.dumps(meta).encode("utf-8") + b"\n", json.dumps(rendered["_source"]).encode("utf-8") + b"\n"]
+
+    def test_batches_by_size(self):
+        indexer = self._indexer(max_bytes=10 ** 6)
+        initial_bytes = indexer.target_bytes
+        self.assertEqual(indexer.run(self._index_actions(6)), (6, []))
+        # the first batch is full and fast, so the next batches are larger
+        self.assertEqual([len(r) for r in self.client.requests], [2, 4])
+        self.assertEqual(indexer.target_bytes, initial_bytes * 4)
+
+    def test_slow_requests_shrink_batches(self):
+        indexer = self._indexer(target_latency=0)
+        initial_bytes = indexer.target_bytes
+        indexer.run(self._index_actions(4))
+        self.assertEqual([len(r) for r in self.client.requests], [2, 1, 1])
+        self.assertLess(indexer.target_bytes, initial_bytes // 4)
+
+    def test_retries_only_failed_items(self):
+        self.client.get_status = lambda op_type, doc_id, attempt: 429 if doc_id == "1" and not attempt else 200
+        indexer = self._indexer(max_actions=3, initial_bytes=10 ** 6)
+        self.assertEqual(indexer.run(self._index_actions(3)), (3, []))
+        self.assertEqual(self.client.requests, [
+            [("index", "0"), ("index", "1"), ("index", "2")],
+            [("index", "1")],
+        ])
+
+    def test_retry_limit(self):
+        self.client.get_status = lambda op_type, doc_id, attempt: 503 if doc_id == "1" else 200
+        indexer = self._indexer(max_retries=2)
+        success_count, errors = indexer.run(self._index_actions(2), raise_errors=False)
+        self.assertEqual(success_count, 1)
+        self.assertEqual([e["index"]["_id"] for e in errors], ["1"])
+        self.assertEqual(len(self.client.requests), 3)
+
+    def test_failed_items_raise(self):
+        self.client.get_status = lambda op_type, doc_id, attempt: 400 if doc_id == "1" else 200
+        with self.assertRaises(BulkIndexError) as context:
+            self._indexer().run(self._index_actions(3))
+        error, = context.exception.errors
+        self.assertEqual(error["index"]["_id"], "1")
+        self.assertEqual(error["index"]["data"], {"value": "value", "entropy": 5})
+
+    def test_too_large_request_is_split(self):
+        def get_status(op_type, doc_id, attempt):
+            if len(self.client.requests[-1]) > 1:
+                return TransportError(413, "too large")
+            return 200
+        self.client.get_status = get_status
+        indexer = self._indexer(initial_bytes=10 ** 6)
+        self.assertEqual(indexer.run(self._index_actions(2)), (2, []))
+        self.assertEqual([len(r) for r in self.client.requests], [2, 1, 1])
+
+    def test_request_error_reported_for_each_item(self):
+        self.client.get_status = lambda op_type, doc_id, attempt: TransportError(500, "boom")
+        success_count, errors = self._indexer().run(self._index_actions(3), raise_errors=False)
+        self.assertEqual(success_count, 0)
+        self.assertEqual([e["index"]["_id"] for e in errors], ["0", "1", "2"])
+        self.assertEqual({e["index"]["status"] for e in errors}, {500})
+
+    def test_actions_on_same_document_are_not_concurrent(self):
+        doc = TestDoc("1", "value")
+        actions = [BulkActionItem.index(doc), BulkActionItem.index(TestDoc("2", "v")), BulkActionItem.delete(doc)]
+        indexer = self._indexer(initial_bytes=10 ** 6, max_in_flight=4)
+        self.assertEqual(indexer.run(actions), (3, []))
+        self.assertEqual(self.client.requests, [
+            [("index", "1"), ("index", "2")],
+            [("delete", "1")],
+        ])
+
+    def test_adapter_method(self):
+        self.assertEqual(self.adapter.adaptive_bulk(self._index_actions(3)), (3, []))
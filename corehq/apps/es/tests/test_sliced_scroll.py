@@ -0,0 +1,86 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from corehq.util.es.elasticsearch import NotFoundError, TransportError
+
+from ..exceptions import ESError
+from .utils import TestDocumentAdapter
+
+
+def _result(doc_ids):
+    return {
+        "_shards": {"successful": 1, "failed": 0, "total": 1},
+        "hits": {"hits": [{"_id": doc_id, "_source": {"value": doc_id}} for doc_id in doc_ids]},
+    }
+
+
+class TestSlicedScroll(SimpleTestCase):
+
+    def setUp(self):
+        self.adapter = TestDocumentAdapter("sliced-scroll", "test_doc")
+        self.adapter.elastic_version = (5, 6, 16)
+        self.pages_by_slice = {
+            0: [["a", "b"], ["c"]],
+            1: [["d"], ["e", "f"]],
+            2: [],
+        }
+        # pages of a slice's scrolls after the first one
+        self.restart_pages_by_slice = {}
+        self.queries = []
+        self.closed = []
+        patcher = patch.object(TestDocumentAdapter, "_scroll", lambda adapter, *args: self._scroll(*args))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _scroll(self, query, scroll, size):
+        self.queries.append(query)
+        slice_id = query["slice"]["id"]
+        pages = self.pages_by_slice[slice_id]
+        if slice_id in self.restart_pages_by_slice:
+            self.pages_by_slice[slice_id] = self.restart_pages_by_slice.pop(slice_id)
+        try:
+            for page in pages:
+                if isinstance(page, Exception):
+                    raise page
+                yield _result(page)
+        finally:
+            self.closed.append(slice_id)
+
+    def _doc_ids(self, slices=3, **kw):
+        return sorted(doc["_id"] for doc in self.adapter.sliced_scroll({"query": {}}, slices, **kw))
+
+    def test_sliced_scroll(self):
+        self.assertEqual(self._doc_ids(), ["a", "b", "c", "d", "e", "f"])
+        self.assertEqual(
+            sorted(query["slice"]["id"] for query in self.queries),
+            [0, 1, 2],
+        )
+        self.assertEqual({query["slice"]["max"] for query in self.queries}, {3})
+        self.assertEqual(sorted(self.closed), [0, 1, 2])
+
+    def test_restarted_slice_skips_yielded_docs(self):
+        self.pages_by_slice[0] = [["a", "b"], NotFoundError(404, "search_context_missing_exception")]
+        self.restart_pages_by_slice[0] = [["a", "b"], ["c"]]
+        self.assertEqual(self._doc_ids(), ["a", "b", "c", "d", "e", "f"])
+        self.assertEqual([query["slice"]["id"] for query in self.queries].count(0), 2)
+
+    def test_slice_error_after_restarts(self):
+        self.pages_by_slice[1] = [TransportError(500, "error")]
+        with self.assertRaises(ESError):
+            self._doc_ids(max_restarts=2)
+        self.assertEqual([query["slice"]["id"] for query in self.queries].count(1), 3)
+
+    def test_stop_iterating(self):
+        self.pages_by_slice = {slice_id: [[f"{slice_id}-{i}"] for i in range(100)] for slice_id in range(3)}
+        docs = self.adapter.sliced_scroll({"query": {}}, 3)
+        next(docs)
+        docs.close()
+        self.assertEqual(sorted(self.closed), [0, 1, 2])
+
+    def test_not_sliced_before_elasticsearch_5(self):
+        self.adapter.elastic_version = (2, 4, 6)
+        with patch.object(self.adapter, "scroll", return_value=iter([{"_id": "a"}])) as scroll:
+            self.assertEqual(self._doc_ids(), ["a"])
+        scroll.assert_called_once()
+        self.assertEqual(self.queries, [])
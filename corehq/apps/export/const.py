@@ -2,6 +2,8 @@
 Some of these constants correspond to constants set in corehq/apps/export/static/export/js/const.js
 so if changing a value, ensure that both places reflect the change
 """
+from datetime import timedelta
+
 from couchexport.deid import deid_date, deid_ID
 
 from corehq.apps.export.transforms import (
@@ -101,6 +103,17 @@ SMS_EXPORT = 'sms'
 MAX_NORMAL_EXPORT_SIZE = 100000
 MAX_DAILY_EXPORT_SIZE = 1000000
 CASE_SCROLL_SIZE = 10000
+EXPORT_SCROLL_SLICES = 4
+# number of rows extracted before they are handed to the export writer
+EXPORT_WRITE_BATCH_SIZE = 1000
+
+# Incremental rebuilds of daily saved exports (see corehq.apps.export.incremental)
+# Documents modified this long before the last rebuild started are fetched again
+INCREMENTAL_EXPORT_OVERLAP = timedelta(hours=2)
+# Daily saved exports are rebuilt in full at least this often
+INCREMENTAL_EXPORT_MAX_AGE = timedelta(days=7)
+# ... and when more than this fraction of their documents were modified
+INCREMENTAL_EXPORT_MAX_CHANGED_RATIO = 0.3
 
 # When a question is missing completely from a form/case this should be the value
 MISSING_VALUE = '---'
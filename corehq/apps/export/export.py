@@ -14,15 +14,25 @@ from couchexport.models import Format
 from dimagi.utils.logging import notify_exception
 from soil import DownloadBase
 
-from corehq.apps.export.const import MAX_NORMAL_EXPORT_SIZE, MAX_DAILY_EXPORT_SIZE
+from corehq.apps.export.const import (
+    EXPORT_SCROLL_SLICES,
+    EXPORT_WRITE_BATCH_SIZE,
+    MAX_DAILY_EXPORT_SIZE,
+    MAX_NORMAL_EXPORT_SIZE,
+)
 from corehq.apps.export.dbaccessors import get_properly_wrapped_export_instance
+from corehq.apps.export.extraction import ExportExtractionPlan
 from corehq.apps.export.models.new import (
+    INCREMENTAL_EXPORT_STATE_ATTACHMENT_NAME,
     CaseExportInstance,
     FormExportInstance,
     SMSExportInstance,
-    ALL_CASE_TYPE_TABLE
 )
-from corehq.toggles import PAGINATED_EXPORTS
+from corehq.toggles import (
+    EXPORT_SLICED_SCROLL,
+    INCREMENTAL_SAVED_EXPORTS,
+    PAGINATED_EXPORTS,
+)
 from corehq.util.metrics.load_counters import load_counter
 from corehq.util.files import TransientTempfile, safe_filename
 from soil.progress import TaskProgressManager
@@ -76,11 +86,16 @@ class _ExportWriter(object):
             # open the ExportWriter
             headers = []
             table_titles = {}
+            table_datatypes = {}
             for instance_index, instance in enumerate(export_instances):
                 headers += [
                     (t, (t.get_headers(split_columns=instance.split_multiselects),))
                     for t in instance.selected_tables
                 ]
+                table_datatypes.update(
+                    (t, t.get_datatypes(split_columns=instance.split_multiselects))
+                    for t in instance.selected_tables
+                )
                 for table_index, table in enumerate(instance.selected_tables):
                     sheet_name = table.label or "Sheet{}".format(table_index + 1)
                     # If it's a bulk export and the sheet has the same name as another sheet,
@@ -91,7 +106,13 @@ class _ExportWriter(object):
                             sheet_name
                         )
                     table_titles[table] = sheet_name
-            self.writer.open(headers, file, table_titles=table_titles, archive_basepath=name)
+            self.writer.open(
+                headers,
+                file,
+                table_titles=table_titles,
+                archive_basepath=name,
+                table_datatypes=table_datatypes,
+            )
             try:
                 yield
             finally:
@@ -104,13 +125,25 @@ class _ExportWriter(object):
         :param table: A TableConfiguration
         :param row: An ExportRow
         """
+        return self.write_rows(table, [row])
+
+    def write_rows(self, table, rows):
+        """
+        Write the given rows to the given table of the export.
+        _Writer must be opened first.
+        :param table: A TableConfiguration
+        :param rows: A list of ExportRows
+        """
         return self.writer.write([
-            (table, [FormattedRow(
-                data=row.data,
-                hyperlink_column_indices=row.hyperlink_column_indices,
-                skip_excel_formatting=row.skip_excel_formatting
-                if hasattr(row, 'skip_excel_formatting') else ()
-            )])
+            (table, [
+                FormattedRow(
+                    data=row.data,
+                    hyperlink_column_indices=row.hyperlink_column_indices,
+                    skip_excel_formatting=row.skip_excel_formatting
+                    if hasattr(row, 'skip_excel_formatting') else ()
+                )
+                for row in rows
+            ])
         ])
 
     def get_preview(self):
@@ -137,6 +170,7 @@ class _PaginatedExportWriter(object):
 
         self.name = self._get_name(export_instances)
         self.headers = self._get_headers(export_instances)
+        self.datatypes = self._get_datatypes(export_instances)
         self.table_names = self._get_table_names(export_instances)
 
         with open(self.path, 'wb') as file_handle:
@@ -144,7 +178,8 @@ class _PaginatedExportWriter(object):
                 self._get_paginated_headers().items(),
                 file_handle,
                 table_titles=self._get_paginated_table_titles(),
-                archive_basepath=self.name
+                archive_basepath=self.name,
+                table_datatypes=self._get_paginated_datatypes(),
             )
             try:
                 yield
@@ -178,6 +213,19 @@ class _PaginatedExportWriter(object):
 
         return headers
 
+    def _get_datatypes(self, export_instances):
+        '''
+        Returns a dictionary that maps all TableConfigurations in the list of ExportInstances to
+        the data types of their columns (see _get_headers)
+        '''
+        datatypes = {}
+        for instance in export_instances:
+            for table in instance.selected_tables:
+                datatypes[table] = table.get_datatypes(
+                    split_columns=instance.split_multiselects
+                )
+        return datatypes
+
     def _get_table_names(self, export_instances):
         '''
         Returns a dictionary that maps all TableConfigurations in the list of ExportInstances to a
@@ -225,6 +273,9 @@ class _PaginatedExportWriter(object):
         '''
         return {self._paged_table_index(table): (headers,) for table, headers in self.headers.items()}
 
+    def _get_paginated_datatypes(self):
+        return {self._paged_table_index(table): datatypes for table, datatypes in self.datatypes.items()}
+
     def _get_paginated_table_titles(self):
         '''
         Maps the table titles to tables titles with their page count
@@ -253,16 +304,33 @@ class _PaginatedExportWriter(object):
         :param table: A TableConfiguration
         :param row: An ExportRow
         """
-        if self.rows_written[table] >= MAX_NORMAL_EXPORT_SIZE * (self.pages[table] + 1):
-            self.pages[table] += 1
-            self.writer.add_table(
-                self._paged_table_index(table),
-                self._get_paginated_headers()[self._paged_table_index(table)][0],
-                table_title=self._get_paginated_table_titles()[self._paged_table_index(table)],
-            )
+        self.write_rows(table, [row])
 
-        self.writer.write([(self._paged_table_index(table), [FormattedRow(data=row.data)])])
-        self.rows_written[table] += 1
+    def write_rows(self, table, rows):
+        """
+        Write the given rows to the given table of the export, opening new
+        tables as each one reaches the maximum number of rows.
+        :param table: A TableConfiguration
+        :param rows: A list of ExportRows
+        """
+        while rows:
+            page_end = MAX_NORMAL_EXPORT_SIZE * (self.pages[table] + 1)
+            if self.rows_written[table] >= page_end:
+                self.pages[table] += 1
+                self.writer.add_table(
+                    self._paged_table_index(table),
+                    self._get_paginated_headers()[self._paged_table_index(table)][0],
+                    table_title=self._get_paginated_table_titles()[self._paged_table_index(table)],
+                    datatypes=self.datatypes[table],
+                )
+                continue
+
+            page_size = page_end - self.rows_written[table]
+            page_rows, rows = rows[:page_size], rows[page_size:]
+            self.writer.write([
+                (self._paged_table_index(table), [FormattedRow(data=row.data) for row in page_rows])
+            ])
+            self.rows_written[table] += len(page_rows)
 
 
 def get_export_writer(export_instances, temp_path, allow_pagination=True):
@@ -320,8 +388,10 @@ def get_export_file(export_instances, es_filters, temp_path,
 
 
 def get_export_documents(export_instance, filters):
-    # Pull doc ids from elasticsearch and stream to disk
     query = get_export_query(export_instance, filters)
+    if EXPORT_SLICED_SCROLL.enabled(export_instance.domain):
+        return query.sliced_scroll_and_iter_docs(EXPORT_SCROLL_SLICES)
+    # Pull doc ids from elasticsearch and stream to disk
     return query.scroll_ids_to_disk_and_iter_docs()
 
 
@@ -364,44 +434,44 @@ def write_export_instance(writer, export_instance, documents,
         total_bytes = 0
         total_rows = 0
         track_load = load_counter(export_instance.type, "export", export_instance.domain)
+        plan = ExportExtractionPlan(export_instance, include_hyperlinks=include_hyperlinks)
+        # rows not written yet, for each table of the plan
+        pending_rows = [[] for table_plan in plan.tables]
+        pending_row_count = 0
+
+        def write_pending_rows():
+            for table_plan, rows in zip(plan.tables, pending_rows):
+                if rows:
+                    writer.write_rows(table_plan.table, rows)
+                    rows.clear()
 
         for row_number, doc in enumerate(documents):
             total_bytes += sys.getsizeof(doc)
-            for table in export_instance.selected_tables:
-                # This is for bulk exports on all case types.
-                # Skip over the tables that this doc shouldn't go into.
-                path_names = [path.name for path in table.path]
-                if ALL_CASE_TYPE_TABLE in table.path and doc['type'] not in path_names:
-                    continue
-
+            for table_plan, table_rows in zip(plan.tables, pending_rows):
                 try:
-                    rows = table.get_rows(
-                        doc,
-                        row_number,
-                        split_columns=export_instance.split_multiselects,
-                        transform_dates=export_instance.transform_dates,
-                        include_hyperlinks=include_hyperlinks,
-                    )
+                    rows = table_plan.get_rows(doc, row_number)
                 except Exception as e:
                     notify_exception(None, "Error exporting doc", details={
                         'domain': export_instance.domain,
                         'export_instance_id': export_instance.get_id,
-                        'export_table': table.label,
+                        'export_table': table_plan.table.label,
                         'doc_id': doc.get('_id'),
                     })
                     e.sentry_capture = False
                     raise
 
-                for row in rows:
-                    # It might be bad to write one row at a time from a performance perspective.
-                    # Regardless, we should handle the batching of rows in the _Writer class, not here.
-                    writer.write(table, row)
-
+                table_rows.extend(rows)
+                pending_row_count += len(rows)
                 total_rows += len(rows)
 
+            if pending_row_count >= EXPORT_WRITE_BATCH_SIZE:
+                write_pending_rows()
+                pending_row_count = 0
+
             track_load()
             if progress_tracker:
                 progress_manager.set_progress(row_number + 1, documents.count)
+        write_pending_rows()
 
     end = _time_in_milliseconds()
     tags = {'format': writer.format}
@@ -457,6 +527,11 @@ def rebuild_export(export_instance, progress_tracker):
             f"{export_instance.name} is {export_size} rows. Exceeds the limit "
             f"of {MAX_DAILY_EXPORT_SIZE} rows.")
     es_filters = [f.to_es_filter() for f in filters]
+    if INCREMENTAL_SAVED_EXPORTS.enabled(export_instance.domain):
+        from corehq.apps.export.incremental import supports_incremental_rebuild
+        if supports_incremental_rebuild(export_instance):
+            _rebuild_export_incrementally(export_instance, es_filters, progress_tracker, include_hyperlinks)
+            return
     with TransientTempfile() as temp_path:
         export_file = get_export_file([export_instance], es_filters, temp_path,
                                       progress_tracker,
@@ -465,9 +540,26 @@ def rebuild_export(export_instance, progress_tracker):
             save_export_payload(export_instance, payload)
 
 
-def save_export_payload(export, payload):
+def _rebuild_export_incrementally(export_instance, es_filters, progress_tracker, include_hyperlinks):
+    from corehq.apps.export.incremental import get_incremental_export_file
+
+    start = _time_in_milliseconds()
+    with TransientTempfile() as temp_path, TransientTempfile() as state_path:
+        export_file = get_incremental_export_file(
+            export_instance, es_filters, temp_path, state_path,
+            progress_tracker=progress_tracker,
+            include_hyperlinks=include_hyperlinks,
+        )
+        with export_file as payload, open(state_path, 'rb') as incremental_state:
+            save_export_payload(export_instance, payload, incremental_state=incremental_state)
+    _record_export_duration(_time_in_milliseconds() - start, export_instance)
+
+
+def save_export_payload(export, payload, incremental_state=None):
     """
     Save the contents of an export file to disk for later retrieval.
+    :param incremental_state: The state of the export for its next
+        incremental rebuild (see corehq.apps.export.incremental)
     """
     if export.last_accessed is None:
         export.last_accessed = datetime.datetime.utcnow()
@@ -476,6 +568,8 @@ def save_export_payload(export, payload):
     try:
         with export.atomic_blobs():
             export.set_payload(payload)
+            if incremental_state is not None:
+                export.put_attachment(incremental_state, INCREMENTAL_EXPORT_STATE_ATTACHMENT_NAME)
     except ResourceConflict:
         # task was executed concurrently, so let first to finish win and abort the rest
         pass
@@ -0,0 +1,179 @@
+"""
+Extraction of export rows from documents, compiled once per export.
+
+``TableConfiguration.get_rows`` looks up each column's value by walking the
+column's path from the root of the document (or repeat group). Exports can
+have hundreds of columns, most of them sharing the first steps of their
+path, so an ``ExportExtractionPlan`` compiles the paths of each table's
+selected columns into a trie and walks every (sub-)document once to look up
+the values of all of the table's columns. The value of each column is then
+passed to the column's own ``get_value``, so that the rows are the same as
+the ones ``TableConfiguration.get_rows`` produces.
+"""
+from corehq.apps.export.models import (
+    ALL_CASE_TYPE_TABLE,
+    ExportColumn,
+    ExportRow,
+    MultiMediaExportColumn,
+    RowNumberColumn,
+    SplitExportColumn,
+    SplitGPSExportColumn,
+    SplitUserDefinedExportColumn,
+)
+
+# Column types whose value is looked up at their item's path. Subclasses
+# are not included: they may look up their value differently.
+PATH_COLUMN_TYPES = frozenset([
+    ExportColumn,
+    MultiMediaExportColumn,
+    SplitExportColumn,
+    SplitGPSExportColumn,
+    SplitUserDefinedExportColumn,
+])
+
+
+class ExportExtractionPlan(object):
+    """The extraction plans of the selected tables of an export instance"""
+
+    def __init__(self, export_instance, include_hyperlinks=True):
+        self.tables = [
+            TableExtractionPlan(
+                table,
+                split_columns=export_instance.split_multiselects,
+                transform_dates=export_instance.transform_dates,
+                include_hyperlinks=include_hyperlinks,
+            )
+            for table in export_instance.selected_tables
+        ]
+
+
+class TableExtractionPlan(object):
+    """Gets the rows of a table for each document of an export"""
+
+    def __init__(self, table, split_columns=False, transform_dates=False, include_hyperlinks=True):
+        self.table = table
+        self.split_columns = split_columns
+        self.transform_dates = transform_dates
+        self.columns = table.selected_columns
+        if ALL_CASE_TYPE_TABLE in table.path:
+            # bulk case export: only docs of the table's case type go into the table
+            self.case_types = {path.name for path in table.path}
+            self.base_path = []
+        else:
+            self.case_types = None
+            self.base_path = table.path
+        if include_hyperlinks:
+            self.hyperlink_column_indices = table.get_hyperlink_column_indices(split_columns)
+        else:
+            self.hyperlink_column_indices = []
+
+        self.trie = _PathTrie()
+        # True for the columns that are given the value at their path
+        self.uses_path_value = []
+        for index, column in enumerate(self.columns):
+            path = self._get_path(column)
+            self.uses_path_value.append(path is not None)
+            if path:
+                self.trie.add(path, index)
+
+    def _get_path(self, column):
+        """Get the names of the path from the table's sub-documents to the
+        value of the column, or ``None`` if the column looks up its value
+        itself
+        """
+        if type(column) not in PATH_COLUMN_TYPES:
+            return None
+        item_path = column.item.path
+        if self.base_path != item_path[:len(self.base_path)]:
+            # get_value() fails with the appropriate error
+            return None
+        return [node.name for node in item_path[len(self.base_path):]]
+
+    def get_rows(self, document, row_number):
+        """
+        Return the ExportRows of the table for the given document, like
+        ``TableConfiguration.get_rows``.
+        """
+        if self.case_types is not None and document['type'] not in self.case_types:
+            return []
+
+        document_id = document.get('_id')
+        sub_documents = self.table._get_sub_documents(document, row_number, document_id=document_id)
+        domain = document.get('domain')
+
+        assert domain is not None, 'Form or Case must be associated with domain'
+        assert document_id is not None, 'Form or Case must have an id'
+
+        rows = []
+        for doc, row_index in sub_documents:
+            path_values = [None] * len(self.columns)
+            self.trie.walk(doc, path_values)
+
+            row_data = []
+            skip_excel_formatting = []
+            for index, col in enumerate(self.columns):
+                if self.uses_path_value[index]:
+                    val = col.get_value(
+                        domain,
+                        document_id,
+                        doc,
+                        self.base_path,
+                        row_index=row_index,
+                        split_column=self.split_columns,
+                        transform_dates=self.transform_dates,
+                        path_value=path_values[index],
+                    )
+                else:
+                    val = col.get_value(
+                        domain,
+                        document_id,
+                        doc,
+                        self.base_path,
+                        row_index=row_index,
+                        split_column=self.split_columns,
+                        transform_dates=self.transform_dates,
+                    )
+
+                col_index = len(row_data)
+                if isinstance(val, list):
+                    row_data.extend(val)
+                else:
+                    row_data.append(val)
+                # we never want to auto-format RowNumberColumn
+                # (always treat as text)
+                if isinstance(col, RowNumberColumn):
+                    skip_excel_formatting.extend(range(col_index, len(row_data)))
+
+            rows.append(ExportRow(
+                data=row_data,
+                hyperlink_column_indices=self.hyperlink_column_indices,
+                skip_excel_formatting=skip_excel_formatting,
+            ))
+        return rows
+
+
+class _PathTrie(object):
+    """Paths (lists of names) of values in nested dicts, with the indexes
+    of the values to set for each path"""
+
+    def __init__(self):
+        self.children = {}
+        self.indexes = []
+
+    def add(self, path, index):
+        node = self
+        for name in path:
+            node = node.children.setdefault(name, _PathTrie())
+        node.indexes.append(index)
+
+    def walk(self, value, values):
+        """Set ``values[index]`` to the value at the path of each index,
+        leaving it unchanged where the path does not exist in ``value``
+        (like ``NestedDictGetter``, a path only traverses dicts)
+        """
+        for index in self.indexes:
+            values[index] = value
+        if self.children and isinstance(value, dict):
+            for name, child in self.children.items():
+                if name in value:
+                    child.walk(value[name], values)
@@ -0,0 +1,335 @@
+"""
+Incremental rebuilds of daily saved exports.
+
+With the INCREMENTAL_SAVED_EXPORTS toggle enabled, a rebuild of a daily
+saved export also saves the rows it exported for each document, and the
+time the rebuild started (its "high-water mark"), as an attachment of the
+export instance. The next rebuild only fetches the documents modified
+since the high-water mark (less INCREMENTAL_EXPORT_OVERLAP, to allow for
+documents that were indexed late), and merges their rows with the saved
+rows of the other documents:
+
+- documents that no longer match the export's filters are dropped,
+- unchanged documents keep their rows, and so their row numbers,
+- new documents are given new row numbers.
+
+The IDs of all of the documents matching the export's filters are still
+streamed from Elasticsearch, but the documents themselves are not fetched.
+
+Saved rows are only valid for the configuration of the export they were
+exported with, so a full rebuild is done instead if the export's tables,
+columns or settings changed, if many of its documents changed, or if the
+last full rebuild is older than INCREMENTAL_EXPORT_MAX_AGE.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import shutil
+
+from dimagi.utils.logging import notify_exception
+from dimagi.utils.parsing import json_format_datetime, string_to_utc_datetime
+from dimagi.utils.web import json_handler
+
+from corehq.apps.es import filters
+from corehq.apps.export.const import (
+    EXPORT_WRITE_BATCH_SIZE,
+    INCREMENTAL_EXPORT_MAX_AGE,
+    INCREMENTAL_EXPORT_MAX_CHANGED_RATIO,
+    INCREMENTAL_EXPORT_OVERLAP,
+)
+from corehq.apps.export.export import (
+    ExportFile,
+    get_export_documents,
+    get_export_query,
+    get_export_writer,
+)
+from corehq.apps.export.extraction import ExportExtractionPlan
+from corehq.apps.export.models import (
+    CaseExportInstance,
+    ExportRow,
+    FormExportInstance,
+    StockExportColumn,
+)
+from corehq.apps.export.models.new import INCREMENTAL_EXPORT_STATE_ATTACHMENT_NAME
+from corehq.util.files import TransientTempfile
+from corehq.util.metrics import metrics_counter
+from soil.progress import TaskProgressManager
+
+# Bump to discard the saved state of all exports
+STATE_VERSION = 1
+
+
+def supports_incremental_rebuild(export_instance):
+    """
+    Incremental rebuilds need the ``server_modified_on`` of the export's
+    documents, and every value of its rows to come from the row's document
+    """
+    if not isinstance(export_instance, (FormExportInstance, CaseExportInstance)):
+        return False
+    return not any(
+        isinstance(column, StockExportColumn)
+        for table in export_instance.selected_tables
+        for column in table.selected_columns
+    )
+
+
+def get_incremental_export_file(export_instance, es_filters, temp_path, state_path,
+                                progress_tracker=None, include_hyperlinks=True):
+    """
+    Write the export file of the given daily saved export to ``temp_path``,
+    reusing the rows saved by its last rebuild where possible, and write
+    the state to save for the next rebuild to ``state_path``.
+
+    :return: an ExportFile
+    """
+    builder = _IncrementalExportBuilder(export_instance, es_filters, include_hyperlinks)
+    with TransientTempfile() as previous_state_path:
+        previous = builder.load_previous_state(previous_state_path)
+        writer = get_export_writer([export_instance], temp_path)
+        with writer.open([export_instance]):
+            if previous is None:
+                builder.write_full(writer, state_path, progress_tracker)
+            else:
+                builder.write_incremental(writer, state_path, previous, previous_state_path, progress_tracker)
+    return ExportFile(writer.path, writer.format)
+
+
+class _IncrementalExportBuilder(object):
+
+    def __init__(self, export_instance, es_filters, include_hyperlinks):
+        self.export_instance = export_instance
+        self.es_filters = es_filters
+        self.plan = ExportExtractionPlan(export_instance, include_hyperlinks=include_hyperlinks)
+        self.fingerprint = get_export_fingerprint(export_instance)
+        self.started_on = datetime.datetime.utcnow()
+
+    def load_previous_state(self, path):
+        """
+        Copy the state saved by the last rebuild to ``path``, and return its
+        header, or None if the export must be rebuilt in full.
+        """
+        if INCREMENTAL_EXPORT_STATE_ATTACHMENT_NAME not in self.export_instance.blobs:
+            return self._full_rebuild("no_state")
+        with open(path, 'wb') as file:
+            attachment = self.export_instance.fetch_attachment(
+                INCREMENTAL_EXPORT_STATE_ATTACHMENT_NAME, stream=True)
+            with attachment:
+                shutil.copyfileobj(attachment, file)
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            header = json.loads(file.readline())
+        if header.get('version') != STATE_VERSION:
+            return self._full_rebuild("version")
+        if header['fingerprint'] != self.fingerprint:
+            return self._full_rebuild("configuration")
+        full_rebuild_on = string_to_utc_datetime(header['full_rebuild_on'])
+        if self.started_on - full_rebuild_on > INCREMENTAL_EXPORT_MAX_AGE:
+            return self._full_rebuild("max_age")
+        return header
+
+    def _full_rebuild(self, reason):
+        metrics_counter('commcare.export.incremental.full_rebuild', tags={'reason': reason})
+        return None
+
+    def write_full(self, writer, state_path, progress_tracker):
+        documents = get_export_documents(self.export_instance, self.es_filters)
+        with _RowBuffer(writer, self.plan) as rows, \
+                _StateWriter(state_path, self._header(full_rebuild_on=self.started_on)) as state, \
+                TaskProgressManager(progress_tracker, src="export") as progress_manager:
+            for row_number, doc in enumerate(documents):
+                doc_rows = self._get_rows(doc, row_number)
+                rows.add(doc_rows)
+                state.write_document(doc['_id'], row_number, doc_rows)
+                if progress_tracker:
+                    progress_manager.set_progress(row_number + 1, documents.count)
+
+    def write_incremental(self, writer, state_path, previous, previous_state_path, progress_tracker):
+        query = get_export_query(self.export_instance, self.es_filters)
+        high_water_mark = string_to_utc_datetime(previous['high_water_mark']) - INCREMENTAL_EXPORT_OVERLAP
+        modified_query = query.filter(filters.date_range('server_modified_on', gte=high_water_mark))
+        modified_count = modified_query.count()
+        if modified_count > query.count() * INCREMENTAL_EXPORT_MAX_CHANGED_RATIO:
+            self._full_rebuild("changed_ratio")
+            return self.write_full(writer, state_path, progress_tracker)
+        metrics_counter('commcare.export.incremental.rebuild')
+        metrics_counter('commcare.export.incremental.modified_docs', modified_count)
+
+        row_numbers = {
+            doc_id: row_number for doc_id, row_number in _iter_saved_row_numbers(previous_state_path)
+        }
+        # the numbers of documents that were removed may be reused
+        next_row_number = max(row_numbers.values(), default=-1) + 1
+        changed_rows = {}
+
+        def add_changed_document(doc):
+            nonlocal next_row_number
+            row_number = row_numbers.get(doc['_id'])
+            if row_number is None:
+                row_number = next_row_number
+                next_row_number += 1
+            changed_rows[doc['_id']] = (row_number, self._get_rows(doc, row_number))
+
+        with TaskProgressManager(progress_tracker, src="export") as progress_manager:
+            for index, doc in enumerate(modified_query.scroll_ids_to_disk_and_iter_docs()):
+                add_changed_document(doc)
+                if progress_tracker:
+                    progress_manager.set_progress(index + 1, modified_count)
+
+        # Stream the ids of the documents that are in the export now, moving
+        # the saved documents that are still in the export to
+        # ``current_row_numbers`` rather than keeping a set of all of the ids
+        current_row_numbers = {}
+        # documents that are in the export, but were not modified after they
+        # were exported nor exported before (e.g. they were indexed late)
+        missing_ids = []
+        for doc_id in query.scroll_ids():
+            if doc_id in row_numbers:
+                current_row_numbers[doc_id] = row_numbers.pop(doc_id)
+            elif doc_id not in changed_rows:
+                missing_ids.append(doc_id)
+        row_numbers = current_row_numbers
+        if missing_ids:
+            metrics_counter('commcare.export.incremental.missing_docs', len(missing_ids))
+            for doc in query.adapter.iter_docs(missing_ids):
+                add_changed_document(doc)
+
+        header = self._header(full_rebuild_on=string_to_utc_datetime(previous['full_rebuild_on']))
+        with _RowBuffer(writer, self.plan) as rows, _StateWriter(state_path, header) as state:
+            for doc_id, row_number, doc_rows in _iter_saved_documents(previous_state_path, self.plan):
+                if doc_id in changed_rows:
+                    row_number, doc_rows = changed_rows.pop(doc_id)
+                elif doc_id not in row_numbers:
+                    # no longer in the export
+                    continue
+                rows.add(doc_rows)
+                state.write_document(doc_id, row_number, doc_rows)
+            # new documents
+            for doc_id, (row_number, doc_rows) in changed_rows.items():
+                rows.add(doc_rows)
+                state.write_document(doc_id, row_number, doc_rows)
+
+    def _get_rows(self, doc, row_number):
+        """Return the rows of each table of the plan for the given document"""
+        rows = []
+        for table_plan in self.plan.tables:
+            try:
+                rows.append(table_plan.get_rows(doc, row_number))
+            except Exception as e:
+                notify_exception(None, "Error exporting doc", details={
+                    'domain': self.export_instance.domain,
+                    'export_instance_id': self.export_instance.get_id,
+                    'export_table': table_plan.table.label,
+                    'doc_id': doc.get('_id'),
+                })
+                e.sentry_capture = False
+                raise
+        return rows
+
+    def _header(self, full_rebuild_on):
+        return {
+            'version': STATE_VERSION,
+            'fingerprint': self.fingerprint,
+            'high_water_mark': json_format_datetime(self.started_on),
+            'full_rebuild_on': json_format_datetime(full_rebuild_on),
+        }
+
+
+def get_export_fingerprint(export_instance):
+    """
+    Return a hash of the configuration of the export that its rows depend on
+    """
+    configuration = {
+        'tables': [table.to_json() for table in export_instance.selected_tables],
+        'split_multiselects': export_instance.split_multiselects,
+        'transform_dates': export_instance.transform_dates,
+    }
+    return hashlib.sha1(json.dumps(configuration, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class _RowBuffer(object):
+    """Collects the rows of the tables of an export and writes them to the
+    export writer in batches"""
+
+    def __init__(self, writer, plan):
+        self.writer = writer
+        self.plan = plan
+        self.rows = [[] for table_plan in plan.tables]
+        self.row_count = 0
+
+    def add(self, doc_rows):
+        for table_rows, rows in zip(self.rows, doc_rows):
+            table_rows.extend(rows)
+            self.row_count += len(rows)
+        if self.row_count >= EXPORT_WRITE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        for table_plan, rows in zip(self.plan.tables, self.rows):
+            if rows:
+                self.writer.write_rows(table_plan.table, rows)
+                rows.clear()
+        self.row_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+
+
+class _StateWriter(object):
+    """
+    Writes the state of an incremental export: a gzipped file with a JSON
+    header line, then a line for each document of the export with its id,
+    its row number and the JSON data of its rows:
+
+        <doc_id>\t<row_number>\t[[[<data>, <skip_excel_formatting>], ...], ...]
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+
+    def __enter__(self):
+        self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+        self._file.write(json.dumps(self.header) + '\n')
+        return self
+
+    def write_document(self, doc_id, row_number, doc_rows):
+        rows = [
+            [[row.data, list(row.skip_excel_formatting)] for row in table_rows]
+            for table_rows in doc_rows
+        ]
+        self._file.write('{}\t{}\t{}\n'.format(doc_id, row_number, json.dumps(rows, default=json_handler)))
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._file.close()
+
+
+def _iter_saved_lines(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        file.readline()  # header
+        for line in file:
+            yield line.rstrip('\n').split('\t', 2)
+
+
+def _iter_saved_row_numbers(path):
+    for doc_id, row_number, rows in _iter_saved_lines(path):
+        yield doc_id, int(row_number)
+
+
+def _iter_saved_documents(path, plan):
+    for doc_id, row_number, rows in _iter_saved_lines(path):
+        doc_rows = [
+            [
+                ExportRow(
+                    data=data,
+                    hyperlink_column_indices=table_plan.hyperlink_column_indices,
+                    skip_excel_formatting=skip_excel_formatting,
+                )
+                for data, skip_excel_formatting in table_rows
+            ]
+            for table_plan, table_rows in zip(plan.tables, json.loads(rows))
+        ]
+        yield doc_id, int(row_number), doc_rows
@@ -104,6 +104,13 @@ from corehq.apps.reports.models import HQUserType
 from corehq.apps.userreports.app_manager.data_source_meta import (
     get_form_indicator_data_type,
 )
+from corehq.apps.userreports.datatypes import (
+    DATA_TYPE_DATE,
+    DATA_TYPE_DATETIME,
+    DATA_TYPE_DECIMAL,
+    DATA_TYPE_INTEGER,
+    DATA_TYPE_STRING,
+)
 from corehq.apps.userreports.expressions.getters import NestedDictGetter
 from corehq.blobs import CODES, get_blob_db
 from corehq.blobs.exceptions import NotFound
@@ -120,10 +127,17 @@ from corehq.apps.app_manager.dbaccessors import get_case_types_from_apps
 
 
 DAILY_SAVED_EXPORT_ATTACHMENT_NAME = "payload"
+INCREMENTAL_EXPORT_STATE_ATTACHMENT_NAME = "incremental_state"
 
 
 ExcelFormatValue = namedtuple('ExcelFormatValue', 'format value')
 
+# Default value of ``ExportColumn.get_value(path_value=...)``
+NOT_LOOKED_UP = object()
+
+# Data types of export items that typed export formats (i.e. Parquet) keep
+TYPED_EXPORT_DATATYPES = (DATA_TYPE_DATE, DATA_TYPE_DATETIME, DATA_TYPE_DECIMAL, DATA_TYPE_INTEGER)
+
 
 class PathNode(DocumentSchema):
     """
@@ -269,7 +283,8 @@ class ExportColumn(DocumentSchema):
     # A transforms that deidentifies the value
     deid_transform = StringProperty(choices=list(DEID_TRANSFORM_FUNCTIONS))
 
-    def get_value(self, domain, doc_id, doc, base_path, transform_dates=False, row_index=None, split_column=False):
+    def get_value(self, domain, doc_id, doc, base_path, transform_dates=False, row_index=None, split_column=False,
+                  path_value=NOT_LOOKED_UP):
         """
         Get the value of self.item of the given doc.
         When base_path is [], doc is a form submission or case,
@@ -282,12 +297,17 @@ class ExportColumn(DocumentSchema):
         :param row_index: This is used for the RowExportColumn to determine what index the row is on
         :param split_column: When True will split SplitExportColumn into multiple columns, when False, it will
             not split the column
+        :param path_value: The value at the item's path in doc, if it has already been looked up
+            (see corehq.apps.export.extraction)
         :return:
         """
-        assert base_path == self.item.path[:len(base_path)], "ExportItem's path doesn't start with the base_path"
-        # Get the path from the doc root to the desired ExportItem
-        path = [x.name for x in self.item.path[len(base_path):]]
-        return self._transform(NestedDictGetter(path)(doc), doc, transform_dates)
+        if path_value is NOT_LOOKED_UP:
+            assert base_path == self.item.path[:len(base_path)], \
+                "ExportItem's path doesn't start with the base_path"
+            # Get the path from the doc root to the desired ExportItem
+            path = [x.name for x in self.item.path[len(base_path):]]
+            path_value = NestedDictGetter(path)(doc)
+        return self._transform(path_value, doc, transform_dates)
 
     def _transform(self, value, doc, transform_dates):
         """
@@ -431,6 +451,18 @@ class ExportColumn(DocumentSchema):
         else:
             return [self.label]
 
+    def get_datatypes(self, split_column=False):
+        """
+        Return the data type of the values of each of the column's headers,
+        for export formats with typed columns
+        """
+        datatype = DATA_TYPE_STRING
+        if (self.item.datatype in TYPED_EXPORT_DATATYPES
+                and not self.item.transform
+                and not self.is_deidentifed):
+            datatype = self.item.datatype
+        return [datatype] * len(self.get_headers(split_column=split_column))
+
     @classmethod
     def wrap(cls, data):
         if cls is ExportColumn:
@@ -503,6 +535,15 @@ class TableConfiguration(DocumentSchema, ReadablePathMixin):
             headers.extend(column.get_headers(split_column=split_columns))
         return headers
 
+    def get_datatypes(self, split_columns=False):
+        """
+        Return a list of the data types of the columns of get_headers()
+        """
+        datatypes = []
+        for column in self.selected_columns:
+            datatypes.extend(column.get_datatypes(split_column=split_columns))
+        return datatypes
+
     def get_rows(self, document, row_number, split_columns=False,
                  transform_dates=False, as_json=False, include_hyperlinks=True):
         """
@@ -2638,7 +2679,8 @@ class SplitUserDefinedExportColumn(ExportColumn):
             doc_id,
             doc,
             base_path,
-            transform_dates=transform_dates
+            transform_dates=transform_dates,
+            path_value=kwargs.get('path_value', NOT_LOOKED_UP),
         )
         if self.split_type == PLAIN_USER_DEFINED_SPLIT_TYPE:
             return value
@@ -2674,6 +2716,11 @@ class SplitUserDefinedExportColumn(ExportColumn):
         )
         return headers
 
+    def get_datatypes(self, **kwargs):
+        if self.split_type == PLAIN_USER_DEFINED_SPLIT_TYPE:
+            return super(SplitUserDefinedExportColumn, self).get_datatypes()
+        return [DATA_TYPE_INTEGER] * len(self.user_defined_options) + [DATA_TYPE_STRING]
+
 
 class MultiMediaExportColumn(ExportColumn):
     """
@@ -2712,6 +2759,11 @@ class SplitGPSExportColumn(ExportColumn):
         ]
         return [header_template.format(header) for header_template in header_templates]
 
+    def get_datatypes(self, split_column=False):
+        if not split_column:
+            return super(SplitGPSExportColumn, self).get_datatypes()
+        return [DATA_TYPE_DECIMAL] * 4
+
     def get_value(self, domain, doc_id, doc, base_path, split_column=False, **kwargs):
         value = super(SplitGPSExportColumn, self).get_value(
             domain,
@@ -2812,6 +2864,14 @@ class SplitExportColumn(ExportColumn):
             )
         return headers
 
+    def get_datatypes(self, split_column=False):
+        if not split_column:
+            return super(SplitExportColumn, self).get_datatypes()
+        datatypes = [DATA_TYPE_INTEGER] * len(self.item.options)
+        if not self.ignore_unspecified_options:
+            datatypes.append(DATA_TYPE_STRING)
+        return datatypes
+
 
 class RowNumberColumn(ExportColumn):
     """
@@ -2825,6 +2885,12 @@ class RowNumberColumn(ExportColumn):
             headers += ["{}__{}".format(self.label, i) for i in range(self.repeat + 1)]
         return headers
 
+    def get_datatypes(self, **kwargs):
+        datatypes = [DATA_TYPE_STRING]
+        if self.repeat > 0:
+            datatypes += [DATA_TYPE_INTEGER] * (self.repeat + 1)
+        return datatypes
+
     def get_value(self, domain, doc_id, doc, base_path, transform_dates=False, row_index=None, **kwargs):
         assert row_index, 'There must be a row_index for number column'
         return (
@@ -2946,6 +3012,9 @@ class StockExportColumn(ExportColumn):
             for product_id, section in self._column_tuples
         ]
 
+    def get_datatypes(self, **kwargs):
+        return [DATA_TYPE_DECIMAL] * len(self._column_tuples)
+
     def get_value(self, domain, doc_id, doc, base_path, **kwargs):
         states = self.accessor.get_ledger_values_for_case(doc_id)
 
@@ -0,0 +1,288 @@
+from django.test import SimpleTestCase
+
+from corehq.apps.export.const import (
+    CASE_CLOSE_TO_BOOLEAN,
+    DEID_ID_TRANSFORM,
+    DOC_TYPE_TRANSFORM,
+    FORM_ID_TO_LINK,
+    MULTISELCT_USER_DEFINED_SPLIT_TYPE,
+)
+from corehq.apps.export.extraction import ExportExtractionPlan, TableExtractionPlan
+from corehq.apps.export.models import (
+    ALL_CASE_TYPE_TABLE,
+    MAIN_TABLE,
+    CaseExportInstance,
+    CaseIndexExportColumn,
+    CaseIndexItem,
+    ExportColumn,
+    ExportItem,
+    FormExportInstance,
+    GeopointItem,
+    MultiMediaExportColumn,
+    MultiMediaItem,
+    MultipleChoiceItem,
+    Option,
+    PathNode,
+    RowNumberColumn,
+    ScalarItem,
+    SplitExportColumn,
+    SplitGPSExportColumn,
+    SplitUserDefinedExportColumn,
+    TableConfiguration,
+    UserDefinedExportColumn,
+)
+
+DOMAIN = 'export-extraction'
+
+
+def _path(*names, repeats=()):
+    return [PathNode(name=name, is_repeat=name in repeats) for name in names]
+
+
+def _column(*names, column_class=ExportColumn, item_class=ScalarItem, repeats=(), **kwargs):
+    kwargs.setdefault('label', '.'.join(names))
+    kwargs.setdefault('selected', True)
+    item_kwargs = kwargs.pop('item_kwargs', {})
+    return column_class(
+        item=item_class(path=_path(*names, repeats=repeats), **item_kwargs),
+        **kwargs
+    )
+
+
+FORMS = [
+    {
+        'domain': DOMAIN,
+        '_id': 'form1',
+        'received_on': '2015-07-22T14:16:49.584880Z',
+        'external_blobs': {'photo.jpg': {}},
+        'form': {
+            'q1': 'one',
+            'group': {'q2': 'two', 'q3': {'#text': 'three', '@id': '3'}, 'q4': {'@id': 'no text'}},
+            'mc': 'a c extra',
+            'gps': '1.5 2.5 3 4',
+            'photo': 'photo.jpg',
+            'list': ['x', {'k': 'v'}],
+            'date': '2015-07-22',
+            'repeat': [
+                {'r1': 'first', 'nested': [{'n1': 'a'}, {'n1': 'b'}]},
+                {'r1': 'second', 'nested': {'n1': 'single'}},
+                'not a dict',
+            ],
+            'case': {'@case_id': 'case1', 'update': {'prop': 'value'}},
+        },
+    },
+    {
+        'domain': DOMAIN,
+        '_id': 'form2',
+        'form': {
+            'q1': ['not', 'a', 'string'],
+            'group': 'not a dict',
+            'mc': 42,
+            'gps': None,
+            'photo': 'missing.jpg',
+            'repeat': {'r1': 'only', 'nested': []},
+        },
+    },
+    {
+        'domain': DOMAIN,
+        '_id': 'form3',
+        'form': {},
+    },
+]
+
+CASES = [
+    {
+        'domain': DOMAIN,
+        '_id': 'case1',
+        'type': 'person',
+        'doc_type': 'CommCareCase',
+        'name': 'Alice',
+        'closed_on': None,
+        'indices': [
+            {'referenced_id': 'h1', 'referenced_type': 'household'},
+            {'referenced_id': 'p1', 'referenced_type': 'person'},
+        ],
+        'choices': 'red blue other',
+    },
+    {
+        'domain': DOMAIN,
+        '_id': 'case2',
+        'type': 'household',
+        'doc_type': 'CommCareCase',
+        'name': 'Home',
+        'closed_on': '2020-01-01',
+    },
+]
+
+
+class ExtractionEquivalenceTest(SimpleTestCase):
+    """The rows of an ExtractionPlan are the same as the rows of
+    TableConfiguration.get_rows"""
+
+    def assertRowsEqual(self, table, docs, **plan_kwargs):
+        table_plan = TableExtractionPlan(table, **plan_kwargs)
+        get_rows_kwargs = {
+            'split_columns': plan_kwargs.get('split_columns', False),
+            'transform_dates': plan_kwargs.get('transform_dates', False),
+            'include_hyperlinks': plan_kwargs.get('include_hyperlinks', True),
+        }
+        for row_number, doc in enumerate(docs):
+            expected = table.get_rows(doc, row_number, **get_rows_kwargs)
+            actual = table_plan.get_rows(doc, row_number)
+            self.assertEqual(
+                [(r.data, list(r.hyperlink_column_indices), list(r.skip_excel_formatting)) for r in actual],
+                [(r.data, list(r.hyperlink_column_indices), list(r.skip_excel_formatting)) for r in expected],
+                doc['_id'],
+            )
+
+    def _form_table(self):
+        return TableConfiguration(
+            label='Forms',
+            selected=True,
+            path=MAIN_TABLE,
+            columns=[
+                RowNumberColumn(label='number', selected=True),
+                _column('form', 'q1'),
+                _column('form', 'group', 'q2'),
+                _column('form', 'group', 'q3'),
+                _column('form', 'group', 'q4'),
+                _column('form', 'group', 'missing', 'deeper'),
+                _column('form', 'q1', 'not_a_dict'),
+                _column('form', 'list'),
+                _column('form', 'date'),
+                _column('received_on'),
+                _column('form', 'q1', label='unselected', selected=False),
+                _column('form', 'q1', deid_transform=DEID_ID_TRANSFORM),
+                _column(
+                    'form', 'mc',
+                    column_class=SplitExportColumn,
+                    item_class=MultipleChoiceItem,
+                    item_kwargs={'options': [Option(value='a'), Option(value='b')]},
+                ),
+                _column(
+                    'form', 'mc',
+                    column_class=SplitExportColumn,
+                    item_class=MultipleChoiceItem,
+                    item_kwargs={'options': [Option(value='c')]},
+                    ignore_unspecified_options=True,
+                ),
+                _column('form', 'gps', column_class=SplitGPSExportColumn, item_class=GeopointItem),
+                _column('form', 'photo', column_class=MultiMediaExportColumn, item_class=MultiMediaItem),
+                _column('_id', item_kwargs={'transform': FORM_ID_TO_LINK}),
+                UserDefinedExportColumn(
+                    label='custom',
+                    selected=True,
+                    custom_path=_path('form', 'case', 'update', 'prop'),
+                ),
+                # columns sharing a prefix with others are all looked up
+                _column('form', 'case', '@case_id'),
+                _column('form', 'case', 'update', 'prop'),
+            ],
+        )
+
+    def test_main_table(self):
+        table = self._form_table()
+        for split_columns in (False, True):
+            for transform_dates in (False, True):
+                for include_hyperlinks in (False, True):
+                    self.assertRowsEqual(
+                        table, FORMS,
+                        split_columns=split_columns,
+                        transform_dates=transform_dates,
+                        include_hyperlinks=include_hyperlinks,
+                    )
+
+    def test_repeat_table(self):
+        table = TableConfiguration(
+            label='Repeat',
+            selected=True,
+            path=_path('form', 'repeat', repeats=['repeat']),
+            columns=[
+                RowNumberColumn(label='number', selected=True, repeat=1),
+                _column('form', 'repeat', 'r1', repeats=['repeat']),
+                _column('form', 'repeat', 'missing', repeats=['repeat']),
+                # the path of the table itself
+                _column('form', 'repeat', repeats=['repeat']),
+            ],
+        )
+        self.assertRowsEqual(table, FORMS)
+
+    def test_nested_repeat_table(self):
+        repeats = ['repeat', 'nested']
+        table = TableConfiguration(
+            label='Nested',
+            selected=True,
+            path=_path('form', 'repeat', 'nested', repeats=repeats),
+            columns=[
+                RowNumberColumn(label='number', selected=True, repeat=2),
+                _column('form', 'repeat', 'nested', 'n1', repeats=repeats),
+            ],
+        )
+        self.assertRowsEqual(table, FORMS, transform_dates=True)
+
+    def test_column_outside_table_path(self):
+        table = TableConfiguration(
+            label='Repeat',
+            selected=True,
+            path=_path('form', 'repeat', repeats=['repeat']),
+            columns=[_column('form', 'q1')],
+        )
+        with self.assertRaises(AssertionError):
+            table.get_rows(FORMS[0], 0)
+        with self.assertRaises(AssertionError):
+            TableExtractionPlan(table).get_rows(FORMS[0], 0)
+
+    def test_case_table(self):
+        table = TableConfiguration(
+            label='Cases',
+            selected=True,
+            path=MAIN_TABLE,
+            columns=[
+                _column('name'),
+                _column('closed_on', item_kwargs={'transform': CASE_CLOSE_TO_BOOLEAN}),
+                _column('doc_type', item_kwargs={'transform': DOC_TYPE_TRANSFORM}),
+                _column('indices', 'household', column_class=CaseIndexExportColumn, item_class=CaseIndexItem),
+                _column(
+                    'choices',
+                    column_class=SplitUserDefinedExportColumn,
+                    item_class=ExportItem,
+                    split_type=MULTISELCT_USER_DEFINED_SPLIT_TYPE,
+                    user_defined_options=['red', 'green'],
+                ),
+            ],
+        )
+        self.assertRowsEqual(table, CASES, split_columns=True)
+
+    def test_bulk_case_export_tables(self):
+        tables = [
+            TableConfiguration(
+                label=case_type,
+                selected=True,
+                path=[PathNode(name=case_type), ALL_CASE_TYPE_TABLE],
+                columns=[_column('name')],
+            )
+            for case_type in ['person', 'household']
+        ]
+        plan = ExportExtractionPlan(CaseExportInstance(domain=DOMAIN, tables=tables))
+        self.assertEqual(
+            [[row.data for row in table_plan.get_rows(CASES[0], 0)] for table_plan in plan.tables],
+            [[['Alice']], []],
+        )
+        self.assertEqual(
+            [[row.data for row in table_plan.get_rows(CASES[1], 1)] for table_plan in plan.tables],
+            [[], [['Home']]],
+        )
+
+    def test_plan_has_selected_tables(self):
+        selected, unselected = self._form_table(), self._form_table()
+        unselected.selected = False
+        export_instance = FormExportInstance(
+            domain=DOMAIN,
+            tables=[selected, unselected],
+            split_multiselects=True,
+            transform_dates=True,
+        )
+        table_plan, = ExportExtractionPlan(export_instance).tables
+        self.assertIs(table_plan.table, selected)
+        self.assertTrue(table_plan.split_columns)
+        self.assertTrue(table_plan.transform_dates)
@@ -0,0 +1,180 @@
+import contextlib
+import io
+from unittest.mock import PropertyMock, patch
+
+from django.test import SimpleTestCase
+
+from corehq.apps.es.es_query import ScanResult
+from corehq.apps.export.incremental import (
+    get_incremental_export_file,
+    supports_incremental_rebuild,
+)
+from corehq.apps.export.models import (
+    MAIN_TABLE,
+    ExportColumn,
+    FormExportInstance,
+    PathNode,
+    RowNumberColumn,
+    ScalarItem,
+    SMSExportInstance,
+    StockExportColumn,
+    StockItem,
+    TableConfiguration,
+)
+from corehq.apps.export.models.new import INCREMENTAL_EXPORT_STATE_ATTACHMENT_NAME
+from corehq.util.files import TransientTempfile
+
+DOMAIN = 'incremental-export'
+
+
+def _form(form_id, name):
+    return {'_id': form_id, 'domain': DOMAIN, 'form': {'name': name}}
+
+
+class FakeWriter(object):
+    format = 'csv'
+    path = None
+
+    def __init__(self):
+        self.rows = []
+
+    @contextlib.contextmanager
+    def open(self, export_instances):
+        yield
+
+    def write_rows(self, table, rows):
+        self.rows.extend(row.data for row in rows)
+
+
+class FakeQuery(object):
+    """The export's query, over ``docs``. Filtering it returns the query of
+    the docs in ``modified_ids``"""
+
+    def __init__(self, docs, modified_ids=()):
+        self.docs = {doc['_id']: doc for doc in docs}
+        self.modified_ids = modified_ids
+        self.fetched_ids = []
+        self.adapter = self
+
+    def scroll_ids(self):
+        return iter(list(self.docs))
+
+    def filter(self, es_filter):
+        self.modified_query = FakeQuery([
+            self.docs[doc_id] for doc_id in self.modified_ids if doc_id in self.docs
+        ])
+        return self.modified_query
+
+    def count(self):
+        return len(self.docs)
+
+    def scroll_ids_to_disk_and_iter_docs(self):
+        return ScanResult(self.count(), iter(list(self.docs.values())))
+
+    def iter_docs(self, doc_ids):
+        self.fetched_ids.extend(doc_ids)
+        return (self.docs[doc_id] for doc_id in doc_ids)
+
+
+class IncrementalExportTest(SimpleTestCase):
+
+    def setUp(self):
+        self.export_instance = FormExportInstance(
+            domain=DOMAIN,
+            tables=[
+                TableConfiguration(
+                    label='Forms',
+                    selected=True,
+                    path=MAIN_TABLE,
+                    columns=[
+                        RowNumberColumn(label='number', selected=True),
+                        ExportColumn(
+                            label='name',
+                            item=ScalarItem(path=[PathNode(name='form'), PathNode(name='name')]),
+                            selected=True,
+                        ),
+                    ],
+                ),
+            ],
+        )
+        self.state = None
+        # the fixtures are small: up to half of their documents may change
+        patcher = patch('corehq.apps.export.incremental.INCREMENTAL_EXPORT_MAX_CHANGED_RATIO', 0.5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _rebuild(self, docs, modified_ids=()):
+        writer = FakeWriter()
+        query = FakeQuery(docs, modified_ids)
+        blobs = {INCREMENTAL_EXPORT_STATE_ATTACHMENT_NAME: None} if self.state else {}
+        with TransientTempfile() as temp_path, TransientTempfile() as state_path, \
+                patch.object(FormExportInstance, 'blobs', new_callable=PropertyMock, return_value=blobs), \
+                patch.object(FormExportInstance, 'fetch_attachment', return_value=io.BytesIO(self.state)), \
+                patch('corehq.apps.export.incremental.get_export_writer',
+                      return_value=writer) as get_export_writer, \
+                patch('corehq.apps.export.incremental.get_export_query', return_value=query), \
+                patch('corehq.apps.export.incremental.get_export_documents',
+                      return_value=ScanResult(len(docs), iter(docs))) as get_export_documents:
+            get_incremental_export_file(self.export_instance, [], temp_path, state_path)
+            with open(state_path, 'rb') as state:
+                self.state = state.read()
+        self.rebuilt_in_full = get_export_documents.called
+        self.writer_kwargs = get_export_writer.call_args[1]
+        self.query = query
+        return writer.rows
+
+    def test_first_rebuild_is_full(self):
+        rows = self._rebuild([_form('a', 'one'), _form('b', 'two')])
+        self.assertTrue(self.rebuilt_in_full)
+        self.assertEqual(rows, [['0', 'one'], ['1', 'two']])
+
+    def test_incremental_rebuild(self):
+        self._rebuild([_form('a', 'one'), _form('b', 'two'), _form('c', 'three')])
+        rows = self._rebuild(
+            [
+                _form('a', 'one'),
+                _form('b', 'two, modified'),
+                # new
+                _form('d', 'four'),
+                # new, but not modified since the last rebuild
+                _form('e', 'five'),
+            ],
+            # 'c' is no longer in the export
+            modified_ids=['b', 'c', 'd'],
+        )
+        self.assertFalse(self.rebuilt_in_full)
+        self.assertEqual(rows, [['0', 'one'], ['1', 'two, modified'], ['3', 'four'], ['4', 'five']])
+        self.assertEqual(self.query.fetched_ids, ['e'])
+
+        rows = self._rebuild([_form('a', 'one'), _form('d', 'four, modified')], modified_ids=['d'])
+        self.assertFalse(self.rebuilt_in_full)
+        self.assertEqual(rows, [['0', 'one'], ['3', 'four, modified']])
+
+    def test_incremental_rebuild_keeps_pagination(self):
+        docs = [_form('a', 'one'), _form('b', 'two')]
+        self._rebuild(docs)
+        self._rebuild(docs, modified_ids=['a'])
+        self.assertFalse(self.rebuilt_in_full)
+        self.assertNotIn('allow_pagination', self.writer_kwargs)
+
+    def test_configuration_change_rebuilds_in_full(self):
+        docs = [_form('a', 'one'), _form('b', 'two')]
+        self._rebuild(docs)
+        self.export_instance.tables[0].columns[1].label = 'renamed'
+        self._rebuild(docs)
+        self.assertTrue(self.rebuilt_in_full)
+
+    def test_many_changes_rebuild_in_full(self):
+        docs = [_form('a', 'one'), _form('b', 'two')]
+        self._rebuild(docs)
+        rows = self._rebuild(docs, modified_ids=['a', 'b'])
+        self.assertTrue(self.rebuilt_in_full)
+        self.assertEqual(rows, [['0', 'one'], ['1', 'two']])
+
+    def test_supports_incremental_rebuild(self):
+        self.assertTrue(supports_incremental_rebuild(self.export_instance))
+        self.assertFalse(supports_incremental_rebuild(SMSExportInstance(domain=DOMAIN)))
+        self.export_instance.tables[0].columns.append(
+            StockExportColumn(label='stock', item=StockItem(path=[PathNode(name='stock')]), selected=True)
+        )
+        self.assertFalse(supports_incremental_rebuild(self.export_instance))
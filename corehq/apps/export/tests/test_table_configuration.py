@@ -1,14 +1,17 @@
 from django.test import SimpleTestCase
 
-from corehq.apps.export.const import USERNAME_TRANSFORM
+from corehq.apps.export.const import DEID_DATE_TRANSFORM, USERNAME_TRANSFORM
 from corehq.apps.export.models import (
     DocRow,
     ExportColumn,
     ExportItem,
     ExportRow,
+    MultipleChoiceItem,
+    Option,
     PathNode,
     RowNumberColumn,
     ScalarItem,
+    SplitExportColumn,
     TableConfiguration,
 )
 
@@ -107,6 +110,65 @@ class TableConfigurationTest(SimpleTestCase):
         self.assertEqual(index, 1)
 
 
+class TableConfigurationGetDatatypesTest(SimpleTestCase):
+
+    def test_get_datatypes(self):
+        table_configuration = TableConfiguration(
+            path=[],
+            columns=[
+                RowNumberColumn(label="row number", selected=True, repeat=1),
+                ExportColumn(
+                    label="received on",
+                    item=ScalarItem(path=[PathNode(name="received_on")], datatype="datetime"),
+                    selected=True,
+                ),
+                ExportColumn(
+                    label="age",
+                    item=ScalarItem(path=[PathNode(name="form"), PathNode(name="age")], datatype="integer"),
+                    selected=True,
+                ),
+                ExportColumn(
+                    label="not selected",
+                    item=ScalarItem(path=[PathNode(name="form"), PathNode(name="weight")], datatype="decimal"),
+                ),
+                ExportColumn(
+                    label="user",
+                    item=ScalarItem(
+                        path=[PathNode(name="form"), PathNode(name="user_id")],
+                        datatype="string",
+                        transform=USERNAME_TRANSFORM,
+                    ),
+                    selected=True,
+                ),
+                ExportColumn(
+                    label="dob",
+                    item=ScalarItem(path=[PathNode(name="form"), PathNode(name="dob")], datatype="date"),
+                    deid_transform=DEID_DATE_TRANSFORM,
+                    selected=True,
+                ),
+                SplitExportColumn(
+                    label="fruit",
+                    item=MultipleChoiceItem(
+                        path=[PathNode(name="form"), PathNode(name="fruit")],
+                        options=[Option(value="apple"), Option(value="banana")],
+                    ),
+                    selected=True,
+                ),
+            ]
+        )
+        self.assertEqual(
+            table_configuration.get_datatypes(),
+            ["string", "integer", "integer", "datetime", "integer", "string", "string", "string"],
+        )
+        datatypes = table_configuration.get_datatypes(split_columns=True)
+        self.assertEqual(
+            datatypes,
+            ["string", "integer", "integer", "datetime", "integer", "string", "string",
+             "integer", "integer", "string"],
+        )
+        self.assertEqual(len(datatypes), len(table_configuration.get_headers(split_columns=True)))
+
+
 class TableConfigurationGetSubDocumentsTest(SimpleTestCase):
 
     def test_basic(self):
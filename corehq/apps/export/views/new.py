@@ -138,6 +138,10 @@ class BaseExportView(BaseProjectDataView):
 
         allow_deid = has_privilege(self.request, privileges.DEIDENTIFIED_DATA)
 
+        format_options = ["xls", "xlsx", "csv"]
+        if toggles.EXPORT_PARQUET_FORMAT.enabled(self.domain):
+            format_options.append("parquet")
+
         return {
             'export_instance': self.export_instance,
             'export_home_url': self.export_home_url,
@@ -148,7 +152,7 @@ class BaseExportView(BaseProjectDataView):
             'can_edit': self.export_instance.can_edit(self.request.couch_user),
             'has_other_owner': owner_id and owner_id != self.request.couch_user.user_id,
             'owner_name': WebUser.get_by_user_id(owner_id).username if owner_id else None,
-            'format_options': ["xls", "xlsx", "csv"],
+            'format_options': format_options,
             'number_of_apps_to_process': number_of_apps_to_process,
             'sharing_options': sharing_options,
             'terminology': self.terminology,
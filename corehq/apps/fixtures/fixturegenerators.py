@@ -1,23 +1,38 @@
+import hashlib
 from collections import defaultdict
 from functools import partial
 from operator import attrgetter
 from xml.etree import cElementTree as ElementTree
 
+from django.db.models import Count
+
 from casexml.apps.phone.fixtures import FixtureProvider
 from casexml.apps.phone.utils import (
     GLOBAL_USER_ID,
     get_or_cache_global_fixture,
+    write_fixture_items_to_io,
 )
+from dimagi.utils.couch import CriticalSection
+
 from corehq.apps.fixtures.exceptions import FixtureTypeCheckError
-from corehq.apps.fixtures.models import FIXTURE_BUCKET, LookupTable, LookupTableRow
+from corehq.apps.fixtures.models import (
+    FIXTURE_BUCKET,
+    LookupTable,
+    LookupTableRow,
+    LookupTableRowOwner,
+)
 from corehq.apps.products.fixtures import product_fixture_generator_json
 from corehq.apps.programs.fixtures import program_fixture_generator_json
-from corehq.util.metrics import metrics_histogram
+from corehq.blobs import CODES, NotFound, get_blob_db
+from corehq.toggles import LOOKUP_TABLE_FIXTURE_BUCKETS
+from corehq.util.metrics import metrics_counter, metrics_histogram
 from corehq.util.xml_utils import serialize
 from .utils import clean_fixture_field_name, get_index_schema_node
 
 LOOKUP_TABLE_FIXTURE = 'lookup_table_fixture'
 REPORT_FIXTURE = 'report_fixture'
+# minutes that cached fixtures of user-owned rows are kept at least
+OWNER_BUCKET_FIXTURE_TIMEOUT = 7 * 24 * 60
 
 
 def item_lists_by_domain(domain, namespace_ids=False):
@@ -120,7 +135,11 @@ class ItemListsProvider(FixtureProvider):
             global_items = self.get_global_items(global_types, restore_state)
             items.extend(global_items)
         if user_types:
-            user_items, user_items_count = self.get_user_items_and_count(user_types, restore_user)
+            if LOOKUP_TABLE_FIXTURE_BUCKETS.enabled(restore_user.domain):
+                user_items, user_items_count = self.get_owner_bucket_items_and_count(
+                    user_types, restore_state)
+            else:
+                user_items, user_items_count = self.get_user_items_and_count(user_types, restore_user)
             items.extend(user_items)
 
         metrics_histogram(
@@ -165,6 +184,74 @@ class ItemListsProvider(FixtureProvider):
 
         return self._get_fixtures(user_types, get_items_by_type, restore_user.user_id), user_items_count
 
+    def get_owner_bucket_items_and_count(self, user_types, restore_state):
+        """
+        Like ``get_user_items_and_count``, but the fixture of each table
+        is rendered from the rows owned by those of the user's owners
+        that own rows in the table (its owner bucket), and cached. Users
+        with the same owner bucket for a table get the same cached bytes.
+
+        The item count is the sum of rows per owner, so rows that are
+        owned by more than one of the user's owners are counted twice.
+        """
+        restore_user = restore_state.restore_user
+        owners = restore_user.get_lookup_table_owners()
+        owners_by_table = defaultdict(set)
+        user_items_count = 0
+        if owners:
+            ownership = (
+                LookupTableRowOwner.objects.by_owners(restore_user.domain, owners)
+                .values_list("row__table_id", "owner_type", "owner_id")
+                .annotate(row_count=Count("row_id"))
+            )
+            for table_id, owner_type, owner_id, row_count in ownership:
+                owners_by_table[table_id].add((owner_type, owner_id))
+                user_items_count += row_count
+
+        items = []
+        for data_type in sorted(user_types.values(), key=attrgetter('tag')):
+            if data_type.is_indexed:
+                items.append(self._get_schema_element(data_type))
+            bucket = sorted(owners_by_table.get(data_type.id, []))
+            data = self._get_or_cache_owner_bucket_fixture(
+                data_type, bucket, restore_state.overwrite_cache)
+            items.append(data.replace(GLOBAL_USER_ID.encode('utf-8'), restore_user.user_id.encode('utf-8')))
+        return items, user_items_count
+
+    def _get_or_cache_owner_bucket_fixture(self, data_type, owners, overwrite_cache):
+        key = get_owner_bucket_fixture_key(data_type, owners)
+        if not overwrite_cache:
+            data = _get_cached_blob(key)
+            metrics_counter('commcare.fixture.owner_bucket', tags={
+                'result': 'cache_miss' if data is None else 'cache_hit',
+            })
+            if data is not None:
+                return data
+
+        with CriticalSection([key]):
+            if not overwrite_cache:
+                # re-check cache to avoid re-computing it
+                data = _get_cached_blob(key)
+                if data is not None:
+                    return data
+
+            rows = LookupTableRow.objects.iter_by_owners(data_type.domain, data_type.id, owners)
+            fixture = self._get_fixture_element(data_type, GLOBAL_USER_ID, rows)
+            io_data = write_fixture_items_to_io([fixture])
+            data = io_data.read()
+            io_data.seek(0)
+            db = get_blob_db()
+            db.delete(key=key)
+            db.put(
+                io_data,
+                domain=data_type.domain,
+                parent_id=data_type.domain,
+                type_code=CODES.fixture,
+                key=key,
+                timeout=OWNER_BUCKET_FIXTURE_TIMEOUT,
+            )
+        return data
+
     def _get_fixtures(self, data_types, get_items_by_type, user_id):
         fixtures = []
         for data_type in sorted(data_types.values(), key=attrgetter('tag')):
@@ -223,4 +310,24 @@ class ItemListsProvider(FixtureProvider):
         return xData
 
 
+def get_owner_bucket_fixture_key(data_type, owners):
+    """
+    Get the blob key of the fixture of a lookup table for the given
+    owners, at the current version of the table
+
+    :param owners: Sorted list of `(owner_type, owner_id)` tuples.
+    """
+    owners_hash = hashlib.sha1(
+        ' '.join(f'{int(owner_type)}:{owner_id}' for owner_type, owner_id in owners).encode('utf-8')
+    ).hexdigest()
+    return f'{FIXTURE_BUCKET}/{data_type.domain}/{data_type.id.hex}/{data_type.version}/{owners_hash}'
+
+
+def _get_cached_blob(key):
+    try:
+        return get_blob_db().get(key=key, type_code=CODES.fixture).read()
+    except NotFound:
+        return None
+
+
 item_lists = ItemListsProvider()
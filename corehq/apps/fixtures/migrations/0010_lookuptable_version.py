@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fixtures', '0009_remove_lookuptablerowowner_couch_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lookuptable',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -83,11 +83,25 @@ class LookupTable(models.Model):
     fields = AttrsList(TypeField, default=list)
     item_attributes = models.JSONField(default=list)
     description = models.CharField(max_length=255, default="")
+    # incremented when the rows of lookup tables in the domain may have
+    # changed, to invalidate cached fixtures (see clear_fixture_cache)
+    version = models.PositiveIntegerField(default=0)
 
     class Meta:
         app_label = 'fixtures'
         unique_together = [('domain', 'tag')]
 
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not kwargs.get("force_insert")
+                and kwargs.get("update_fields") is None):
+            # version is only changed by clear_fixture_cache(), which must
+            # not be undone by saving a table that was loaded before it
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != "version"
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def is_indexed(self):
         return any(f.is_indexed for f in self.fields)
@@ -118,25 +132,31 @@ class LookupTableRowManager(models.Manager):
 
         Returned rows are sorted by table_id and sort_key.
         """
-        def make_conditions(owner_type, ids):
-            return [models.Q(owner_type=owner_type, owner_id=x) for x in ids]
-
-        group_ids = Group.by_user_id(user.user_id, wrap=False)
-        locaction_ids = user.sql_location.path if user.sql_location else []
         where = models.Q(
             id__in=models.Subquery(
-                LookupTableRowOwner.objects.filter(
-                    reduce(models.Q.__or__, chain(
-                        make_conditions(OwnerType.User, [user.user_id]),
-                        make_conditions(OwnerType.Group, group_ids),
-                        make_conditions(OwnerType.Location, locaction_ids),
-                    )),
-                    domain=user.domain,
+                LookupTableRowOwner.objects.by_owners(
+                    user.domain, get_user_owners(user)
                 ).values("row_id")
             ),
         )
         return self._iter_sorted(user.domain, where, **kw)
 
+    def iter_by_owners(self, domain, table_id, owners, **kw):
+        """Get rows of lookup table owned by any of the given owners
+
+        :param owners: List of `(owner_type, owner_id)` tuples.
+        Returned rows are sorted by sort_key.
+        """
+        if not owners:
+            return []
+        where = models.Q(
+            table_id=table_id,
+            id__in=models.Subquery(
+                LookupTableRowOwner.objects.by_owners(domain, owners).values("row_id")
+            ),
+        )
+        return self._iter_sorted(domain, where, **kw)
+
     def _iter_sorted(self, domain, where, batch_size=1000):
         # Depends on ["domain", "table_id", "sort_key", "id"] index for
         # efficient pagination and sorting.
@@ -272,7 +292,25 @@ class OwnerType(models.IntegerChoices):
         return getattr(cls, value.title())
 
 
+class LookupTableRowOwnerManager(models.Manager):
+
+    def by_owners(self, domain, owners):
+        """Get ownership records of the given owners
+
+        :param owners: Non-empty list of `(owner_type, owner_id)` tuples.
+        """
+        return self.filter(
+            reduce(models.Q.__or__, (
+                models.Q(owner_type=owner_type, owner_id=owner_id)
+                for owner_type, owner_id in owners
+            )),
+            domain=domain,
+        )
+
+
 class LookupTableRowOwner(models.Model):
+    objects = LookupTableRowOwnerManager()
+
     domain = CharIdField(max_length=126, default=None)
     owner_type = models.PositiveSmallIntegerField(choices=OwnerType.choices)
     owner_id = CharIdField(max_length=126, default=None)
@@ -285,6 +323,21 @@ class LookupTableRowOwner(models.Model):
         ]
 
 
+def get_user_owners(user):
+    """Get the owners whose lookup table rows are synced to the user
+
+    :returns: List of `(owner_type, owner_id)` tuples for the user, their
+    groups, and their location and its ancestors.
+    """
+    group_ids = Group.by_user_id(user.user_id, wrap=False)
+    location_ids = user.sql_location.path if user.sql_location else []
+    return list(chain(
+        [(OwnerType.User, user.user_id)],
+        ((OwnerType.Group, group_id) for group_id in group_ids),
+        ((OwnerType.Location, location_id) for location_id in location_ids),
+    ))
+
+
 class UserLookupTableType:
     LOCATION = 1
     CHOICES = (
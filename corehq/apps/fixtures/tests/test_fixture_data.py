@@ -7,6 +7,7 @@ from casexml.apps.phone.tests.utils import \
     call_fixture_generator as call_fixture_generator_raw
 
 from corehq.apps.fixtures import fixturegenerators
+from corehq.apps.fixtures.fixturegenerators import get_owner_bucket_fixture_key
 from corehq.apps.fixtures.models import (
     FIXTURE_BUCKET,
     Field,
@@ -16,8 +17,11 @@ from corehq.apps.fixtures.models import (
     OwnerType,
     TypeField,
 )
+from corehq.apps.fixtures.utils import clear_fixture_cache
+from corehq.apps.groups.models import Group
 from corehq.apps.users.models import CommCareUser
 from corehq.blobs import get_blob_db
+from corehq.util.test_utils import flag_enabled
 
 
 def call_fixture_generator(user):
@@ -277,6 +281,63 @@ class FixtureDataTest(TestCase):
         return data_item
 
 
+@flag_enabled('LOOKUP_TABLE_FIXTURE_BUCKETS')
+class OwnerBucketFixtureDataTest(FixtureDataTest):
+    """Runs the fixture tests with fixtures cached by owner bucket"""
+
+    def setUp(self):
+        super().setUp()
+        self.sally = CommCareUser.create(self.domain, 'sally', '***', None, None)
+        self.addCleanup(self.sally.delete, self.domain, deleted_by=None)
+
+    def make_group_row(self, cost):
+        group = Group(domain=self.domain, name="group", users=[self.user._id, self.sally._id])
+        group.save()
+        self.addCleanup(group.delete)
+        cookie = self.make_data_type("cookie", is_global=False)
+        row = self.make_data_item(cookie, cost)
+        LookupTableRowOwner(
+            domain=self.domain,
+            owner_id=group._id,
+            owner_type=OwnerType.Group,
+            row_id=row.id,
+        ).save()
+        return cookie, row, group
+
+    def get_bucket_key(self, data_type, group):
+        key = get_owner_bucket_fixture_key(data_type, [(OwnerType.Group, group._id)])
+        self.addCleanup(get_blob_db().delete, key=key)
+        return key
+
+    def get_costs(self, user):
+        fixtures = call_fixture_generator(user.to_ota_restore_user(self.domain))
+        [fixture] = [f for f in fixtures if f.attrib['id'] == 'item-list:cookie-index']
+        self.assertEqual(fixture.attrib['user_id'], user.user_id)
+        return [cost.text for cost in fixture.iter('cost')]
+
+    def test_shared_owner_bucket(self):
+        cookie, row, group = self.make_group_row("2.50")
+        self.assertEqual(self.get_costs(self.user), ["2.50"])
+        self.assertTrue(get_blob_db().exists(key=self.get_bucket_key(cookie, group)))
+
+        # sally gets the cached fixture
+        row.fields = {"cost": [Field(value="3.00")]}
+        row.save()
+        self.assertEqual(self.get_costs(self.sally), ["2.50"])
+
+    def test_cache_cleared(self):
+        cookie, row, group = self.make_group_row("2.50")
+        self.get_bucket_key(cookie, group)
+        self.assertEqual(self.get_costs(self.user), ["2.50"])
+
+        row.fields = {"cost": [Field(value="3.00")]}
+        row.save()
+        clear_fixture_cache(self.domain)
+        cookie.refresh_from_db()
+        self.get_bucket_key(cookie, group)
+        self.assertEqual(self.get_costs(self.user), ["3.00"])
+
+
 class TestFixtureOrdering(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -16,6 +16,7 @@ from ..models import (
     OwnerType,
     TypeField,
 )
+from ..utils import clear_fixture_cache
 
 
 class TestLookupTableManager(TestCase):
@@ -78,6 +79,16 @@ class TestLookupTable(TestCase):
         self.assertEqual(new.fields, table.fields)
         self.assertIsNot(new.fields, table.fields)
 
+    def test_save_does_not_overwrite_version(self):
+        table = LookupTable(domain="test", tag="x")
+        table.save()
+        clear_fixture_cache("test")
+        table.description = "cookies"
+        table.save()
+        new = LookupTable.objects.get(id=table.id)
+        self.assertEqual(new.description, "cookies")
+        self.assertEqual(new.version, 1)
+
     @generate_cases([
         # Detect incompatibilities between the JSON data stored in the
         # database and LookupTable.fields and/or TypeField type. One or more
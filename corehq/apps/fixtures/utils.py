@@ -1,6 +1,8 @@
 import re
 from xml.etree import cElementTree as ElementTree
 
+from django.db.models import F
+
 from corehq.blobs import get_blob_db
 
 BAD_SLUG_PATTERN = r"([/\\<>\s])"
@@ -55,5 +57,7 @@ def get_index_schema_node(fixture_id, attrs_to_index):
 
 
 def clear_fixture_cache(domain):
-    from corehq.apps.fixtures.models import FIXTURE_BUCKET
+    from corehq.apps.fixtures.models import FIXTURE_BUCKET, LookupTable
     get_blob_db().delete(key=FIXTURE_BUCKET + '/' + domain)
+    # cached fixtures of user-owned rows are keyed by table version
+    LookupTable.objects.filter(domain=domain).update(version=F('version') + 1)
@@ -225,7 +225,7 @@ def update_fixture(domain_link, tag):
         linked_data_type = LookupTable(domain=domain_link.linked_domain)
         is_existing_table = False
     for field in LookupTable._meta.fields:
-        if field.attname not in ["id", "domain"]:
+        if field.attname not in ["id", "domain", "version"]:
             value = getattr(master_data_type, field.attname)
             setattr(linked_data_type, field.attname, value)
     linked_data_type.save()
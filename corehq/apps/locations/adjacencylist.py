@@ -1,6 +1,13 @@
 from django.core.exceptions import EmptyResultSet
-from django.db import models
-from django.db.models.expressions import Exists, F, Func, OuterRef, Value
+from django.db import connections, models, router
+from django.db.models.expressions import (
+    Exists,
+    F,
+    Func,
+    OuterRef,
+    Subquery,
+    Value,
+)
 from django.db.models.query import Q, QuerySet
 
 from django_cte import With
@@ -27,6 +34,11 @@ class array_length(Func):
     output_field = field
 
 
+class array_subquery(Subquery):
+    template = "ARRAY(%(subquery)s)"
+    output_field = field
+
+
 class AdjListManager(models.Manager):
 
     def get_ancestors(self, node, ascending=False, include_self=False):
@@ -58,6 +70,10 @@ class AdjListManager(models.Manager):
         else:
             where = Q(id=node.parent_id)
 
+        closure = self._get_closure_model()
+        if closure is not None:
+            return self._get_closure_ancestors(closure, where, ascending)
+
         def make_cte_query(cte):
             return self.filter(where).order_by().annotate(
                 _depth=Value(0, output_field=field),
@@ -108,6 +124,10 @@ class AdjListManager(models.Manager):
         else:
             where = Q(parent_id=node.id)
 
+        closure = self._get_closure_model()
+        if closure is not None:
+            return self._get_closure_descendants(closure, where)
+
         def make_cte_query(cte):
             return self.filter(where).order_by().annotate(
                 _cte_ordering=str_array(ordering_col),
@@ -156,6 +176,47 @@ class AdjListManager(models.Manager):
 
         return query.order_by(cte.col._cte_ordering)
 
+    def _get_closure_model(self):
+        """Get the closure table model to query instead of using
+        recursive CTEs, if the model has one and it is enabled
+
+        Recursive queries only include nodes in this manager's queryset,
+        and stop at nodes that are not, so managers with a filtered
+        queryset always use them.
+        """
+        if not self.model.closure_queries_enabled():
+            return None
+        if self.get_queryset().query.has_filters():
+            return None
+        return self.model.get_closure_model()
+
+    def _get_closure_ancestors(self, closure, where, ascending):
+        # `_depth` is relative to the nearest node matching `where`
+        starts = self.filter(where).order_by().values("id")
+        depths = closure.objects.filter(
+            ancestor_id=OuterRef("id"),
+            descendant_id__in=starts,
+        ).order_by("depth").values("depth")[:1]
+        return self.filter(
+            id__in=closure.objects.filter(descendant_id__in=starts).values("ancestor_id"),
+        ).annotate(
+            _depth=Subquery(depths, output_field=field),
+        ).order_by(("" if ascending else "-") + "_depth")
+
+    def _get_closure_descendants(self, closure, where):
+        # Like the recursive query with duplicates discarded, order by
+        # the path from the furthest ancestor matching `where`
+        ordering_col = self.model.ordering_col_attr
+        roots = self.filter(where).order_by().values("id")
+        subtree_ids = closure.objects.filter(ancestor_id__in=roots).values("descendant_id")
+        path = closure.objects.filter(
+            descendant_id=OuterRef("id"),
+            ancestor_id__in=subtree_ids,
+        ).order_by("-depth").values(f"ancestor__{ordering_col}")
+        return self.filter(id__in=subtree_ids).annotate(
+            _cte_ordering=array_subquery(path),
+        ).order_by("_cte_ordering")
+
     def get_queryset_ancestors(self, queryset, include_self=False):
         return self.get_ancestors(queryset, include_self=include_self)
 
@@ -180,6 +241,57 @@ class AdjListModel(models.Model):
     class Meta:
         abstract = True
 
+    @classmethod
+    def get_closure_model(cls):
+        """Get the model of the closure table of the tree, if it has one
+
+        A closure table has a row with `ancestor_id`, `descendant_id`
+        and `depth` for every node and each of its ancestors, and for
+        every node with itself at depth 0. It is kept up to date when
+        nodes are saved (see `update_closure`). Rows must be deleted
+        with their nodes (`on_delete=CASCADE`).
+        """
+        return None
+
+    @classmethod
+    def closure_queries_enabled(cls):
+        """Whether `AdjListManager` should query the closure table"""
+        return False
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        obj = super().from_db(db, field_names, values)
+        # used to find out whether the node was moved when it is saved
+        obj._loaded_parent_id = obj.__dict__.get("parent_id", _UNKNOWN)
+        return obj
+
+    def update_closure(self, created):
+        """Update the closure table after this node was saved
+
+        Must be called in the transaction in which the node was saved.
+        """
+        closure = self.get_closure_model()
+        if closure is None:
+            return
+        if created:
+            closure.objects.bulk_create(
+                [closure(ancestor_id=self.id, descendant_id=self.id, depth=0)]
+                + [
+                    closure(ancestor_id=ancestor_id, descendant_id=self.id, depth=depth + 1)
+                    for ancestor_id, depth in closure.objects.filter(
+                        descendant_id=self.parent_id,
+                    ).values_list("ancestor_id", "depth")
+                ]
+            )
+        else:
+            loaded_parent_id = getattr(self, "_loaded_parent_id", _UNKNOWN)
+            if loaded_parent_id is _UNKNOWN:
+                # the node was not loaded from the database with its parent
+                _move_subtree(closure, self.id, self.parent_id)
+            elif loaded_parent_id != self.parent_id:
+                _move_subtree(closure, self.id, self.parent_id)
+        self._loaded_parent_id = self.parent_id
+
     def get_ancestors(self, **kw):
         """
         Returns a Queryset of all ancestor locations of this location
@@ -196,6 +308,45 @@ class AdjListModel(models.Model):
         return self.children.all()
 
 
+_UNKNOWN = object()
+
+
+def _move_subtree(closure, node_id, parent_id):
+    """Replace the ancestors of the subtree of a node in the closure table
+
+    Does nothing if the ancestors of the node have not changed.
+    """
+    db = connections[router.db_for_write(closure)]
+    table = db.ops.quote_name(closure._meta.db_table)
+    with db.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT array_agg(ancestor_id ORDER BY depth) FROM {table}
+            WHERE descendant_id = %s AND depth > 0
+        """, [node_id])
+        old_ancestor_ids = cursor.fetchone()[0] or []
+        cursor.execute(f"""
+            SELECT array_agg(ancestor_id ORDER BY depth) FROM {table}
+            WHERE descendant_id = %s
+        """, [parent_id])
+        new_ancestor_ids = cursor.fetchone()[0] or []
+        if old_ancestor_ids == new_ancestor_ids:
+            return
+        cursor.execute(f"""
+            DELETE FROM {table}
+            WHERE descendant_id IN (
+                SELECT descendant_id FROM {table} WHERE ancestor_id = %(node_id)s
+            )
+            AND ancestor_id = ANY(%(old_ancestor_ids)s)
+        """, {"node_id": node_id, "old_ancestor_ids": old_ancestor_ids})
+        if parent_id is not None:
+            cursor.execute(f"""
+                INSERT INTO {table} (ancestor_id, descendant_id, depth)
+                SELECT sup.ancestor_id, sub.descendant_id, sup.depth + sub.depth + 1
+                FROM {table} sup, {table} sub
+                WHERE sup.descendant_id = %(parent_id)s AND sub.ancestor_id = %(node_id)s
+            """, {"node_id": node_id, "parent_id": parent_id})
+
+
 def _is_empty(queryset):
     query = queryset.query
     if query.is_empty():
@@ -1,6 +1,7 @@
+import hashlib
 from collections import defaultdict
 from itertools import groupby
-from xml.etree.cElementTree import Element, SubElement
+from xml.etree.cElementTree import Element, SubElement, tostring
 
 from django.contrib.postgres.fields.array import ArrayField
 from django.db.models import IntegerField, Q
@@ -9,6 +10,8 @@ from django_cte import With
 from django_cte.raw import raw_cte_sql
 
 from casexml.apps.phone.fixtures import FixtureProvider
+from dimagi.utils.chunked import chunked
+from dimagi.utils.couch.cache.cache_core import get_redis_default_cache
 
 from corehq import toggles
 from corehq.apps.app_manager.const import (
@@ -24,6 +27,10 @@ from corehq.apps.locations.models import (
     SQLLocation,
     get_domain_locations,
 )
+from corehq.util.metrics import metrics_counter
+
+LOCATION_FRAGMENT_CACHE_KEY_PREFIX = 'location-fixture-fragment'
+LOCATION_FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
 
 
 class LocationSet(object):
@@ -131,6 +138,12 @@ class HierarchicalLocationSerializer(object):
 
         if root_locations:
             data_fields = get_location_data_fields(domain)
+            if toggles.LOCATION_FIXTURE_FRAGMENTS.enabled(domain):
+                fragments = _get_location_fragments(domain, locations_db.by_id.values(), data_fields)
+                parts = [_start_tag(root_node.tag, root_node.attrib)]
+                _append_children_fragments(parts, locations_db, root_locations, fragments)
+                parts.append(_end_tag(root_node.tag))
+                return [b''.join(parts)]
             _append_children(root_node, locations_db, root_locations, data_fields)
         else:
             # There is a bug on mobile versions prior to 2.27 where
@@ -156,55 +169,87 @@ class FlatLocationSerializer(object):
         attrs_to_index = ['@{}'.format(attr) for attr in location_type_attrs]
         attrs_to_index.extend(['@id', '@type', 'name'])
 
-        return [get_index_schema_node(fixture_id, attrs_to_index),
-                self._get_fixture_node(fixture_id, user_id, locations_queryset,
-                                       location_type_attrs, data_fields)]
+        if toggles.LOCATION_FIXTURE_FRAGMENTS.enabled(domain):
+            fixture_node = self._get_fixture_bytes(domain, fixture_id, user_id, locations_queryset,
+                                                   location_type_attrs, data_fields)
+        else:
+            fixture_node = self._get_fixture_node(fixture_id, user_id, locations_queryset,
+                                                  location_type_attrs, data_fields)
+        return [get_index_schema_node(fixture_id, attrs_to_index), fixture_node]
 
     def _get_fixture_node(self, fixture_id, user_id, locations_queryset,
                           location_type_attrs, data_fields):
-        root_node = Element('fixture', {'id': fixture_id,
-                                        'user_id': user_id,
-                                        'indexed': 'true'})
+        root_node = self._get_root_node(fixture_id, user_id)
         outer_node = Element('locations')
         root_node.append(outer_node)
         all_locations = list(locations_queryset.order_by('site_code'))
         locations_by_id = {location.pk: location for location in all_locations}
         for location in all_locations:
-            attrs = {
-                'type': location.location_type.code,
-                'id': location.location_id,
-            }
-            attrs.update({attr: '' for attr in location_type_attrs})
-            attrs['{}_id'.format(location.location_type.code)] = location.location_id
-
-            current_location = location
-            while current_location.parent_id:
-                try:
-                    current_location = locations_by_id[current_location.parent_id]
-                except KeyError:
-                    current_location = current_location.parent
-
-                    # For some reason this wasn't included in the locations we already fetched
-                    from corehq.util.soft_assert import soft_assert
-                    _soft_assert = soft_assert('{}@{}.com'.format('frener', 'dimagi'))
-                    message = (
-                        "The flat location fixture didn't prefetch all parent "
-                        "locations: {domain}: {location_id}. User id: {user_id}"
-                    ).format(
-                        domain=current_location.domain,
-                        location_id=current_location.location_id,
-                        user_id=user_id,
-                    )
-                    _soft_assert(False, msg=message)
-
-                attrs['{}_id'.format(current_location.location_type.code)] = current_location.location_id
-
+            attrs = self._get_location_attrs(location, locations_by_id, location_type_attrs, user_id)
             location_node = Element('location', attrs)
             _fill_in_location_element(location_node, location, data_fields)
             outer_node.append(location_node)
 
         return root_node
 
+    def _get_fixture_bytes(self, domain, fixture_id, user_id, locations_queryset,
+                           location_type_attrs, data_fields):
+        """Like `_get_fixture_node`, but assembled from cached location
+        fragments, and serialized
+        """
+        all_locations = list(locations_queryset.order_by('site_code'))
+        if not all_locations:
+            return self._get_fixture_node(fixture_id, user_id, locations_queryset,
+                                          location_type_attrs, data_fields)
+        locations_by_id = {location.pk: location for location in all_locations}
+        fragments = _get_location_fragments(domain, all_locations, data_fields)
+        root_node = self._get_root_node(fixture_id, user_id)
+        parts = [_start_tag(root_node.tag, root_node.attrib), _start_tag('locations', {})]
+        for location in all_locations:
+            attrs = self._get_location_attrs(location, locations_by_id, location_type_attrs, user_id)
+            parts.append(_start_tag('location', attrs))
+            parts.append(fragments[location.location_id])
+            parts.append(_end_tag('location'))
+        parts.append(_end_tag('locations'))
+        parts.append(_end_tag(root_node.tag))
+        return b''.join(parts)
+
+    def _get_root_node(self, fixture_id, user_id):
+        return Element('fixture', {'id': fixture_id,
+                                   'user_id': user_id,
+                                   'indexed': 'true'})
+
+    def _get_location_attrs(self, location, locations_by_id, location_type_attrs, user_id):
+        attrs = {
+            'type': location.location_type.code,
+            'id': location.location_id,
+        }
+        attrs.update({attr: '' for attr in location_type_attrs})
+        attrs['{}_id'.format(location.location_type.code)] = location.location_id
+
+        current_location = location
+        while current_location.parent_id:
+            try:
+                current_location = locations_by_id[current_location.parent_id]
+            except KeyError:
+                current_location = current_location.parent
+
+                # For some reason this wasn't included in the locations we already fetched
+                from corehq.util.soft_assert import soft_assert
+                _soft_assert = soft_assert('{}@{}.com'.format('frener', 'dimagi'))
+                message = (
+                    "The flat location fixture didn't prefetch all parent "
+                    "locations: {domain}: {location_id}. User id: {user_id}"
+                ).format(
+                    domain=current_location.domain,
+                    location_id=current_location.location_id,
+                    user_id=user_id,
+                )
+                _soft_assert(False, msg=message)
+
+            attrs['{}_id'.format(current_location.location_type.code)] = current_location.location_id
+        return attrs
+
 
 def should_sync_hierarchical_fixture(project, app):
     if (not project.uses_locations
@@ -333,6 +378,87 @@ def _fill_in_location_element(xml_root, location, data_fields):
     xml_root.append(_get_metadata_node(location, data_fields))
 
 
+def _append_children_fragments(parts, location_db, locations, fragments):
+    """Like `_append_children`, but appends serialized elements to
+    `parts`, with the cached fragment of each location
+    """
+    for type, locs in _group_by_type(locations):
+        locs = sorted(locs, key=lambda loc: loc.name)
+        parts.append(_start_tag('%ss' % type.code, {}))  # hacky pluralization
+        for loc in locs:
+            parts.append(_start_tag(type.code, {'id': loc.location_id}))
+            parts.append(fragments[loc.location_id])
+            _append_children_fragments(parts, location_db, location_db.by_parent[loc.location_id], fragments)
+            parts.append(_end_tag(type.code))
+        parts.append(_end_tag('%ss' % type.code))
+
+
+def _start_tag(tag, attrs):
+    # serialized by ElementTree, so that the fixture is the same as one
+    # serialized from Elements
+    empty_element = tostring(Element(tag, attrs), encoding='utf-8')
+    assert empty_element.endswith(b' />'), empty_element
+    return empty_element[:-len(b' />')] + b'>'
+
+
+def _end_tag(tag):
+    return '</{}>'.format(tag).encode('utf-8')
+
+
+def _get_location_fragments(domain, locations, data_fields):
+    """Get the serialized child elements of the location element of
+    each location, by location ID
+
+    Fragments are cached by content: the key includes everything they
+    depend on, so only new and modified locations are rendered, and
+    entries never need to be invalidated.
+    """
+    fields_key = ' '.join(field.slug for field in data_fields)
+    keys = {
+        location.location_id: _get_fragment_cache_key(domain, location, fields_key)
+        for location in locations
+    }
+    cache = get_redis_default_cache()
+    cached = {}
+    for chunk in chunked(keys.values(), 1000):
+        cached.update(cache.get_many(chunk))
+
+    fragments = {}
+    to_cache = {}
+    for location in locations:
+        key = keys[location.location_id]
+        if key in cached:
+            fragments[location.location_id] = cached[key]
+        else:
+            fragments[location.location_id] = to_cache[key] = _render_location_fragment(location, data_fields)
+    for chunk in chunked(to_cache.items(), 1000):
+        cache.set_many(dict(chunk), timeout=LOCATION_FRAGMENT_CACHE_TIMEOUT)
+
+    tags = {'domain': domain}
+    metrics_counter('commcare.location_fixture.fragment_cache.hits', len(fragments) - len(to_cache), tags=tags)
+    metrics_counter('commcare.location_fixture.fragment_cache.misses', len(to_cache), tags=tags)
+    return fragments
+
+
+def _render_location_fragment(location, data_fields):
+    node = Element('location')
+    _fill_in_location_element(node, location, data_fields)
+    return b''.join(tostring(child, encoding='utf-8') for child in node)
+
+
+def _get_fragment_cache_key(domain, location, fields_key):
+    hashable_key = ','.join([
+        domain,
+        location.location_id,
+        location.last_modified.isoformat(),
+        # the location type name is rendered, and not modified with the location
+        location.location_type.name,
+        fields_key,
+    ])
+    key_hash = hashlib.md5(hashable_key.encode('utf-8')).hexdigest()
+    return '{}-{}'.format(LOCATION_FRAGMENT_CACHE_KEY_PREFIX, key_hash)
+
+
 def get_location_data_fields(domain):
     from corehq.apps.locations.views import LocationFieldsView
     fields_definition = CustomDataFieldsDefinition.get(domain, LocationFieldsView.field_type)
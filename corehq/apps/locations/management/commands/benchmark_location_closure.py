@@ -0,0 +1,119 @@
+import uuid
+from timeit import default_timer
+
+from django.core.management import BaseCommand
+from django.db import connections, router
+from django.test import override_settings
+
+from corehq.apps.locations.models import (
+    LocationClosure,
+    LocationType,
+    SQLLocation,
+)
+
+from .populate_location_closure import populate_location_closure
+
+
+class Command(BaseCommand):
+    """
+    Compare recursive queries with location closure table queries on a
+    synthetic location hierarchy.
+
+    Creates `--roots` trees of `--depth` levels, in which each location
+    has `--fanout` children (the defaults make 177k locations), in a new
+    domain that is deleted afterwards.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depth', type=int, default=11)
+        parser.add_argument('--fanout', type=int, default=3)
+        parser.add_argument('--roots', type=int, default=2)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, depth, fanout, roots, repeat, **options):
+        domain = f'benchmark-location-closure-{uuid.uuid4().hex[:8]}'
+        try:
+            levels = _make_hierarchy(domain, depth, fanout, roots)
+            print('locations: {}'.format(sum(len(level) for level in levels)))
+            start = default_timer()
+            count = populate_location_closure(domain)
+            print('closure rows: {} (populated in {:.1f}s)'.format(count, default_timer() - start))
+            self._benchmark(levels, repeat)
+        finally:
+            _delete_hierarchy(domain)
+
+    def _benchmark(self, levels, repeat):
+        leaf = SQLLocation.objects.get(id=levels[-1][-1])
+        root = SQLLocation.objects.get(id=levels[0][0])
+        mid = SQLLocation.objects.get(id=levels[len(levels) // 2][0])
+        mid_location_ids = list(SQLLocation.objects.filter(
+            id__in=levels[len(levels) // 2][:10]
+        ).location_ids())
+        queries = [
+            ('leaf ancestors', lambda: leaf.get_ancestors()),
+            ('mid descendants', lambda: mid.get_descendants()),
+            ('root descendants', lambda: root.get_descendants(include_self=True)),
+            ('locations and children',
+             lambda: SQLLocation.objects.get_locations_and_children(mid_location_ids)),
+        ]
+
+        print('{:<24}{:>10}{:>12}{:>12}'.format('query', 'rows', 'cte (s)', 'closure (s)'))
+        for name, query in queries:
+            with override_settings(USE_LOCATION_CLOSURE_TABLE=False):
+                expected = list(query().values_list('id', flat=True))
+                cte_time = _best_of(repeat, lambda: list(query()))
+            with override_settings(USE_LOCATION_CLOSURE_TABLE=True):
+                assert list(query().values_list('id', flat=True)) == expected, name
+                closure_time = _best_of(repeat, lambda: list(query()))
+            print('{:<24}{:>10}{:>12.3f}{:>12.3f}'.format(name, len(expected), cte_time, closure_time))
+
+
+def _best_of(repeat, fn):
+    times = []
+    for i in range(repeat):
+        start = default_timer()
+        fn()
+        times.append(default_timer() - start)
+    return min(times)
+
+
+def _make_hierarchy(domain, depth, fanout, roots):
+    """Create the locations level by level, bypassing `SQLLocation.save()`
+
+    :returns: A list of the location IDs of each level.
+    """
+    location_type = LocationType.objects.create(domain=domain, name='benchmark')
+    levels = []
+    parent_ids = [None] * roots
+    for level in range(depth):
+        children_per_parent = 1 if level == 0 else fanout
+        locations = SQLLocation.objects.bulk_create([
+            SQLLocation(
+                domain=domain,
+                name=f'{level}-{i}',
+                site_code=f'{level}-{i}',
+                location_id=uuid.uuid4().hex,
+                location_type=location_type,
+                parent_id=parent_id,
+            )
+            for i, parent_id in enumerate(
+                parent_id for parent_id in parent_ids for __ in range(children_per_parent)
+            )
+        ], batch_size=10000)
+        parent_ids = [loc.id for loc in locations]
+        levels.append(parent_ids)
+    return levels
+
+
+def _delete_hierarchy(domain):
+    # Faster than SQLLocation.delete(), which publishes the deletion of
+    # each location
+    db = connections[router.db_for_write(SQLLocation)]
+    with db.cursor() as cursor:
+        cursor.execute(f"""
+            DELETE FROM {LocationClosure._meta.db_table} WHERE descendant_id IN (
+                SELECT id FROM {SQLLocation._meta.db_table} WHERE domain = %s
+            )
+        """, [domain])
+        cursor.execute(f"DELETE FROM {SQLLocation._meta.db_table} WHERE domain = %s", [domain])
+    LocationType.objects.filter(domain=domain).delete()
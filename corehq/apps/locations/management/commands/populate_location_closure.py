@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dimagi.utils.chunked import chunked
+
+from corehq.apps.locations.models import LocationClosure, SQLLocation
+
+
+class Command(BaseCommand):
+    help = """
+    (Re)build the location closure table from the location hierarchy.
+    Run this before setting USE_LOCATION_CLOSURE_TABLE.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--domain',
+            action='append',
+            dest='domains',
+            help='Only rebuild the closure table of these domains',
+        )
+
+    def handle(self, domains, **options):
+        if not domains:
+            domains = (SQLLocation.objects.order_by('domain')
+                       .values_list('domain', flat=True).distinct())
+        for domain in domains:
+            count = populate_location_closure(domain)
+            print(f"{domain}: {count} location closure rows")
+
+
+def populate_location_closure(domain):
+    parent_ids = dict(
+        SQLLocation.objects.filter(domain=domain).values_list('id', 'parent_id')
+    )
+    with transaction.atomic():
+        LocationClosure.objects.filter(descendant__domain=domain).delete()
+        count = 0
+        for chunk in chunked(_iter_closure(parent_ids), 10000):
+            LocationClosure.objects.bulk_create(chunk)
+            count += len(chunk)
+    return count
+
+
+def _iter_closure(parent_ids):
+    for location_id in parent_ids:
+        ancestor_id = location_id
+        depth = 0
+        while ancestor_id is not None:
+            yield LocationClosure(ancestor_id=ancestor_id, descendant_id=location_id, depth=depth)
+            ancestor_id = parent_ids.get(ancestor_id)
+            depth += 1
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0020_delete_locationrelation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                               related_name='+', to='locations.SQLLocation')),
+                ('descendant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                                 related_name='+', to='locations.SQLLocation')),
+            ],
+            options={
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='locationclosure',
+            index=models.Index(fields=['descendant', 'depth'], name='locations_closure_desc_idx'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from collections import defaultdict
 from datetime import datetime
 from functools import partial
 
+from django.conf import settings
 from django.db import models, transaction
 from django.db.models import Q
 
@@ -393,10 +394,12 @@ class SQLLocation(AdjListModel):
         if not self.location_id:
             self.location_id = uuid.uuid4().hex
 
+        created = self._state.adding
         with transaction.atomic():
             set_site_code_if_needed(self)
             sync_supply_point(self)
             super(SQLLocation, self).save(*args, **kwargs)
+            self.update_closure(created)
 
         publish_location_saved(self.domain, self.location_id)
 
@@ -426,6 +429,14 @@ class SQLLocation(AdjListModel):
 
     full_delete = delete
 
+    @classmethod
+    def get_closure_model(cls):
+        return LocationClosure
+
+    @classmethod
+    def closure_queries_enabled(cls):
+        return settings.USE_LOCATION_CLOSURE_TABLE
+
     def get_descendants(self, include_self=False, **kwargs):
         if include_self:
             where = Q(domain=self.domain, id=self.id)
@@ -708,6 +719,30 @@ class SQLLocation(AdjListModel):
         return self
 
 
+class LocationClosure(models.Model):
+    """The closure table of the location hierarchy
+
+    Has a row for each location and each of its ancestors, and for each
+    location with itself at depth 0. It is kept up to date when
+    locations are saved, and its rows are deleted with their locations.
+    Ancestor and descendant queries use it instead of recursive queries
+    when `settings.USE_LOCATION_CLOSURE_TABLE` is set. Use the
+    `populate_location_closure` management command to (re)build it.
+    """
+    ancestor = models.ForeignKey(
+        SQLLocation, related_name='+', on_delete=models.CASCADE, db_index=False)
+    descendant = models.ForeignKey(
+        SQLLocation, related_name='+', on_delete=models.CASCADE, db_index=False)
+    depth = models.PositiveIntegerField()
+
+    class Meta(object):
+        app_label = 'locations'
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='locations_closure_desc_idx'),
+        ]
+
+
 def filter_for_archived(locations, include_archive_ancestors):
     """
     Perform filtering on a location queryset.
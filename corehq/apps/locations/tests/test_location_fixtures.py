@@ -33,6 +33,7 @@ from corehq.util.test_utils import flag_enabled, generate_cases
 from ..fixtures import (
     LocationSet,
     _location_to_fixture,
+    _render_location_fragment,
     get_location_data_fields,
     flat_location_fixture_generator,
     get_location_fixture_queryset,
@@ -107,7 +108,9 @@ class FixtureHasLocationsMixin(TestXmlMixin):
             generator = flat_location_fixture_generator
         else:
             generator = location_fixture_generator
-        fixture = ElementTree.tostring(call_fixture_generator(generator, self.user)[-1], encoding='utf-8')
+        fixture = call_fixture_generator(generator, self.user)[-1]
+        if not isinstance(fixture, bytes):
+            fixture = ElementTree.tostring(fixture, encoding='utf-8')
         desired_fixture = self._assemble_expected_fixture(xml_name, desired_locations)
         self.assertXmlEqual(desired_fixture, fixture)
 
@@ -331,6 +334,24 @@ class LocationFixturesTest(LocationHierarchyTestCase, FixtureHasLocationsMixin):
         )
 
 
+@flag_enabled('LOCATION_FIXTURE_FRAGMENTS')
+@mock.patch.object(Domain, 'uses_locations', lambda: True)  # removes dependency on accounting
+class LocationFixtureFragmentsTest(LocationFixturesTest):
+
+    def test_only_modified_locations_are_rendered(self):
+        self.user._couch_user.set_location(self.locations['Suffolk'])
+        call_fixture_generator(flat_location_fixture_generator, self.user)
+        revere = SQLLocation.objects.get(id=self.locations['Revere'].id)
+        revere.latitude = 42
+        revere.save()
+
+        with mock.patch('corehq.apps.locations.fixtures._render_location_fragment',
+                        wraps=_render_location_fragment) as render:
+            fixture = call_fixture_generator(flat_location_fixture_generator, self.user)[-1]
+        self.assertEqual([call.args[0].name for call in render.call_args_list], ['Revere'])
+        self.assertIn(b'<latitude>42', fixture)
+
+
 @mock.patch.object(Domain, 'uses_locations', lambda: True)  # removes dependency on accounting
 class ForkedHierarchiesTest(TestCase, FixtureHasLocationsMixin):
     def setUp(self):
@@ -1,14 +1,21 @@
 import pickle
 from contextlib import contextmanager
 
+from django.db.models import Q
+from django.test import override_settings
+
 from corehq.apps.users.dbaccessors import delete_all_users
 from corehq.apps.users.models import WebUser
 
+from ..management.commands.populate_location_closure import (
+    populate_location_closure,
+)
 from ..models import (
+    LocationClosure,
     SQLLocation,
     get_domain_locations,
 )
-from .util import LocationHierarchyTestCase
+from .util import LocationHierarchyTestCase, make_loc
 
 
 class BaseTestLocationQuerysetMethods(LocationHierarchyTestCase):
@@ -91,6 +98,77 @@ class TestLocationQuerysetMethods(BaseTestLocationQuerysetMethods):
             self.assertNotIn('California', names)
 
 
+@override_settings(USE_LOCATION_CLOSURE_TABLE=True)
+class TestLocationQuerysetMethodsWithClosure(TestLocationQuerysetMethods):
+    pass
+
+
+class TestLocationClosure(BaseTestLocationQuerysetMethods):
+
+    def _closure(self):
+        return set(LocationClosure.objects.filter(descendant__domain=self.domain).values_list(
+            'ancestor__name', 'descendant__name', 'depth'))
+
+    def _ancestors(self, name):
+        return {(a, d) for a, d, depth in self._closure() if d == name and depth}
+
+    def test_saved_closure_matches_populated_closure(self):
+        saved = self._closure()
+        self.assertIn(('Massachusetts', 'Boston', 2), saved)
+        self.assertIn(('Boston', 'Boston', 0), saved)
+        populate_location_closure(self.domain)
+        self.assertEqual(self._closure(), saved)
+
+    def test_create(self):
+        make_loc('Chelsea', domain=self.domain, type='city', parent=self.locations['Suffolk'])
+        self.assertEqual(
+            self._ancestors('Chelsea'),
+            {('Suffolk', 'Chelsea'), ('Massachusetts', 'Chelsea')},
+        )
+
+    def test_move(self):
+        suffolk = SQLLocation.objects.get(name='Suffolk')
+        suffolk.parent = self.locations['California']
+        suffolk.save()
+        self.assertEqual(self._ancestors('Suffolk'), {('California', 'Suffolk')})
+        self.assertEqual(
+            self._ancestors('Boston'),
+            {('Suffolk', 'Boston'), ('California', 'Boston')},
+        )
+        populate_location_closure(self.domain)
+        self.assertEqual(self._ancestors('Boston'), {('Suffolk', 'Boston'), ('California', 'Boston')})
+
+    def test_move_deferred_parent(self):
+        suffolk = SQLLocation.objects.defer('parent').get(name='Suffolk')
+        suffolk.parent = self.locations['California']
+        suffolk.save()
+        self.assertEqual(self._ancestors('Boston'), {('Suffolk', 'Boston'), ('California', 'Boston')})
+
+    def test_delete(self):
+        SQLLocation.objects.filter(domain=self.domain, name='Suffolk').delete()
+        self.assertEqual({d for a, d, depth in self._closure() if a == 'Suffolk'}, set())
+        self.assertEqual(self._ancestors('Boston'), set())
+
+    def test_descendants_order_matches_recursive_query(self):
+        where = Q(domain=self.domain, name__in=['Massachusetts', 'Middlesex', 'California'])
+        with override_settings(USE_LOCATION_CLOSURE_TABLE=False):
+            expected = list(SQLLocation.objects.get_descendants(where).values_list('name', flat=True))
+        with override_settings(USE_LOCATION_CLOSURE_TABLE=True):
+            actual = list(SQLLocation.objects.get_descendants(where).values_list('name', flat=True))
+        self.assertEqual(actual, expected)
+
+    def test_ancestors_order_matches_recursive_query(self):
+        boston = SQLLocation.objects.get(name='Boston')
+        for ascending in [True, False]:
+            with override_settings(USE_LOCATION_CLOSURE_TABLE=False):
+                expected = list(boston.get_ancestors(include_self=True, ascending=ascending)
+                                .values_list('name', '_depth'))
+            with override_settings(USE_LOCATION_CLOSURE_TABLE=True):
+                actual = list(boston.get_ancestors(include_self=True, ascending=ascending)
+                              .values_list('name', '_depth'))
+            self.assertEqual(actual, expected)
+
+
 class TestLocationScopedQueryset(BaseTestLocationQuerysetMethods):
 
     @classmethod
@@ -218,6 +296,11 @@ class TestFilterByUserInput(LocationHierarchyTestCase):
             self.assertItemsEqual(actual, expected, error_msg)
 
 
+@override_settings(USE_LOCATION_CLOSURE_TABLE=True)
+class TestFilterByUserInputWithClosure(TestFilterByUserInput):
+    pass
+
+
 @contextmanager
 def california_secedes():
     california = SQLLocation.objects.get(name="California")
@@ -9,12 +9,15 @@ from couchdbkit import ResourceNotFound
 
 import couchforms
 from corehq.apps.receiverwrapper.rate_limiter import rate_limit_submission
+from couchforms.const import MAGIC_PROPERTY
+from couchforms.exceptions import BadSubmissionRequest
 from couchforms.models import DefaultAuthContext
 
 from corehq.apps.app_manager.dbaccessors import get_app
 from corehq.apps.app_manager.models import ApplicationBase
 from corehq.apps.receiverwrapper.exceptions import LocalSubmissionError
 from corehq.apps.users.models import CommCareUser
+from corehq.form_processor.bulk_submission import BULK_SUBMISSION_MAX_FORMS
 from corehq.form_processor.submission_post import SubmissionPost
 from corehq.form_processor.utils import convert_xform_to_json
 from corehq.util.quickcache import quickcache
@@ -58,6 +61,42 @@ def submit_form_locally(instance, domain, max_wait=..., **kwargs):
     return result
 
 
+def get_bulk_submission_instances(request):
+    """Get the form instances of a bulk submission, in order
+
+    Either a multipart request with one ``xml_submission_file`` part per
+    form, or a newline-delimited body (``application/x-ndjson``) with the
+    XML of one form as a JSON string on each line.
+
+    :raises: BadSubmissionRequest
+    """
+    content_type = request.META.get('CONTENT_TYPE', '')
+    if content_type.startswith('application/x-ndjson'):
+        instances = []
+        for line_number, line in enumerate(request.body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                instance = json.loads(line)
+            except ValueError:
+                instance = None
+            if not isinstance(instance, str):
+                raise BadSubmissionRequest(
+                    'Line {} is not a JSON string'.format(line_number)
+                )
+            instances.append(instance.encode('utf-8'))
+    else:
+        instances = [f.read() for f in request.FILES.getlist(MAGIC_PROPERTY)]
+    if not instances:
+        raise BadSubmissionRequest('No forms submitted')
+    if len(instances) > BULK_SUBMISSION_MAX_FORMS:
+        raise BadSubmissionRequest(
+            'At most {} forms can be submitted at once'.format(BULK_SUBMISSION_MAX_FORMS),
+            status_code=413,
+        )
+    return instances
+
+
 def get_meta_appversion_text(form_metadata):
     try:
         text = form_metadata['appVersion']
@@ -1,7 +1,13 @@
 import os
 import logging
+from functools import partial
 
-from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+)
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
@@ -45,9 +51,14 @@ from corehq.apps.receiverwrapper.util import (
     DEMO_SUBMIT_MODE,
     from_demo_user,
     get_app_and_build_ids,
+    get_bulk_submission_instances,
     should_ignore_submission,
 )
-from corehq.form_processor.exceptions import XFormLockError
+from corehq.form_processor.bulk_submission import (
+    BulkSubmissionPost,
+    get_bulk_result_response,
+)
+from corehq.form_processor.exceptions import SubmissionRateLimited, XFormLockError
 from corehq.form_processor.models import CommCareCase
 from corehq.form_processor.submission_post import SubmissionPost
 from corehq.form_processor.utils import convert_xform_to_json
@@ -224,6 +235,80 @@ def post_api(request, domain):
     )
 
 
+@waf_allow('XSS_BODY')
+@csrf_exempt
+@api_auth()
+@require_permission(HqPermissions.edit_data)
+@require_permission(HqPermissions.access_api)
+@require_POST
+@check_domain_migration
+@toggles.BULK_FORM_SUBMISSION.required_decorator()
+@set_request_duration_reporting_threshold(300)
+def post_api_bulk(request, domain):
+    """Submit many forms in one request
+
+    Responds with a JSON list holding the status code and OpenRosa
+    response of each form, in the order the forms were submitted. The
+    submission rate limit is checked before each form is processed. Once
+    a form is rate limited, it and the forms that were not processed yet
+    are rejected with status 429.
+    """
+    if rate_limit_submission(domain):
+        return HttpTooManyRequests()
+
+    metric_tags = {
+        'backend': 'sql',
+        'domain': domain
+    }
+    try:
+        instances = get_bulk_submission_instances(request)
+    except BadSubmissionRequest as e:
+        response = HttpResponse(e.message, status=e.status_code)
+        _record_metrics(metric_tags, 'known_failures', response)
+        return response
+
+    if toggles.FORM_SUBMISSION_BLACKLIST.enabled(domain):
+        response = openrosa_response.BLACKLISTED_RESPONSE
+        _record_metrics(metric_tags, 'blacklisted', response)
+        return response
+
+    with TimingContext() as timer:
+        results = BulkSubmissionPost(
+            instances,
+            domain=domain,
+            auth_context=AuthContext(
+                domain=domain,
+                user_id=request.couch_user.get_id,
+                authenticated=True,
+            ),
+            location=couchforms.get_location(request),
+            received_on=couchforms.get_received_on(request),
+            date_header=couchforms.get_date_header(request),
+            path=couchforms.get_path(request),
+            submit_ip=couchforms.get_submit_ip(request),
+            openrosa_headers=couchforms.get_openrosa_headers(request),
+            timing_context=timer,
+            is_rate_limited=partial(rate_limit_submission, domain),
+        ).run()
+
+    form_responses = []
+    for result in results:
+        response = get_bulk_result_response(result)
+        if isinstance(result, SubmissionRateLimited):
+            _record_metrics(dict(metric_tags), 'rate_limited', response)
+        elif isinstance(result, Exception):
+            _record_metrics(dict(metric_tags), 'error', response)
+        else:
+            _record_metrics(dict(metric_tags), result.submission_type, response, xform=result.xform)
+        form_responses.append({
+            'status_code': response.status_code,
+            'response': response.content.decode('utf-8'),
+        })
+    response = JsonResponse(form_responses, safe=False)
+    response.request_timer = timer  # logged as Sentry breadcrumbs in LogLongRequestMiddleware
+    return response
+
+
 @waf_allow('XSS_BODY')
 @location_safe
 @csrf_exempt
@@ -29,6 +29,8 @@ LENIENT_MAXIMUM_EXPANSION = 50
 UCR_CELERY_QUEUE = 'ucr_queue'
 UCR_INDICATOR_CELERY_QUEUE = 'ucr_indicator_queue'
 
+PARALLEL_REBUILD_DEFAULT_WORKERS = 4
+
 KAFKA_TOPICS = (
     topics.CASE_SQL,
     topics.FORM_SQL,
@@ -0,0 +1,154 @@
+"""
+Sharing of structurally identical expressions across data sources.
+
+Domains with many data sources over the same document type tend to
+repeat the same expressions (often copied from one data source to the
+next) in their filters and indicators. Evaluated independently, every
+``related_doc`` lookup or named expression is repeated for each data
+source the document is processed for.
+
+Data sources built with an ``ExpressionCompiler`` wrap each expression
+they build in a ``SharedExpression`` identified by its fully resolved
+spec (named expressions and filters are inlined). The
+``SharedExpressionRegistry`` for a domain counts how many of its data
+sources use each spec: when a spec is used by more than one data source
+its result for the root document is stored in the
+``EvaluationContext`` cache, which lives for the processing of a single
+document, and reused by all other data sources.
+"""
+import json
+from collections import Counter
+
+SHARED_EXPRESSION_CACHE_PREFIX = 'shared_expression'
+
+# cheaper to evaluate than to look up in the cache
+UNSHARED_EXPRESSION_TYPES = frozenset([
+    'base_iteration_number',
+    'constant',
+    'identity',
+    'utcnow',
+])
+
+
+class SharedExpressionRegistry:
+    """Usage counts of expression specs across the data sources of a domain"""
+
+    def __init__(self):
+        self.uses = Counter()
+        self._compilers = {}
+
+    def get_compiler(self, config):
+        """Get the compiler of a data source, replacing the uses of any
+        previous version of the data source"""
+        self.remove(config)
+        compiler = ExpressionCompiler(self, config.named_expressions, config.named_filters)
+        self._compilers[_get_data_source_key(config)] = compiler
+        return compiler
+
+    def remove(self, config):
+        """Stop counting the uses of a data source"""
+        compiler = self._compilers.pop(_get_data_source_key(config), None)
+        if compiler is not None:
+            self.uses.subtract(compiler.keys)
+
+
+def _get_data_source_key(config):
+    return config._id or id(config)
+
+
+class ExpressionCompiler:
+    """Wraps the expressions built for one data source in shared expressions
+
+    :param named_expressions: Named expression specs of the data source.
+    :param named_filters: Named filter specs of the data source.
+    """
+
+    def __init__(self, registry, named_expressions, named_filters):
+        self.registry = registry
+        self.named_expressions = named_expressions
+        self.named_filters = named_filters
+        # keys used by the data source, which count once however many
+        # times its expressions are built
+        self.keys = set()
+
+    def compile(self, spec, expression):
+        key = self.get_key(spec)
+        if key is None:
+            return expression
+        if key not in self.keys:
+            self.keys.add(key)
+            self.registry.uses[key] += 1
+        return SharedExpression(expression, key, self.registry.uses)
+
+    def get_key(self, spec):
+        """Get a string identifying the evaluation of the given spec
+
+        :returns: A key or ``None`` if the spec cannot be shared.
+        """
+        if spec.get('type') in UNSHARED_EXPRESSION_TYPES:
+            return None
+        try:
+            resolved = self._resolve(spec, ())
+        except _Unresolvable:
+            return None
+        return json.dumps(resolved, sort_keys=True, separators=(',', ':'), default=str)
+
+    def _resolve(self, spec, names):
+        if isinstance(spec, list):
+            return [self._resolve(item, names) for item in spec]
+        if not isinstance(spec, dict):
+            return spec
+        if spec.get('type') == 'named':
+            # filter and expression references have the same shape
+            name = spec.get('name')
+            if name in names or (name not in self.named_expressions and name not in self.named_filters):
+                # reference cycle (invalid) or defined outside the data source
+                raise _Unresolvable
+            names += (name,)
+            if name not in self.named_filters:
+                return self._resolve(self.named_expressions[name], names)
+            if name not in self.named_expressions:
+                return self._resolve(self.named_filters[name], names)
+            return {
+                'type': 'named',
+                'expression': self._resolve(self.named_expressions[name], names),
+                'filter': self._resolve(self.named_filters[name], names),
+            }
+        if spec.get('type') == 'evaluator' and 'named' in str(spec.get('statement')):
+            # named expressions referenced from the statement are resolved on evaluation
+            raise _Unresolvable
+        return {key: self._resolve(value, names) for key, value in spec.items()}
+
+
+class SharedExpression:
+    """Expression whose result for the root document is shared by all
+    structurally identical expressions"""
+
+    def __init__(self, expression, key, uses):
+        self.expression = expression
+        self.key = key
+        self._uses = uses
+
+    def __call__(self, item, evaluation_context=None):
+        if (evaluation_context is None
+                or item is not evaluation_context.root_doc
+                or self._uses[self.key] < 2):
+            return self.expression(item, evaluation_context)
+        cache_key = (SHARED_EXPRESSION_CACHE_PREFIX, self.key, evaluation_context.iteration)
+        if evaluation_context.exists_in_cache(cache_key):
+            return evaluation_context.get_cache_value(cache_key)
+        result = self.expression(item, evaluation_context)
+        evaluation_context.set_cache_value(cache_key, result)
+        return result
+
+    def __getattr__(self, name):
+        if name == 'expression':
+            raise AttributeError(name)
+        return getattr(self.expression, name)
+
+    def __str__(self):
+        return str(self.expression)
+
+
+class _Unresolvable(Exception):
+    pass
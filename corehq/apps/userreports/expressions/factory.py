@@ -389,7 +389,7 @@ class ExpressionFactory(object):
         if _is_literal(spec):
             return cls.from_spec(_convert_constant_to_expression_spec(spec), factory_context)
         try:
-            return cls.spec_map[spec['type']](spec, factory_context)
+            expression = cls.spec_map[spec['type']](spec, factory_context)
         except KeyError:
             raise BadSpecError(_('Invalid or missing expression type: {} for expression: {}. '
                                  'Valid options are: {}').format(
@@ -402,6 +402,9 @@ class ExpressionFactory(object):
                 json.dumps(spec, indent=2, default=json_handler),
                 str(e),
             ))
+        if factory_context.expression_compiler is not None:
+            expression = factory_context.expression_compiler.compile(spec, expression)
+        return expression
 
 
 def _is_literal(value):
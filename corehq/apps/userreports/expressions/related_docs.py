@@ -0,0 +1,196 @@
+"""
+Batched loading of the documents ``related_doc`` expressions refer to.
+
+Many documents processed together often refer to the same few related
+documents (forms of the same case, cases at the same location). Rather
+than loading each related document with its own query when an
+expression needs it, ``prefetch_related_docs`` evaluates the
+``doc_id_expression`` of the ``related_doc`` expressions of a set of data
+sources for a whole chunk of documents, and loads all related documents
+with one ``iter_documents`` call per document type into a
+``RelatedDocCache``. Expressions evaluated with that cache on their
+``EvaluationContext`` read from it and fall back to loading documents
+one at a time on a miss.
+
+Only ``related_doc`` expressions evaluated against the root document
+whose ``doc_id_expression`` is a pure function of the document (no
+further lookups) are prefetched. Prefetching is only an optimization:
+documents that are not prefetched are still loaded when needed.
+"""
+from collections import OrderedDict, defaultdict
+
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.specs import EvaluationContext
+from corehq.util.metrics import metrics_counter
+
+RELATED_DOC_CACHE_SIZE = 5000
+PREFETCH_CHUNK_SIZE = 1000
+
+# expression and filter types that can be evaluated without loading data
+PURE_SPEC_TYPES = frozenset([
+    'and',
+    'array_index',
+    'boolean_expression',
+    'coalesce',
+    'conditional',
+    'constant',
+    'dict',
+    'identity',
+    'jsonpath',
+    'named',
+    'nested',
+    'not',
+    'or',
+    'property_name',
+    'property_path',
+    'root_doc',
+    'split_string',
+    'switch',
+])
+
+# keys of sub-expressions that are not evaluated against the same item
+# as the expression they are part of
+ITEM_CHANGING_KEYS = frozenset([
+    'filter_expression',
+    'map_expression',
+    'sort_expression',
+    'value_expression',
+])
+
+
+class RelatedDocCache(object):
+    """Related documents shared by the evaluation of a chunk of documents
+
+    Least recently used documents are dropped when more than
+    ``max_size`` documents are cached.
+    """
+
+    def __init__(self, max_size=RELATED_DOC_CACHE_SIZE):
+        self.max_size = max_size
+        self._docs = OrderedDict()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def get(self, domain, doc_type, doc_id):
+        key = (domain, doc_type, doc_id)
+        doc = self._docs.get(key)
+        if doc is not None:
+            self._docs.move_to_end(key)
+        return doc
+
+    def add(self, domain, doc_type, doc):
+        doc_id = doc.get('_id')
+        if not doc_id:
+            return
+        key = (domain, doc_type, doc_id)
+        self._docs[key] = doc
+        self._docs.move_to_end(key)
+        while len(self._docs) > self.max_size:
+            self._docs.popitem(last=False)
+
+    def prefetch(self, domain, doc_type, doc_ids, load_source):
+        doc_ids = [
+            doc_id for doc_id in doc_ids
+            if (domain, doc_type, doc_id) not in self._docs
+        ][:self.max_size]
+        if not doc_ids:
+            return
+        document_store = get_document_store_for_doc_type(domain, doc_type, load_source=load_source)
+        fetched = 0
+        for doc in document_store.iter_documents(doc_ids):
+            self.add(domain, doc_type, doc)
+            fetched += 1
+        tags = {'doc_type': doc_type, 'load_source': load_source}
+        metrics_counter('commcare.ucr.related_doc_prefetch.requested', len(doc_ids), tags=tags)
+        metrics_counter('commcare.ucr.related_doc_prefetch.fetched', fetched, tags=tags)
+
+
+def prefetch_related_docs(configs, docs, cache, load_source):
+    """Load the documents that ``related_doc`` expressions of the given
+    data sources will need for the given documents into the cache
+    """
+    doc_ids_by_key = defaultdict(dict)  # ordered set
+    for config in configs:
+        id_expressions = get_related_doc_id_expressions(config)
+        if not id_expressions:
+            continue
+        for doc in docs:
+            if doc.get('doc_type') != config.referenced_doc_type or not doc.get('domain'):
+                continue
+            context = EvaluationContext(doc)
+            for doc_type, id_expression in id_expressions:
+                try:
+                    doc_id = id_expression(doc, context)
+                except Exception:
+                    # will fail again, and be handled, on evaluation
+                    continue
+                if doc_id and isinstance(doc_id, str):
+                    doc_ids_by_key[(doc['domain'], doc_type)][doc_id] = None
+    for (domain, doc_type), doc_ids in doc_ids_by_key.items():
+        cache.prefetch(domain, doc_type, list(doc_ids), load_source)
+
+
+def get_related_doc_id_expressions(config):
+    """Get ``(related_doc_type, doc_id_expression)`` pairs for the
+    ``related_doc`` expressions of a data source that can be prefetched
+    """
+    try:
+        return config._related_doc_id_expressions
+    except AttributeError:
+        pass
+    specs = [config.configured_filter]
+    if not config.base_item_expression:
+        specs.extend(config.configured_indicators)
+    expressions = []
+    seen = set()
+    factory_context = config.get_factory_context()
+    for spec in _iter_root_related_doc_specs(specs, config.named_expressions, ()):
+        key = (spec['related_doc_type'], repr(spec['doc_id_expression']))
+        if key in seen or not _is_pure(spec['doc_id_expression'], config.named_expressions, ()):
+            continue
+        seen.add(key)
+        expressions.append((
+            spec['related_doc_type'],
+            ExpressionFactory.from_spec(spec['doc_id_expression'], factory_context),
+        ))
+    config._related_doc_id_expressions = expressions
+    return expressions
+
+
+def _iter_root_related_doc_specs(spec, named_expressions, names):
+    if isinstance(spec, list):
+        for item in spec:
+            yield from _iter_root_related_doc_specs(item, named_expressions, names)
+        return
+    if not isinstance(spec, dict):
+        return
+    if spec.get('type') == 'named':
+        name = spec.get('name')
+        if name in named_expressions and name not in names:
+            yield from _iter_root_related_doc_specs(named_expressions[name], named_expressions, names + (name,))
+        return
+    if (spec.get('type') == 'related_doc' and spec.get('related_doc_type')
+            and isinstance(spec.get('doc_id_expression'), dict)):
+        yield spec
+    for key, value in spec.items():
+        if key not in ITEM_CHANGING_KEYS:
+            yield from _iter_root_related_doc_specs(value, named_expressions, names)
+
+
+def _is_pure(spec, named_expressions, names):
+    if isinstance(spec, list):
+        return all(_is_pure(item, named_expressions, names) for item in spec)
+    if not isinstance(spec, dict):
+        return True
+    if 'type' in spec and spec['type'] not in PURE_SPEC_TYPES:
+        return False
+    if spec.get('type') == 'named':
+        name = spec.get('name')
+        if name not in named_expressions or name in names:
+            return False
+        return _is_pure(named_expressions[name], named_expressions, names + (name,))
+    return all(_is_pure(value, named_expressions, names) for value in spec.values())
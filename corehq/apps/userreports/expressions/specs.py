@@ -600,14 +600,22 @@ class RelatedDocExpressionSpec(JsonObject):
     @staticmethod
     @ucr_context_cache(vary_on=('related_doc_type', 'doc_id',))
     def _get_document(related_doc_type, doc_id, evaluation_context):
-        document_store = get_document_store_for_doc_type(
-            evaluation_context.root_doc['domain'], related_doc_type,
-            load_source="related_doc_expression")
-        try:
-            doc = document_store.get_document(doc_id)
-        except DocumentNotFoundError:
-            return None
-        if evaluation_context.root_doc['domain'] != doc.get('domain'):
+        domain = evaluation_context.root_doc['domain']
+        related_doc_cache = evaluation_context.related_doc_cache
+        doc = None
+        if related_doc_cache is not None:
+            doc = related_doc_cache.get(domain, related_doc_type, doc_id)
+        if doc is None:
+            document_store = get_document_store_for_doc_type(
+                domain, related_doc_type,
+                load_source="related_doc_expression")
+            try:
+                doc = document_store.get_document(doc_id)
+            except DocumentNotFoundError:
+                return None
+            if related_doc_cache is not None:
+                related_doc_cache.add(domain, related_doc_type, doc)
+        if domain != doc.get('domain'):
             return None
         return doc
 
@@ -615,7 +623,9 @@ class RelatedDocExpressionSpec(JsonObject):
         assert evaluation_context.root_doc['domain']
         doc = self._get_document(self.related_doc_type, doc_id, evaluation_context)
         # explicitly use a new evaluation context since this is a new document
-        return self._value_expression(doc, EvaluationContext(doc, 0))
+        related_context = EvaluationContext(doc, 0)
+        related_context.related_doc_cache = evaluation_context.related_doc_cache
+        return self._value_expression(doc, related_context)
 
     def __str__(self):
         return "{}[{}]/{}".format(self.related_doc_type,
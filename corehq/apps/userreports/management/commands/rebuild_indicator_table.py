@@ -1,4 +1,4 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from corehq.apps.userreports import tasks
 
@@ -12,9 +12,21 @@ class Command(BaseCommand):
                             help='Rebuild table in place (preserve existing data)')
         parser.add_argument('--initiated-by', action='store', required=True, dest='initiated',
                             help='Who initiated the rebuild (for sending email notifications)')
+        parser.add_argument('--parallel', type=int, dest='num_workers', default=None,
+                            help='Split the rebuild across this many celery tasks. '
+                                 'Only supported for form and case data sources.')
 
     def handle(self, indicator_config_id, **options):
-        if options['in_place']:
+        if options['num_workers'] and options['in_place']:
+            raise CommandError('--parallel is not supported with --in-place')
+        if options['num_workers']:
+            tasks.rebuild_indicators_in_parallel(
+                indicator_config_id,
+                initiated_by=options['initiated'],
+                num_workers=options['num_workers'],
+                source='rebuild_indicator_table',
+            )
+        elif options['in_place']:
             tasks.rebuild_indicators_in_place(
                 indicator_config_id, options['initiated'], source='rebuild_indicator_table'
             )
@@ -232,6 +232,7 @@ class DataSourceBuildInformation(DocumentSchema):
                 'corehq.apps.userreports.tasks.rebuild_indicators',
                 'corehq.apps.userreports.tasks.rebuild_indicators_in_place',
                 'corehq.apps.userreports.tasks.resume_building_indicators',
+                'corehq.apps.userreports.tasks.rebuild_indicators_in_parallel',
             )
             initiated_at = none_max(self.initiated, self.initiated_in_place)
             start = format_datetime(initiated_at - timedelta(seconds=60))
@@ -467,7 +468,12 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
         named_expression_specs = deepcopy(self.named_expressions)
         named_expressions = {}
         spec_error = None
-        factory_context = FactoryContext(named_expressions=named_expressions, named_filters={}, domain=self.domain)
+        factory_context = FactoryContext(
+            named_expressions=named_expressions,
+            named_filters={},
+            domain=self.domain,
+            expression_compiler=self._expression_compiler,
+        )
         while named_expression_specs:
             number_generated = 0
             for name, expression in list(named_expression_specs.items()):
@@ -489,14 +495,35 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
     @property
     @memoized
     def named_filter_objects(self):
-        factory_context = FactoryContext(self.named_expression_objects, {}, domain=self.domain)
+        factory_context = FactoryContext(
+            self.named_expression_objects, {}, domain=self.domain, expression_compiler=self._expression_compiler
+        )
         return {
             name: FilterFactory.from_spec(filter, factory_context)
             for name, filter in self.named_filters.items()
         }
 
     def get_factory_context(self):
-        return FactoryContext(self.named_expression_objects, self.named_filter_objects, self.domain)
+        return FactoryContext(
+            self.named_expression_objects,
+            self.named_filter_objects,
+            self.domain,
+            expression_compiler=self._expression_compiler,
+        )
+
+    @property
+    def _expression_compiler(self):
+        return getattr(self, '_shared_expression_compiler', None)
+
+    def share_expressions(self, registry):
+        """Share the results of expressions that are also used by other
+        data sources registered with the given registry
+
+        Must be called before any filters or indicators are built.
+
+        :param registry: A ``SharedExpressionRegistry``.
+        """
+        self._shared_expression_compiler = registry.get_compiler(self)
 
     @property
     @memoized
@@ -724,8 +751,12 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
         if not isinstance(expression, dict):
             return [None]
 
-        if expression['type'] == 'property_name' and expression['property_name'] == property_name:
+        if (expression['type'] == 'property_name' and expression['property_name'] == property_name
+                and expression.get('datatype') in (None, 'string')):
             prop_value = config_filter['property_value']
+            if config_filter['operator'] == 'in' and not isinstance(prop_value, list):
+                # substring match
+                return [None]
             if not isinstance(prop_value, list):
                 prop_value = [prop_value]
             return prop_value
@@ -13,7 +13,10 @@ from corehq.apps.change_feed.consumer.feed import (
 from corehq.apps.change_feed.topics import LOCATION as LOCATION_TOPIC, CASE_TOPICS
 from corehq.apps.domain.dbaccessors import get_domain_ids_by_names
 from corehq.apps.domain_migration_flags.api import all_domains_with_migrations_in_progress
-from corehq.apps.userreports.const import KAFKA_TOPICS
+from corehq.apps.userreports.const import (
+    FILTER_INTERPOLATION_DOC_TYPES,
+    KAFKA_TOPICS,
+)
 from corehq.apps.userreports.data_source_providers import (
     DynamicDataSourceProvider,
     StaticDataSourceProvider, RegistryDataSourceProvider,
@@ -21,11 +24,17 @@ from corehq.apps.userreports.data_source_providers import (
 from corehq.apps.userreports.exceptions import (
     UserReportsWarning,
 )
+from corehq.apps.userreports.expressions.compiler import SharedExpressionRegistry
+from corehq.apps.userreports.expressions.related_docs import (
+    RelatedDocCache,
+    prefetch_related_docs,
+)
 from corehq.apps.userreports.models import AsyncIndicator
 from corehq.apps.userreports.pillow_utils import rebuild_sql_tables
 from corehq.apps.userreports.specs import EvaluationContext
 from corehq.apps.userreports.util import get_indicator_adapter
 from corehq.pillows.base import is_couch_change_for_sql_domain
+from corehq.toggles import UCR_RELATED_DOC_PREFETCH, UCR_SHARED_EXPRESSIONS
 from corehq.util.metrics import metrics_counter, metrics_histogram_timer
 from corehq.util.timer import TimingContext
 from pillowtop.checkpoints.manager import KafkaPillowCheckpoint
@@ -112,6 +121,76 @@ def _get_indicator_adapter_for_pillow(config):
     return get_indicator_adapter(config, raise_errors=True, load_source='change_feed')
 
 
+class AdapterRoutingIndex(object):
+    """Adapters of a domain indexed by the doc type and case type or
+    xmlns their filters require
+
+    Adapters whose filter cannot match a document are skipped without
+    evaluating the filter. See ``get_case_type_or_xmlns_filter``.
+    """
+
+    def __init__(self, adapters):
+        self.adapters = list(adapters)
+        self._positions = {id(adapter): i for i, adapter in enumerate(self.adapters)}
+        self._by_doc_type = defaultdict(list)
+        self._by_filter_value = defaultdict(list)
+        self._by_subtype = defaultdict(list)
+        for adapter in self.adapters:
+            config = adapter.config
+            self._by_doc_type[config.referenced_doc_type].append(adapter)
+            for value in _unique_hashable(config.get_case_type_or_xmlns_filter()):
+                # None if the filter doesn't restrict the case type or xmlns
+                self._by_filter_value[(config.referenced_doc_type, value)].append(adapter)
+                if value is not None:
+                    self._by_subtype[value].append(adapter)
+
+    def get_candidates(self, doc):
+        """Get the adapters whose filter may match the doc, in order"""
+        doc_type = doc.get('doc_type')
+        property_name = FILTER_INTERPOLATION_DOC_TYPES.get(doc_type)
+        if property_name is None:
+            return self._by_doc_type.get(doc_type, [])
+        value = doc.get(property_name)
+        try:
+            matching = self._by_filter_value.get((doc_type, value), [])
+        except TypeError:
+            # unhashable value
+            return self._by_doc_type.get(doc_type, [])
+        unfiltered = self._by_filter_value.get((doc_type, None), [])
+        if not matching or value is None:
+            return unfiltered
+        if not unfiltered:
+            return matching
+        # an adapter whose filter allows None and other values is in both
+        adapters = {id(adapter): adapter for adapter in matching + unfiltered}
+        return sorted(adapters.values(), key=lambda adapter: self._positions[id(adapter)])
+
+    def get_deletion_candidates(self, doc_subtype, candidates):
+        """Get adapters that are not candidates for the doc but must
+        delete it
+
+        A doc is deleted from an adapter whose filter does not match it
+        if the subtype is unknown or in the adapter's filter, since it
+        may have been saved to the adapter before it changed.
+        """
+        adapters = self._by_subtype.get(doc_subtype, []) if doc_subtype else self.adapters
+        candidate_ids = {id(adapter) for adapter in candidates}
+        return [adapter for adapter in adapters if id(adapter) not in candidate_ids]
+
+
+def _unique_hashable(values):
+    unique = []
+    for value in values:
+        try:
+            hash(value)
+        except TypeError:
+            # can't be indexed: treat as unrestricted
+            value = None
+        if value not in unique:
+            unique.append(value)
+    return unique
+
+
 class UcrTableManager(ABC):
     """Base class for table managers that encapsulates the bootstrap and refresh
     functionality."""
@@ -180,6 +259,10 @@ class UcrTableManager(ABC):
         """Get the list of table adapters for the given domain."""
         pass
 
+    def get_adapter_index(self, domain):
+        """Get an ``AdapterRoutingIndex`` of the adapters for the given domain."""
+        return AdapterRoutingIndex(self.get_adapters(domain))
+
     @abstractmethod
     def get_all_adapters(self):
         """Get all table adapters managed by this manager."""
@@ -213,6 +296,9 @@ class ConfigurableReportTableManager(UcrTableManager):
         self.exclude_ucrs = exclude_ucrs
         if self.include_ucrs and self.ucr_division:
             raise PillowConfigError("You can't have include_ucrs and ucr_division")
+        self.shared_expression_registries = defaultdict(SharedExpressionRegistry)
+        self.table_adapters_by_domain = defaultdict(list)
+        self.adapter_index_by_domain = {}
 
     def get_all_configs(self):
         return [
@@ -236,16 +322,33 @@ class ConfigurableReportTableManager(UcrTableManager):
                 configs = _filter_by_hash(configs, self.ucr_division)
 
             configs = _filter_domains_to_skip(configs)
-            configs = _filter_invalid_config(configs)
+            self._share_expressions(configs)
+            valid_configs = _filter_invalid_config(configs)
+            valid_ids = {id(config) for config in valid_configs}
+            self._unshare_expressions([config for config in configs if id(config) not in valid_ids])
+            configs = valid_configs
 
         return configs
 
+    def _share_expressions(self, configs):
+        # must happen before validation, which builds the expressions
+        for config in configs:
+            if UCR_SHARED_EXPRESSIONS.enabled(config.domain):
+                config.share_expressions(self.shared_expression_registries[config.domain])
+
+    def _unshare_expressions(self, configs):
+        for config in configs:
+            if config.domain in self.shared_expression_registries:
+                self.shared_expression_registries[config.domain].remove(config)
+
     def _do_bootstrap(self, configs=None):
+        self.shared_expression_registries = defaultdict(SharedExpressionRegistry)
         configs = self.get_filtered_configs(configs)
         if not configs:
             pillow_logging.warning("UCR pillow has no configs to process")
 
         self.table_adapters_by_domain = defaultdict(list)
+        self.adapter_index_by_domain = {}
 
         for config in configs:
             self.table_adapters_by_domain[config.domain].append(
@@ -259,6 +362,12 @@ class ConfigurableReportTableManager(UcrTableManager):
     def get_adapters(self, domain):
         return list(self.table_adapters_by_domain.get(domain, []))
 
+    def get_adapter_index(self, domain):
+        index = self.adapter_index_by_domain.get(domain)
+        if index is None:
+            index = self.adapter_index_by_domain[domain] = super().get_adapter_index(domain)
+        return index
+
     def get_all_adapters(self):
         return [
             adapter
@@ -268,6 +377,8 @@ class ConfigurableReportTableManager(UcrTableManager):
 
     def remove_adapter(self, domain, adapter):
         self.table_adapters_by_domain[domain].remove(adapter)
+        self.adapter_index_by_domain.pop(domain, None)
+        self._unshare_expressions([adapter.config])
 
     def _update_modified_since(self, timestamp):
         """
@@ -295,12 +406,14 @@ class ConfigurableReportTableManager(UcrTableManager):
             domain_adapters.append(_get_indicator_adapter_for_pillow(new_data_source))
             # update dictionary
             self.table_adapters_by_domain[new_data_source.domain] = domain_adapters
+            self.adapter_index_by_domain.pop(new_data_source.domain, None)
         for data_source in invalid_data_sources:
             new_adapters = [
                 adapter for adapter in self.table_adapters_by_domain[data_source.domain]
                 if adapter._id != data_source._id
             ]
             self.table_adapters_by_domain[data_source.domain] = new_adapters
+            self.adapter_index_by_domain.pop(data_source.domain, None)
 
 
 class RegistryDataSourceTableManager(UcrTableManager):
@@ -437,7 +550,8 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
         return retry_changes, change_exceptions
 
     def _process_chunk_for_domain(self, domain, changes_chunk):
-        adapters = self.table_manager.get_adapters(domain)
+        adapter_index = self.table_manager.get_adapter_index(domain)
+        adapters = adapter_index.adapters
         changes_by_id = {change.id: change for change in changes_chunk}
         to_delete_by_adapter = defaultdict(list)
         rows_to_save_by_adapter = defaultdict(list)
@@ -445,15 +559,27 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
         to_update = {change for change in changes_chunk if not change.deleted}
         with self._metrics_timer('extract'):
             retry_changes, docs = bulk_fetch_changes_docs(to_update, domain)
+        related_doc_cache = None
+        if UCR_RELATED_DOC_PREFETCH.enabled(domain):
+            related_doc_cache = RelatedDocCache()
+            with self._metrics_timer('related_doc_prefetch'):
+                prefetch_related_docs(
+                    [adapter.config for adapter in adapters if not adapter.run_asynchronous],
+                    docs, related_doc_cache, load_source='change_feed',
+                )
         change_exceptions = []
+        filters_evaluated = 0
 
         with self._metrics_timer('single_batch_transform'):
             for doc in docs:
                 change = changes_by_id[doc['_id']]
                 doc_subtype = change.metadata.document_subtype
                 eval_context = EvaluationContext(doc)
+                eval_context.related_doc_cache = related_doc_cache
+                candidates = adapter_index.get_candidates(doc)
+                filters_evaluated += len(candidates)
                 with self._metrics_timer('single_doc_transform'):
-                    for adapter in adapters:
+                    for adapter in candidates:
                         with self._per_config_metrics_timer('transform', adapter.config._id):
                             if adapter.config.filter(doc, eval_context):
                                 if adapter.run_asynchronous:
@@ -469,6 +595,9 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
                                 # Delete if the subtype is unknown or
                                 # if the subtype matches our filters, but the full filter no longer applies
                                 to_delete_by_adapter[adapter].append(doc)
+                    for adapter in adapter_index.get_deletion_candidates(doc_subtype, candidates):
+                        to_delete_by_adapter[adapter].append(doc)
+        self._record_routing_metrics(filters_evaluated, len(docs) * len(adapters))
 
         with self._metrics_timer('single_batch_delete'):
             # bulk delete by adapter
@@ -503,6 +632,11 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
 
         return retry_changes, change_exceptions
 
+    def _record_routing_metrics(self, evaluated, total):
+        # skipped ratio = skipped / (evaluated + skipped)
+        metrics_counter('commcare.ucr.routing.filters_evaluated', evaluated)
+        metrics_counter('commcare.ucr.routing.filters_skipped', total - evaluated)
+
     def _metrics_timer(self, step, config_id=None):
         tags = {
             'action': step,
@@ -549,10 +683,11 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
 
         with TimingContext() as timer:
             eval_context = EvaluationContext(doc)
-            # make copy to avoid modifying list during iteration
-            adapters = self.table_manager.get_adapters(domain)
+            adapter_index = self.table_manager.get_adapter_index(domain)
             doc_subtype = change.metadata.document_subtype
-            for table in adapters:
+            # make copy to avoid modifying list during iteration
+            candidates = list(adapter_index.get_candidates(doc))
+            for table in candidates:
                 if table.config.filter(doc, eval_context):
                     if table.run_asynchronous:
                         async_tables.append(table.config._id)
@@ -562,6 +697,9 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
                 elif (doc_subtype is None
                         or doc_subtype in table.config.get_case_type_or_xmlns_filter()):
                     table.delete(doc)
+            for table in adapter_index.get_deletion_candidates(doc_subtype, candidates):
+                table.delete(doc)
+            self._record_routing_metrics(len(candidates), len(adapter_index.adapters))
 
             if async_tables:
                 AsyncIndicator.update_from_kafka_change(change, async_tables)
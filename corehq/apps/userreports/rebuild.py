@@ -1,11 +1,22 @@
+import itertools
+import json
 import logging
+import math
 from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Max, Min, Q
 
 import attr
 from alembic.autogenerate import compare_metadata
 from alembic.operations import Operations
+from redis.exceptions import LockError
 
 from dimagi.utils.couch import get_redis_client
+from pillowtop.dao.couch import ID_CHUNK_SIZE
+
+from corehq.form_processor.models import CommCareCase, XFormInstance
+from corehq.sql_db.util import get_db_aliases_for_partitioned_query
 
 from .alembic_diffs import (
     DiffTypes,
@@ -51,6 +62,209 @@ class DataSourceResumeHelper(object):
         return self._client.exists(self._key)
 
 
+@attr.s(frozen=True)
+class RebuildRange(object):
+    """A slice of the documents of a data source in one shard database
+
+    Covers the documents with a primary key greater than ``start_pk`` and
+    up to ``end_pk`` (inclusive), or with no upper bound if ``end_pk`` is
+    ``None``.
+    """
+    domain = attr.ib()
+    case_type_or_xmlns = attr.ib()
+    db_alias = attr.ib()
+    start_pk = attr.ib()
+    end_pk = attr.ib()
+
+    @property
+    def key(self):
+        return json.dumps(attr.astuple(self))
+
+    @classmethod
+    def from_key(cls, key):
+        return cls(*json.loads(key))
+
+
+def supports_parallel_rebuild(config):
+    return config.referenced_doc_type in ('CommCareCase', 'XFormInstance')
+
+
+def get_rebuild_ranges(config, ranges_per_db):
+    """Split the documents of a data source into ranges of primary keys
+
+    Each combination of domain and case type / xmlns is split by shard
+    database and then into ``ranges_per_db`` ranges of primary keys. The
+    last range of each database has no upper bound so that documents
+    created during the rebuild are included.
+    """
+    ranges = []
+    for domain, case_type_or_xmlns in itertools.product(
+            config.data_domains, config.get_case_type_or_xmlns_filter()):
+        for db_alias in get_db_aliases_for_partitioned_query():
+            bounds = _get_doc_query(config, domain, case_type_or_xmlns, db_alias).aggregate(
+                min_pk=Min('pk'), max_pk=Max('pk'),
+            )
+            if bounds['min_pk'] is None:
+                continue
+            start_pk = bounds['min_pk'] - 1
+            step = max(1, math.ceil((bounds['max_pk'] - start_pk) / ranges_per_db))
+            lower_bounds = list(range(start_pk, bounds['max_pk'], step))
+            for lower, upper in zip(lower_bounds, lower_bounds[1:] + [None]):
+                ranges.append(RebuildRange(domain, case_type_or_xmlns, db_alias, lower, upper))
+    return ranges
+
+
+def iter_range_doc_id_chunks(config, rebuild_range, last_pk=None, chunk_size=ID_CHUNK_SIZE):
+    """Iterate over the document IDs in a range in chunks
+
+    :param last_pk: Resume after the document with this primary key.
+    :returns: Generator of ``(doc_ids, last_pk)`` tuples, where ``last_pk``
+    can be used as the checkpoint after the chunk has been processed.
+    """
+    query = _get_doc_query(
+        config, rebuild_range.domain, rebuild_range.case_type_or_xmlns, rebuild_range.db_alias
+    )
+    if rebuild_range.end_pk is not None:
+        query = query.filter(pk__lte=rebuild_range.end_pk)
+    id_field = 'case_id' if config.referenced_doc_type == 'CommCareCase' else 'form_id'
+    query = query.order_by('pk').values_list('pk', id_field)
+    last_pk = rebuild_range.start_pk if last_pk is None else last_pk
+    while True:
+        rows = list(query.filter(pk__gt=last_pk)[:chunk_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        yield [doc_id for pk, doc_id in rows], last_pk
+        if len(rows) < chunk_size:
+            return
+
+
+def _get_doc_query(config, domain, case_type_or_xmlns, db_alias):
+    # the same documents the document stores iterate over for a rebuild
+    if config.referenced_doc_type == 'CommCareCase':
+        model = CommCareCase
+        q_expr = Q(domain=domain, deleted=False)
+        if case_type_or_xmlns is not None:
+            q_expr &= Q(type=case_type_or_xmlns)
+    else:
+        model = XFormInstance
+        q_expr = Q(domain=domain, state=XFormInstance.NORMAL)
+        if case_type_or_xmlns is not None:
+            q_expr &= Q(xmlns=case_type_or_xmlns)
+    return model.objects.using(db_alias).filter(q_expr)
+
+
+class DataSourceRangeCheckpoints(object):
+    """Progress of a data source rebuild split into ``RebuildRange``s
+
+    The primary key of the last document processed is kept for each
+    range so that a rebuild can be resumed in the middle of a range.
+    Workers take a lease on a range while they build it, so that a range
+    that is queued again (by a resumed rebuild or a redelivered task) is
+    not built twice at the same time.
+    """
+    completed = 'completed'
+    pending_count = 'pending_count'
+    # seconds; renewed after each chunk of documents
+    lease_timeout = 30 * 60
+
+    # Marks the range as completed and decrements the pending count,
+    # unless it was already completed or the resume info was cleared.
+    # Returns the new pending count, or -1 if nothing changed.
+    _complete_range_script = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then
+            return -1
+        end
+        if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+            return -1
+        end
+        redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+        return redis.call('HINCRBY', KEYS[1], ARGV[3], -1)
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._client = get_redis_client().client.get_client()
+        self._key = '{}:ranges'.format(get_redis_key_for_config(config))
+
+    def set_ranges(self, ranges):
+        self._client.delete(self._key)
+        if not ranges:
+            return
+        mapping = {rebuild_range.key: '' for rebuild_range in ranges}
+        mapping[self.pending_count] = len(ranges)
+        self._client.hset(self._key, mapping=mapping)
+
+    def get_pending_ranges(self):
+        """
+        :returns: List of ``(range, last_pk)`` tuples for the ranges that
+        have not been completed. ``last_pk`` is ``None`` if no documents of
+        the range have been processed.
+        """
+        pending = []
+        for key, value in self._client.hgetall(self._key).items():
+            key, value = key.decode('utf8'), value.decode('utf8')
+            if key == self.pending_count or value == self.completed:
+                continue
+            pending.append((RebuildRange.from_key(key), int(value) if value else None))
+        return sorted(pending, key=lambda item: item[0].key)
+
+    def get_last_pk(self, rebuild_range):
+        value = self._client.hget(self._key, rebuild_range.key)
+        if not value or value.decode('utf8') == self.completed:
+            return None
+        return int(value)
+
+    def is_completed(self, rebuild_range):
+        value = self._client.hget(self._key, rebuild_range.key)
+        return value is not None and value.decode('utf8') == self.completed
+
+    def add_checkpoint(self, rebuild_range, last_pk):
+        self._client.hset(self._key, rebuild_range.key, last_pk)
+
+    def complete_range(self, rebuild_range):
+        """Mark a range as complete
+
+        Completing a range that is already complete does nothing.
+
+        :returns: True if this was the last pending range.
+        """
+        pending_count = self._client.eval(
+            self._complete_range_script, 1, self._key,
+            rebuild_range.key, self.completed, self.pending_count,
+        )
+        return pending_count == 0
+
+    @contextmanager
+    def lease_range(self, rebuild_range):
+        """Take the lease on building a range
+
+        Yields the lease, which must be renewed with ``lease.reacquire()``
+        more often than ``lease_timeout``, or ``None`` if another worker
+        holds it.
+        """
+        lease = self._client.lock(
+            '{}:lease:{}'.format(self._key, rebuild_range.key),
+            timeout=self.lease_timeout,
+        )
+        if not lease.acquire(blocking=False):
+            yield None
+            return
+        try:
+            yield lease
+        finally:
+            try:
+                lease.release()
+            except LockError:
+                pass  # the lease expired
+
+    def clear_resume_info(self):
+        self._client.delete(self._key)
+
+    def has_resume_info(self):
+        return self._client.exists(self._key)
+
+
 @attr.s
 class MigrateRebuildTables(object):
     migrate = attr.ib()
@@ -28,6 +28,9 @@ class FactoryContext():
 
     domain: Optional[str] = None
 
+    # see corehq.apps.userreports.expressions.compiler
+    expression_compiler: Optional[object] = None
+
     def expression_from_spec(self, spec):
         from corehq.apps.userreports.expressions.factory import ExpressionFactory
         return ExpressionFactory.from_spec(spec, self)
@@ -79,6 +82,8 @@ class EvaluationContext(object):
         self.inserted_timestamp = datetime.utcnow()
         self.cache = {}
         self.iteration_cache = {}
+        # see corehq.apps.userreports.expressions.related_docs
+        self.related_doc_cache = None
 
     def exists_in_cache(self, key):
         return key in self.cache or key in self.iteration_cache
@@ -31,17 +31,29 @@ from corehq.apps.userreports.const import (
     ASYNC_INDICATOR_CHUNK_SIZE,
     ASYNC_INDICATOR_MAX_RETRIES,
     ASYNC_INDICATOR_QUEUE_TIME,
+    PARALLEL_REBUILD_DEFAULT_WORKERS,
     UCR_CELERY_QUEUE,
     UCR_INDICATOR_CELERY_QUEUE,
 )
 from corehq.apps.userreports.exceptions import (
     DataSourceConfigurationNotFoundError,
 )
+from corehq.apps.userreports.expressions.related_docs import (
+    PREFETCH_CHUNK_SIZE,
+    RelatedDocCache,
+    prefetch_related_docs,
+)
 from corehq.apps.userreports.models import (
     AsyncIndicator,
     id_is_static,
 )
-from corehq.apps.userreports.rebuild import DataSourceResumeHelper
+from corehq.apps.userreports.rebuild import (
+    DataSourceRangeCheckpoints,
+    DataSourceResumeHelper,
+    get_rebuild_ranges,
+    iter_range_doc_id_chunks,
+    supports_parallel_rebuild,
+)
 from corehq.apps.userreports.specs import EvaluationContext
 from corehq.apps.userreports.util import (
     get_async_indicator_modify_lock_key,
@@ -49,6 +61,7 @@ from corehq.apps.userreports.util import (
     get_ucr_datasource_config_by_id,
 )
 from corehq.elastic import ESError
+from corehq.toggles import UCR_RELATED_DOC_PREFETCH
 from corehq.util.context_managers import notify_someone
 from corehq.util.decorators import serial_task
 from corehq.util.es.elasticsearch import ConnectionTimeout
@@ -67,15 +80,25 @@ celery_task_logger = logging.getLogger('celery.task')
 
 def _build_indicators(config, document_store, relevant_ids):
     adapter = get_indicator_adapter(config, raise_errors=True, load_source='build_indicators')
-
-    for doc in document_store.iter_documents(relevant_ids):
-        if config.asynchronous:
-            AsyncIndicator.update_record(
-                doc.get('_id'), config.referenced_doc_type, config.domain, [config._id]
-            )
-        else:
-            # save is a noop if the filter doesn't match
-            adapter.best_effort_save(doc)
+    prefetch = not config.asynchronous and UCR_RELATED_DOC_PREFETCH.enabled(config.domain)
+
+    for docs in chunked(document_store.iter_documents(relevant_ids), PREFETCH_CHUNK_SIZE):
+        related_doc_cache = None
+        if prefetch:
+            # scoped to the chunk, so that memory use does not grow with
+            # the rebuild, and related docs are not stale for long
+            related_doc_cache = RelatedDocCache()
+            prefetch_related_docs([config], docs, related_doc_cache, load_source='build_indicators')
+        for doc in docs:
+            if config.asynchronous:
+                AsyncIndicator.update_record(
+                    doc.get('_id'), config.referenced_doc_type, config.domain, [config._id]
+                )
+            else:
+                eval_context = EvaluationContext(doc)
+                eval_context.related_doc_cache = related_doc_cache
+                # save is a noop if the filter doesn't match
+                adapter.best_effort_save(doc, eval_context)
 
 
 @serial_task('{indicator_config_id}', default_retry_delay=60 * 10, timeout=3 * 60 * 60, max_retries=20,
@@ -138,6 +161,16 @@ def resume_building_indicators(indicator_config_id, initiated_by=None):
     config = get_ucr_datasource_config_by_id(indicator_config_id)
     success = _('Your UCR table {} has finished rebuilding in {}').format(config.table_id, config.domain)
     failure = _('There was an error rebuilding Your UCR table {} in {}.').format(config.table_id, config.domain)
+    checkpoints = DataSourceRangeCheckpoints(config)
+    if checkpoints.has_resume_info():
+        # success is reported once the last range has been built
+        with notify_someone(initiated_by, success_message=None, error_message=failure):
+            get_indicator_adapter(config).log_table_build(
+                initiated_by=initiated_by,
+                source='resume_building_indicators',
+            )
+            _queue_range_builds(config, checkpoints, PARALLEL_REBUILD_DEFAULT_WORKERS, initiated_by)
+        return
     with notify_someone(initiated_by, success_message=success, error_message=failure, send=True):
         resume_helper = DataSourceResumeHelper(config)
         adapter = get_indicator_adapter(config)
@@ -148,9 +181,95 @@ def resume_building_indicators(indicator_config_id, initiated_by=None):
         _iteratively_build_table(config, resume_helper)
 
 
+@serial_task(
+    '{indicator_config_id}', default_retry_delay=60 * 10, timeout=3 * 60 * 60, max_retries=20,
+    queue=UCR_CELERY_QUEUE, ignore_result=True, serializer='pickle'
+)
+def rebuild_indicators_in_parallel(indicator_config_id, initiated_by=None, num_workers=None, source=None,
+                                   domain=None):
+    """Rebuild a data source with documents split into ranges across ``num_workers`` tasks
+
+    Progress is kept per range, so ``resume_building_indicators`` picks up
+    where each range stopped. Data sources that are not built from forms
+    or cases are rebuilt by a single task.
+    """
+    config = get_ucr_datasource_config_by_id(indicator_config_id)
+    if not supports_parallel_rebuild(config):
+        return rebuild_indicators(indicator_config_id, initiated_by=initiated_by, source=source)
+
+    num_workers = num_workers or PARALLEL_REBUILD_DEFAULT_WORKERS
+    failure = _('There was an error rebuilding Your UCR table {} in {}.').format(config.table_id, config.domain)
+    # success is reported once the last range has been built
+    with notify_someone(initiated_by, success_message=None, error_message=failure):
+        if not id_is_static(indicator_config_id):
+            config.meta.build.initiated = datetime.utcnow()
+            config.meta.build.finished = False
+            config.meta.build.rebuilt_asynchronously = False
+            config.save()
+
+        adapter = get_indicator_adapter(config)
+        adapter.rebuild_table(initiated_by=initiated_by, source=source)
+        checkpoints = DataSourceRangeCheckpoints(config)
+        # clear progress of a previous serial build of the same revision
+        DataSourceResumeHelper(config).clear_resume_info()
+        ranges = get_rebuild_ranges(config, ranges_per_db=num_workers)
+        checkpoints.set_ranges(ranges)
+        if not ranges:
+            _mark_build_finished(config)
+            return
+        _queue_range_builds(config, checkpoints, num_workers, initiated_by)
+
+
+def _queue_range_builds(config, checkpoints, num_workers, initiated_by):
+    pending = [rebuild_range for rebuild_range, last_pk in checkpoints.get_pending_ranges()]
+    for i in range(min(num_workers, len(pending))):
+        build_indicators_for_ranges.delay(config._id, pending[i::num_workers], initiated_by)
+
+
+@task(serializer='pickle', queue=UCR_CELERY_QUEUE, ignore_result=True, acks_late=True)
+def build_indicators_for_ranges(indicator_config_id, ranges, initiated_by=None):
+    config = get_ucr_datasource_config_by_id(indicator_config_id)
+    checkpoints = DataSourceRangeCheckpoints(config)
+    success = _('Your UCR table {} has finished rebuilding in {}').format(config.table_id, config.domain)
+    failure = _('There was an error rebuilding Your UCR table {} in {}.').format(config.table_id, config.domain)
+    # success is only reported by the worker that completes the last range
+    with notify_someone(initiated_by, success_message=None, error_message=failure):
+        for rebuild_range in ranges:
+            if _build_indicators_for_range(config, checkpoints, rebuild_range):
+                with notify_someone(initiated_by, success_message=success, error_message=failure):
+                    checkpoints.clear_resume_info()
+                    _mark_build_finished(config)
+
+
+def _build_indicators_for_range(config, checkpoints, rebuild_range):
+    """
+    :returns: True if this was the last range of the rebuild to complete.
+    """
+    document_store = get_document_store_for_doc_type(
+        rebuild_range.domain, config.referenced_doc_type,
+        case_type_or_xmlns=rebuild_range.case_type_or_xmlns,
+        load_source="build_indicators",
+    )
+    with checkpoints.lease_range(rebuild_range) as lease:
+        if lease is None:
+            # another worker is building the range
+            return False
+        if checkpoints.is_completed(rebuild_range):
+            # the range was queued again after it was built
+            return False
+        last_pk = checkpoints.get_last_pk(rebuild_range)
+        for doc_ids, last_pk in iter_range_doc_id_chunks(config, rebuild_range, last_pk):
+            _build_indicators(config, document_store, doc_ids)
+            checkpoints.add_checkpoint(rebuild_range, last_pk)
+            lease.reacquire()
+        metrics_counter('commcare.ucr.parallel_rebuild.ranges_completed', tags={
+            'config_id': config._id,
+        })
+        return checkpoints.complete_range(rebuild_range)
+
+
 def _iteratively_build_table(config, resume_helper=None, in_place=False, limit=-1):
     resume_helper = resume_helper or DataSourceResumeHelper(config)
-    indicator_config_id = config._id
     case_type_or_xmlns_list = config.get_case_type_or_xmlns_filter()
     domains = config.data_domains
 
@@ -181,7 +300,11 @@ def _iteratively_build_table(config, resume_helper=None, in_place=False, limit=-
         resume_helper.add_completed_iteration(domain, case_type_or_xmlns)
 
     resume_helper.clear_resume_info()
-    if not id_is_static(indicator_config_id):
+    _mark_build_finished(config, in_place)
+
+
+def _mark_build_finished(config, in_place=False):
+    if not id_is_static(config._id):
         if in_place:
             config.meta.build.finished_in_place = True
         else:
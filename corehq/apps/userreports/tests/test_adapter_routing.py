@@ -0,0 +1,80 @@
+from unittest.mock import Mock
+
+from django.test import SimpleTestCase
+
+from corehq.apps.userreports.models import DataSourceConfiguration
+from corehq.apps.userreports.pillow import AdapterRoutingIndex
+
+
+def _adapter(table_id, doc_type='CommCareCase', configured_filter=None):
+    config = DataSourceConfiguration(
+        domain='routing',
+        referenced_doc_type=doc_type,
+        table_id=table_id,
+        configured_filter=configured_filter or {},
+    )
+    return Mock(config=config, name=table_id)
+
+
+def _property_filter(property_name, value, operator='eq'):
+    return {
+        'type': 'boolean_expression',
+        'expression': {'type': 'property_name', 'property_name': property_name},
+        'operator': operator,
+        'property_value': value,
+    }
+
+
+class AdapterRoutingIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.person = _adapter('person', configured_filter=_property_filter('type', 'person'))
+        self.people = _adapter('people', configured_filter=_property_filter('type', ['person', 'household'], 'in'))
+        self.all_cases = _adapter('all_cases')
+        self.substring = _adapter('substring', configured_filter=_property_filter('type', 'person', 'in'))
+        self.form = _adapter('form', 'XFormInstance', _property_filter('xmlns', 'http://x'))
+        self.adapters = [self.person, self.people, self.all_cases, self.substring, self.form]
+        self.index = AdapterRoutingIndex(self.adapters)
+
+    def test_candidates_by_case_type(self):
+        self.assertEqual(
+            self.index.get_candidates({'doc_type': 'CommCareCase', 'type': 'person'}),
+            [self.person, self.people, self.all_cases, self.substring],
+        )
+        self.assertEqual(
+            self.index.get_candidates({'doc_type': 'CommCareCase', 'type': 'household'}),
+            [self.people, self.all_cases, self.substring],
+        )
+        self.assertEqual(
+            self.index.get_candidates({'doc_type': 'CommCareCase', 'type': 'other'}),
+            [self.all_cases, self.substring],
+        )
+
+    def test_candidates_with_null_filter_value(self):
+        person_or_none = _adapter('person_or_none', configured_filter=_property_filter('type', ['person', None], 'in'))
+        index = AdapterRoutingIndex([self.person, person_or_none, self.all_cases])
+        self.assertEqual(
+            index.get_candidates({'doc_type': 'CommCareCase', 'type': 'person'}),
+            [self.person, person_or_none, self.all_cases],
+        )
+
+    def test_candidates_by_doc_type(self):
+        form = {'doc_type': 'XFormInstance', 'xmlns': 'http://x'}
+        self.assertEqual(self.index.get_candidates(form), [self.form])
+        self.assertEqual(self.index.get_candidates({'doc_type': 'XFormInstance', 'xmlns': 'http://y'}), [])
+        self.assertEqual(self.index.get_candidates({'doc_type': 'CommCareCase-Deleted', 'type': 'person'}), [])
+
+    def test_deletion_candidates(self):
+        candidates = self.index.get_candidates({'doc_type': 'CommCareCase-Deleted', 'type': 'person'})
+        self.assertEqual(self.index.get_deletion_candidates('person', candidates), [self.person, self.people])
+        self.assertEqual(self.index.get_deletion_candidates(None, candidates), self.adapters)
+
+    def test_candidates_never_exclude_matching_configs(self):
+        for doc in [
+            {'doc_type': 'CommCareCase', 'type': 'person', 'domain': 'routing'},
+            {'doc_type': 'CommCareCase', 'type': 'household', 'domain': 'routing'},
+            {'doc_type': 'XFormInstance', 'xmlns': 'http://x', 'domain': 'routing'},
+        ]:
+            matching = [adapter for adapter in self.adapters if adapter.config.filter(doc)]
+            candidates = self.index.get_candidates(doc)
+            self.assertEqual([a for a in matching if a not in candidates], [], doc)
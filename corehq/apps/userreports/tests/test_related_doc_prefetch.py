@@ -0,0 +1,133 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from pillowtop.dao.mock import MockDocumentStore
+
+from corehq.apps.userreports.expressions.related_docs import (
+    RelatedDocCache,
+    get_related_doc_id_expressions,
+    prefetch_related_docs,
+)
+from corehq.apps.userreports.models import DataSourceConfiguration
+from corehq.apps.userreports.specs import EvaluationContext
+
+DOMAIN = 'related-doc-prefetch'
+
+
+class CountingDocumentStore(MockDocumentStore):
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.get_calls = []
+        self.iter_calls = []
+
+    def get_document(self, doc_id):
+        self.get_calls.append(doc_id)
+        return super().get_document(doc_id)
+
+    def iter_documents(self, ids):
+        self.iter_calls.append(list(ids))
+        return [self._data_store[doc_id] for doc_id in ids if doc_id in self._data_store]
+
+
+def _related_doc(doc_id_path, value_property='name'):
+    return {
+        'type': 'related_doc',
+        'related_doc_type': 'CommCareCase',
+        'doc_id_expression': {'type': 'property_path', 'property_path': doc_id_path},
+        'value_expression': {'type': 'property_name', 'property_name': value_property},
+    }
+
+
+def _config():
+    return DataSourceConfiguration(
+        domain=DOMAIN,
+        referenced_doc_type='XFormInstance',
+        table_id='prefetch',
+        configured_indicators=[{
+            'type': 'expression',
+            'column_id': 'case_name',
+            'datatype': 'string',
+            'expression': _related_doc(['form', 'case', '@case_id']),
+        }],
+    )
+
+
+class RelatedDocPrefetchTest(SimpleTestCase):
+
+    def setUp(self):
+        self.store = CountingDocumentStore({
+            'case1': {'_id': 'case1', 'domain': DOMAIN, 'name': 'one'},
+            'case2': {'_id': 'case2', 'domain': DOMAIN, 'name': 'two'},
+            'other': {'_id': 'other', 'domain': 'other-domain', 'name': 'other'},
+        })
+        for module in ['related_docs', 'specs']:
+            patcher = patch(
+                'corehq.apps.userreports.expressions.{}.get_document_store_for_doc_type'.format(module),
+                return_value=self.store,
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _form(self, form_id, case_id):
+        return {
+            '_id': form_id,
+            'domain': DOMAIN,
+            'doc_type': 'XFormInstance',
+            'form': {'case': {'@case_id': case_id}},
+        }
+
+    def _get_values(self, config, docs, cache):
+        values = []
+        for doc in docs:
+            context = EvaluationContext(doc)
+            context.related_doc_cache = cache
+            row = config.get_all_values(doc, context)[0]
+            values.append({value.column.id: value.value for value in row}['case_name'])
+        return values
+
+    def test_prefetch_batches_lookups(self):
+        config = _config()
+        docs = [self._form('f1', 'case1'), self._form('f2', 'case2'), self._form('f3', 'case1')]
+        cache = RelatedDocCache()
+        prefetch_related_docs([config], docs, cache, load_source='test')
+        self.assertEqual(self.store.iter_calls, [['case1', 'case2']])
+        self.assertEqual(self._get_values(config, docs, cache), ['one', 'two', 'one'])
+        self.assertEqual(self.store.get_calls, [])
+
+    def test_missing_and_other_domain_docs(self):
+        config = _config()
+        docs = [self._form('f1', 'missing'), self._form('f2', 'other')]
+        cache = RelatedDocCache()
+        prefetch_related_docs([config], docs, cache, load_source='test')
+        self.assertEqual(self._get_values(config, docs, cache), [None, None])
+        # not found by the bulk lookup: loaded individually as before
+        self.assertEqual(self.store.get_calls, ['missing'])
+
+    def test_cache_size_bound(self):
+        cache = RelatedDocCache(max_size=1)
+        cache.add(DOMAIN, 'CommCareCase', {'_id': 'case1'})
+        cache.add(DOMAIN, 'CommCareCase', {'_id': 'case2'})
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get(DOMAIN, 'CommCareCase', 'case1'))
+        self.assertIsNotNone(cache.get(DOMAIN, 'CommCareCase', 'case2'))
+
+    def test_nested_related_doc_not_prefetched(self):
+        config = _config()
+        config.configured_filter = {
+            'type': 'boolean_expression',
+            'operator': 'eq',
+            'property_value': 'one',
+            'expression': {
+                'type': 'related_doc',
+                'related_doc_type': 'CommCareCase',
+                'doc_id_expression': _related_doc(['form', 'case', '@case_id'], 'parent_id'),
+                'value_expression': {'type': 'property_name', 'property_name': 'name'},
+            },
+        }
+        id_expressions = get_related_doc_id_expressions(config)
+        # the outer doc id depends on another lookup; the inner one is prefetched
+        self.assertEqual(len(id_expressions), 1)
+        doc = self._form('f1', 'case1')
+        self.assertEqual(id_expressions[0][1](doc, EvaluationContext(doc)), 'case1')
@@ -1,6 +1,13 @@
+from unittest.mock import Mock, patch
+
 from django.test import SimpleTestCase
 
-from corehq.apps.userreports.rebuild import DataSourceResumeHelper
+from corehq.apps.userreports.rebuild import (
+    DataSourceRangeCheckpoints,
+    DataSourceResumeHelper,
+    RebuildRange,
+    get_rebuild_ranges,
+)
 from corehq.apps.userreports.tests.utils import get_sample_data_source
 from corehq.tests.locks import real_redis_client
 
@@ -43,3 +50,99 @@ class DataSourceResumeBuildTest(SimpleTestCase):
     def test_has_resume_info_true(self):
         self._resume_helper.add_completed_iteration("domain1", 'type1')
         self.assertEqual(True, self._resume_helper.has_resume_info())
+
+
+class DataSourceRangeCheckpointsTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._data_source = get_sample_data_source()
+        with real_redis_client():
+            cls._checkpoints = DataSourceRangeCheckpoints(cls._data_source)
+        cls.ranges = [
+            RebuildRange('domain1', 'type1', 'p1', 0, 100),
+            RebuildRange('domain1', 'type1', 'p1', 100, None),
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self._checkpoints.clear_resume_info()
+
+    def test_pending_ranges(self):
+        self.assertFalse(self._checkpoints.has_resume_info())
+        self._checkpoints.set_ranges(self.ranges)
+        self.assertTrue(self._checkpoints.has_resume_info())
+        self.assertEqual(self._checkpoints.get_pending_ranges(), [(r, None) for r in self.ranges])
+
+    def test_checkpoint(self):
+        self._checkpoints.set_ranges(self.ranges)
+        self._checkpoints.add_checkpoint(self.ranges[0], 42)
+        self.assertEqual(self._checkpoints.get_last_pk(self.ranges[0]), 42)
+        self.assertIsNone(self._checkpoints.get_last_pk(self.ranges[1]))
+        self.assertEqual(
+            self._checkpoints.get_pending_ranges(),
+            [(self.ranges[0], 42), (self.ranges[1], None)],
+        )
+
+    def test_complete_ranges(self):
+        self._checkpoints.set_ranges(self.ranges)
+        self.assertFalse(self._checkpoints.complete_range(self.ranges[1]))
+        self.assertEqual(self._checkpoints.get_pending_ranges(), [(self.ranges[0], None)])
+        self.assertTrue(self._checkpoints.complete_range(self.ranges[0]))
+        self.assertEqual(self._checkpoints.get_pending_ranges(), [])
+
+    def test_complete_range_twice(self):
+        self._checkpoints.set_ranges(self.ranges)
+        self.assertFalse(self._checkpoints.complete_range(self.ranges[0]))
+        self.assertTrue(self._checkpoints.is_completed(self.ranges[0]))
+        # a redelivered task must not decrement the pending count again
+        self.assertFalse(self._checkpoints.complete_range(self.ranges[0]))
+        self.assertEqual(self._checkpoints.get_pending_ranges(), [(self.ranges[1], None)])
+        self.assertTrue(self._checkpoints.complete_range(self.ranges[1]))
+
+    def test_complete_range_after_clear(self):
+        self._checkpoints.set_ranges(self.ranges)
+        self._checkpoints.clear_resume_info()
+        self.assertFalse(self._checkpoints.complete_range(self.ranges[0]))
+        self.assertFalse(self._checkpoints.has_resume_info())
+
+    def test_lease_range(self):
+        with self._checkpoints.lease_range(self.ranges[0]) as lease:
+            self.assertIsNotNone(lease)
+            with self._checkpoints.lease_range(self.ranges[0]) as other_lease:
+                self.assertIsNone(other_lease)
+            with self._checkpoints.lease_range(self.ranges[1]) as other_lease:
+                self.assertIsNotNone(other_lease)
+        with self._checkpoints.lease_range(self.ranges[0]) as lease:
+            self.assertIsNotNone(lease)
+
+    def test_range_key(self):
+        rebuild_range = RebuildRange('domain1', 'http://openrosa.org/formdesigner/1', 'p1', 0, None)
+        self.assertEqual(RebuildRange.from_key(rebuild_range.key), rebuild_range)
+
+
+class GetRebuildRangesTest(SimpleTestCase):
+
+    def _get_ranges(self, bounds_by_db, ranges_per_db):
+        config = get_sample_data_source()
+
+        def get_doc_query(config, domain, case_type_or_xmlns, db_alias):
+            min_pk, max_pk = bounds_by_db[db_alias]
+            return Mock(aggregate=Mock(return_value={'min_pk': min_pk, 'max_pk': max_pk}))
+
+        with patch('corehq.apps.userreports.rebuild.get_db_aliases_for_partitioned_query',
+                   return_value=list(bounds_by_db)), \
+                patch('corehq.apps.userreports.rebuild._get_doc_query', get_doc_query):
+            return get_rebuild_ranges(config, ranges_per_db)
+
+    def test_ranges_per_db(self):
+        ranges = self._get_ranges({'p1': (1, 100), 'p2': (None, None)}, 4)
+        self.assertEqual(
+            [(r.db_alias, r.start_pk, r.end_pk) for r in ranges],
+            [('p1', 0, 25), ('p1', 25, 50), ('p1', 50, 75), ('p1', 75, None)],
+        )
+
+    def test_fewer_docs_than_ranges(self):
+        ranges = self._get_ranges({'p1': (10, 11)}, 4)
+        self.assertEqual([(r.start_pk, r.end_pk) for r in ranges], [(9, 10), (10, None)])
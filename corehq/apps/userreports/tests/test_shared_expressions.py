@@ -0,0 +1,144 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from corehq.apps.userreports.expressions.compiler import (
+    SharedExpression,
+    SharedExpressionRegistry,
+)
+from corehq.apps.userreports.expressions.specs import PropertyPathGetterSpec
+from corehq.apps.userreports.models import DataSourceConfiguration
+from corehq.apps.userreports.specs import EvaluationContext
+
+DOMAIN = 'shared-expressions'
+
+
+def _config(table_id, named_expressions=None, path_expression=None):
+    return DataSourceConfiguration(
+        domain=DOMAIN,
+        referenced_doc_type='CommCareCase',
+        table_id=table_id,
+        named_expressions=named_expressions or {
+            'parent_name': {'type': 'property_path', 'property_path': ['parent', 'name']},
+        },
+        configured_filter={
+            'type': 'boolean_expression',
+            'expression': {'type': 'property_name', 'property_name': 'type'},
+            'operator': 'eq',
+            'property_value': 'person',
+        },
+        configured_indicators=[{
+            'type': 'expression',
+            'column_id': 'parent_name',
+            'datatype': 'string',
+            'expression': path_expression or {'type': 'named', 'name': 'parent_name'},
+        }],
+    )
+
+
+class SharedExpressionTest(SimpleTestCase):
+
+    def setUp(self):
+        self.doc = {
+            '_id': 'abc',
+            'domain': DOMAIN,
+            'doc_type': 'CommCareCase',
+            'type': 'person',
+            'parent': {'name': 'Tom'},
+        }
+
+    def _get_values(self, configs):
+        calls = []
+        original = PropertyPathGetterSpec.__call__
+
+        def counting_call(spec, item, evaluation_context=None):
+            calls.append(spec.property_path)
+            return original(spec, item, evaluation_context)
+
+        eval_context = EvaluationContext(self.doc)
+        with patch.object(PropertyPathGetterSpec, '__call__', counting_call):
+            values = []
+            for config in configs:
+                self.assertTrue(config.filter(self.doc, eval_context))
+                values.append({
+                    value.column.id: value.value
+                    for value in config.get_all_values(self.doc, eval_context)[0]
+                })
+                eval_context.reset_iteration()
+        return values, calls
+
+    def test_identical_named_expressions_evaluated_once(self):
+        registry = SharedExpressionRegistry()
+        configs = [_config('one'), _config('two')]
+        for config in configs:
+            config.share_expressions(registry)
+        values, calls = self._get_values(configs)
+        self.assertEqual([v['parent_name'] for v in values], ['Tom', 'Tom'])
+        self.assertEqual(calls, [['parent', 'name']])
+
+    def test_named_and_inline_expressions_shared(self):
+        registry = SharedExpressionRegistry()
+        configs = [
+            _config('one'),
+            _config('two', path_expression={'type': 'property_path', 'property_path': ['parent', 'name']}),
+        ]
+        for config in configs:
+            config.share_expressions(registry)
+        values, calls = self._get_values(configs)
+        self.assertEqual(calls, [['parent', 'name']])
+
+    def test_same_name_different_definition_not_shared(self):
+        registry = SharedExpressionRegistry()
+        configs = [
+            _config('one'),
+            _config('two', named_expressions={
+                'parent_name': {'type': 'property_path', 'property_path': ['parent', 'type']},
+            }),
+        ]
+        for config in configs:
+            config.share_expressions(registry)
+        self.doc['parent']['type'] = 'household'
+        values, calls = self._get_values(configs)
+        self.assertEqual([v['parent_name'] for v in values], ['Tom', 'household'])
+
+    def test_not_shared_without_registry(self):
+        values, calls = self._get_values([_config('one'), _config('two')])
+        self.assertEqual(calls, [['parent', 'name'], ['parent', 'name']])
+
+    def test_unique_expressions_not_cached(self):
+        registry = SharedExpressionRegistry()
+        config = _config('one', named_expressions={'unused': {'type': 'constant', 'constant': 1}},
+                         path_expression={'type': 'property_path', 'property_path': ['parent', 'name']})
+        config.share_expressions(registry)
+        eval_context = EvaluationContext(self.doc)
+        config.get_all_values(self.doc, eval_context)
+        self.assertFalse(any(
+            key[0] == 'shared_expression' and 'parent' in key[1]
+            for key in eval_context.cache if isinstance(key, tuple)
+        ))
+
+    def test_rebuilt_expressions_counted_once(self):
+        registry = SharedExpressionRegistry()
+        config = _config('one')
+        config.share_expressions(registry)
+        spec = {'type': 'property_name', 'property_name': 'name'}
+        for i in range(2):
+            config.get_factory_context().expression_compiler.compile(spec, None)
+        self.assertEqual(set(registry.uses.values()), {1})
+
+    def test_replaced_data_source_not_counted(self):
+        registry = SharedExpressionRegistry()
+        for i in range(2):
+            config = _config('one')
+            config._id = 'data-source-id'
+            config.share_expressions(registry)
+            config.indicators
+        self.assertEqual(max(registry.uses.values()), 1)
+        registry.remove(config)
+        self.assertFalse(+registry.uses)
+
+    def test_shared_expression_proxies_attributes(self):
+        expression = PropertyPathGetterSpec.wrap({'type': 'property_path', 'property_path': ['a']})
+        shared = SharedExpression(expression, 'key', {})
+        self.assertEqual(shared.property_path, ['a'])
+        self.assertEqual(str(shared), 'a')
@@ -25,6 +25,7 @@ from corehq.apps.userreports.views import (
     evaluate_expression,
     export_data_source,
     rebuild_data_source,
+    rebuild_data_source_in_parallel,
     report_source_json,
     resume_building_data_source,
     undelete_data_source,
@@ -57,6 +58,8 @@ urlpatterns = [
         name='undo_delete_data_source'),
     url(r'^data_sources/rebuild/(?P<config_id>[\w-]+)/$', rebuild_data_source,
         name='rebuild_configurable_data_source'),
+    url(r'^data_sources/rebuild_parallel/(?P<config_id>[\w-]+)/$', rebuild_data_source_in_parallel,
+        name='rebuild_data_source_in_parallel'),
     url(r'^data_sources/resume/(?P<config_id>[\w-]+)/$', resume_building_data_source,
         name='resume_build'),
     url(r'^data_sources/build_in_place/(?P<config_id>[\w-]+)/$', build_data_source_in_place,
@@ -128,7 +128,10 @@ from corehq.apps.userreports.models import (
     is_data_registry_report,
     report_config_id_is_static,
 )
-from corehq.apps.userreports.rebuild import DataSourceResumeHelper
+from corehq.apps.userreports.rebuild import (
+    DataSourceRangeCheckpoints,
+    DataSourceResumeHelper,
+)
 from corehq.apps.userreports.reports.builder.forms import (
     ConfigureListReportForm,
     ConfigureMapReportForm,
@@ -150,6 +153,7 @@ from corehq.apps.userreports.reports.view import (
 from corehq.apps.userreports.specs import EvaluationContext, FactoryContext
 from corehq.apps.userreports.tasks import (
     rebuild_indicators,
+    rebuild_indicators_in_parallel,
     rebuild_indicators_in_place,
     resume_building_indicators,
 )
@@ -1312,6 +1316,28 @@ def rebuild_data_source(request, domain, config_id):
     ))
 
 
+@toggles.USER_CONFIGURABLE_REPORTS.required_decorator()
+@toggles.UCR_PARALLEL_REBUILD.required_decorator()
+@require_POST
+def rebuild_data_source_in_parallel(request, domain, config_id):
+    config, is_static = get_datasource_config_or_404(config_id, domain)
+    if config.is_deactivated:
+        config.is_deactivated = False
+        config.save()
+
+    messages.success(
+        request,
+        _('Table "{}" is now being rebuilt. Data should start showing up soon').format(
+            config.display_name
+        )
+    )
+
+    rebuild_indicators_in_parallel.delay(config_id, request.user.username, domain=domain)
+    return HttpResponseRedirect(reverse(
+        EditDataSourceView.urlname, args=[domain, config._id]
+    ))
+
+
 @toggles.USER_CONFIGURABLE_REPORTS.required_decorator()
 @require_POST
 def resume_building_data_source(request, domain, config_id):
@@ -1323,7 +1349,8 @@ def resume_building_data_source(request, domain, config_id):
                 config.display_name
             )
         )
-    elif not DataSourceResumeHelper(config).has_resume_info():
+    elif not (DataSourceResumeHelper(config).has_resume_info()
+              or DataSourceRangeCheckpoints(config).has_resume_info()):
         messages.warning(
             request,
             _('Table "{}" did not finish building but resume information is not available. '
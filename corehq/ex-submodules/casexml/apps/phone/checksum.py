@@ -1,14 +1,11 @@
 import hashlib
-import binascii
-from copy import copy
-import six
-from six.moves import zip
-from functools import reduce
-from six.moves import map
 
+from dimagi.utils.chunked import chunked
 
 EMPTY_HASH = ""
 CASE_STATE_HASH_PREFIX = "ccsh"
+DIGEST_SIZE = 16  # md5
+CHECKSUM_BATCH_SIZE = 10000
 
 
 class CaseStateHash(object):
@@ -32,6 +29,12 @@ class CaseStateHash(object):
 
 class Checksum(object):
     """
+    Order independent checksum of a set of ids: the XOR of their md5 digests
+
+    The checksum is kept as a running accumulator so memory use does not
+    depend on the number of ids, and since XOR is its own inverse ids can
+    be removed as well as added.
+
     >>> Checksum(['abc123', '123abc']).hexdigest()
     '409c5c597fa2c2a693b769f0d2ad432b'
 
@@ -44,33 +47,103 @@ class Checksum(object):
     >>> c.hexdigest()
     '409c5c597fa2c2a693b769f0d2ad432b'
 
+    >>> c.add('xyz789')
+    >>> c.remove('xyz789')
+    >>> c.hexdigest()
+    '409c5c597fa2c2a693b769f0d2ad432b'
+
+    >>> Checksum.from_state(c.state).hexdigest()
+    '409c5c597fa2c2a693b769f0d2ad432b'
+
     >>> Checksum().hexdigest()
     ''
 
     """
 
     def __init__(self, init=None):
-        self._list = init or []
+        self._value = 0
+        self.count = 0
+        if init:
+            self.update(init)
 
     def add(self, id):
-        self._list.append(id)
+        self._value ^= self._hash_int(id)
+        self.count += 1
+
+    def remove(self, id):
+        self._value ^= self._hash_int(id)
+        self.count -= 1
+
+    def update(self, ids):
+        """Add many ids
+
+        Digests are folded in batches to avoid per-id interpreter overhead.
+        """
+        for chunk in chunked(ids, CHECKSUM_BATCH_SIZE):
+            digests = b''.join(hashlib.md5(_to_bytes(id)).digest() for id in chunk)
+            self._value ^= _xor_fold(digests)
+            self.count += len(chunk)
+
+    @property
+    def state(self):
+        """String representation of the accumulator that can be persisted"""
+        return '{}:{:032x}'.format(self.count, self._value)
+
+    @classmethod
+    def from_state(cls, state):
+        count, value = state.split(':')
+        checksum = cls()
+        checksum.count = int(count)
+        checksum._value = int(value, 16)
+        return checksum
 
     @classmethod
     def hash(cls, line):
-        if isinstance(line, six.text_type):
-            line = line.encode('utf-8')
-        return bytearray(hashlib.md5(line).digest())
+        return bytearray(hashlib.md5(_to_bytes(line)).digest())
+
+    @classmethod
+    def _hash_int(cls, line):
+        return int.from_bytes(hashlib.md5(_to_bytes(line)).digest(), 'big')
 
     @classmethod
     def xor(cls, bytes1, bytes2):
-        assert(len(bytes1) == len(bytes2))
-        return bytearray([b1 ^ b2 for (b1, b2) in zip(bytes1, bytes2)])
+        assert len(bytes1) == len(bytes2)
+        return bytearray(
+            (int.from_bytes(bytes1, 'big') ^ int.from_bytes(bytes2, 'big')).to_bytes(len(bytes1), 'big')
+        )
 
     def hexdigest(self):
-        if not self._list:
+        if not self.count:
             return EMPTY_HASH
-        x = copy(self._list)
-        x = list(map(Checksum.hash, x))
-        x = reduce(Checksum.xor, x)
-        x = binascii.hexlify(bytes(x)).decode('utf-8')
-        return x
+        return '{:032x}'.format(self._value)
+
+
+def _to_bytes(line):
+    if isinstance(line, str):
+        line = line.encode('utf-8')
+    return line
+
+
+def _xor_fold(digests):
+    """XOR together a concatenation of 16-byte digests
+
+    Folds the buffer in half repeatedly using arbitrary precision int
+    XOR, which operates on the whole buffer at C speed.
+    """
+    value = 0
+    size = len(digests)
+    while size:
+        if size % (2 * DIGEST_SIZE):
+            # odd number of digests: take the last one off before folding
+            value ^= int.from_bytes(digests[size - DIGEST_SIZE:size], 'big')
+            size -= DIGEST_SIZE
+            continue
+        half = size // 2
+        digests = (
+            int.from_bytes(digests[:half], 'big') ^ int.from_bytes(digests[half:size], 'big')
+        ).to_bytes(half, 'big')
+        size = half
+        if size == DIGEST_SIZE:
+            value ^= int.from_bytes(digests, 'big')
+            break
+    return value
@@ -15,6 +15,7 @@ ASYNC_RETRY_AFTER = 5
 
 ASYNC_RESTORE_CACHE_KEY_PREFIX = "async-restore-task"
 RESTORE_CACHE_KEY_PREFIX = "ota-restore"
+CASE_CLOSURE_CACHE_KEY_PREFIX = "livequery-closure"
 
 # case sync algorithms
 LIVEQUERY = 'livequery'
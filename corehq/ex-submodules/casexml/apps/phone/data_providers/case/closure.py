@@ -0,0 +1,328 @@
+"""Incremental case graph closure for livequery restores
+
+Computing the live case closure for a user walks the case index graph
+one level at a time, issuing a ``get_related_indices`` query per level.
+For users with many owned cases this walk dominates restore time.
+
+A ``ClosureSnapshot`` records every index row and case status read
+while walking the graph. It is persisted per (user, owner set) and
+used as the starting point of the next sync:
+
+- Cases in the snapshot that have been modified (or deleted) since the
+  snapshot was taken are "dirty". Their index rows and status are
+  re-read from the database in a single query each.
+- Open extension cases that started pointing at a case in the snapshot
+  are found with a single ``get_related_indices`` query that excludes
+  all index rows already known.
+- Everything else is served from the snapshot by ``CaseGraph``, so the
+  (in-memory) closure walk only goes to the database for the delta.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from casexml.apps.phone.restore_caching import CaseClosureSnapshotCache
+
+from corehq.form_processor.models import CommCareCase, CommCareCaseIndex
+from corehq.sql_db.routers import allow_read_from_plproxy_standby
+from corehq.toggles import LIVEQUERY_INCREMENTAL_CLOSURE, NAMESPACE_USER
+from corehq.util.metrics import metrics_counter
+
+# server_modified_on is set by the web worker that processed the form,
+# allow for some clock drift between workers when finding dirty cases
+CLOCK_SKEW_ALLOWANCE = timedelta(minutes=5)
+
+
+def index_key(index):
+    return '{} {}'.format(index.case_id, index.identifier)
+
+
+class ClosureSnapshot:
+    """Case index rows and case statuses read while computing a closure
+
+    :param date: Time before which all data in the snapshot was read.
+    :param rows: Dict of index key to
+        ``(case_id, identifier, referenced_type, referenced_id, relationship_id)``
+    :param queried_ids: Case ids for which all related indices (as
+        returned by ``get_related_indices``) are contained in ``rows``.
+    :param status: Dict of case id to ``(closed, deleted)``.
+    """
+    version = 1
+
+    def __init__(self, date=None, rows=None, queried_ids=None, status=None):
+        self.date = date
+        self.rows = rows if rows is not None else {}
+        self.queried_ids = queried_ids if queried_ids is not None else set()
+        self.status = status if status is not None else {}
+        self._related = None
+
+    def to_json(self):
+        return {
+            'version': self.version,
+            'date': self.date,
+            'rows': list(self.rows.values()),
+            'queried_ids': list(self.queried_ids),
+            'status': [(case_id, closed, deleted) for case_id, (closed, deleted) in self.status.items()],
+        }
+
+    @classmethod
+    def wrap(cls, data):
+        if not data or data.get('version') != cls.version:
+            return None
+        return cls(
+            date=data['date'],
+            rows={'{} {}'.format(row[0], row[1]): tuple(row) for row in data['rows']},
+            queried_ids=set(data['queried_ids']),
+            status={case_id: (closed, deleted) for case_id, closed, deleted in data['status']},
+        )
+
+    def case_ids(self):
+        ids = set(self.queried_ids)
+        ids.update(self.status)
+        for case_id, identifier, referenced_type, referenced_id, relationship_id in self.rows.values():
+            ids.add(case_id)
+            if referenced_id:
+                ids.add(referenced_id)
+        return ids
+
+    def add_index(self, index):
+        self.rows[index_key(index)] = (
+            index.case_id,
+            index.identifier,
+            index.referenced_type,
+            index.referenced_id,
+            index.relationship_id,
+        )
+        self._related = None
+
+    def set_status(self, case_id, closed, deleted):
+        self.status[case_id] = (closed, deleted)
+
+    def discard_cases(self, case_ids):
+        """Forget everything known about the given cases
+
+        Index rows owned by the cases are removed. Rows pointing at
+        them are kept since those are owned by (clean) other cases.
+        """
+        self.queried_ids.difference_update(case_ids)
+        for case_id in case_ids:
+            self.status.pop(case_id, None)
+        self.rows = {key: row for key, row in self.rows.items() if row[0] not in case_ids}
+        self._related = None
+
+    def _get_related(self):
+        if self._related is None:
+            by_case = defaultdict(list)
+            by_host = defaultdict(list)
+            for row in self.rows.values():
+                by_case[row[0]].append(row)
+                if row[3] and row[4] == CommCareCaseIndex.EXTENSION:
+                    by_host[row[3]].append(row)
+            self._related = by_case, by_host
+        return self._related
+
+    def can_serve(self, case_id):
+        """Check if related indices for the case can be served from the snapshot
+
+        The status of all extensions must be known to decide which of
+        them ``get_related_indices`` would return.
+        """
+        if case_id not in self.queried_ids:
+            return False
+        by_case, by_host = self._get_related()
+        return all(row[0] in self.status for row in by_host.get(case_id, []))
+
+    def get_related_rows(self, case_ids):
+        """Get rows equivalent to ``get_related_indices`` for the given case ids
+
+        All case ids must be servable (see ``can_serve``).
+        """
+        by_case, by_host = self._get_related()
+        rows = []
+        for case_id in case_ids:
+            rows.extend(by_case.get(case_id, []))
+            rows.extend(
+                row for row in by_host.get(case_id, [])
+                if self.status[row[0]] == (False, False)  # open extensions
+            )
+        return rows
+
+
+class CaseGraph:
+    """Source of case indices and case statuses for the livequery closure
+
+    Reads are served from a prior ``ClosureSnapshot`` (``base``) where
+    possible and from the database otherwise. Everything read is
+    recorded in a new snapshot (``snapshot``) that can be persisted and
+    used as the base for the next sync.
+    """
+
+    def __init__(self, domain, base=None):
+        self.domain = domain
+        self.base = base if base is not None else ClosureSnapshot()
+        self.snapshot = ClosureSnapshot(datetime.utcnow())
+        self.served_count = 0
+
+    def set_owned(self, owned_ids):
+        """Record owned case ids, which are known to be open and not deleted"""
+        for case_id in owned_ids:
+            self.snapshot.set_status(case_id, False, False)
+
+    def get_related_indices(self, case_ids, exclude_indices):
+        """Get indices (forward and reverse) for the given set of case ids
+
+        Same as ``CommCareCaseIndex.objects.get_related_indices``.
+        """
+        exclude_indices = set(exclude_indices)
+        served_ids = {case_id for case_id in case_ids if self.base.can_serve(case_id)}
+        fetch_ids = [case_id for case_id in case_ids if case_id not in served_ids]
+        related = {}
+        for row in self.base.get_related_rows(served_ids):
+            index = self._make_index(row)
+            key = index_key(index)
+            if key not in exclude_indices:
+                related[key] = index
+                self._copy_status(index.case_id)
+        if fetch_ids:
+            fetch_set = set(fetch_ids)
+            for index in CommCareCaseIndex.objects.get_related_indices(
+                    self.domain, fetch_ids, exclude_indices):
+                related[index_key(index)] = index
+                if (index.case_id not in fetch_set
+                        and index.relationship_id == CommCareCaseIndex.EXTENSION):
+                    # reverse index: only open extensions are returned
+                    self.snapshot.set_status(index.case_id, False, False)
+        for index in related.values():
+            self.snapshot.add_index(index)
+        self.snapshot.queried_ids.update(case_ids)
+        self.served_count += len(served_ids)
+        return list(related.values())
+
+    def get_closed_and_deleted_ids(self, case_ids):
+        """Get the subset of given case ids that are closed or deleted
+
+        Same as ``CommCareCase.objects.get_closed_and_deleted_ids``.
+        """
+        result = []
+        fetch_ids = []
+        for case_id in case_ids:
+            if case_id in self.base.status:
+                closed, deleted = self._copy_status(case_id)
+                if closed or deleted:
+                    result.append((case_id, closed, deleted))
+            else:
+                fetch_ids.append(case_id)
+        if fetch_ids:
+            rows = CommCareCase.objects.get_closed_and_deleted_ids(self.domain, fetch_ids)
+            for case_id in fetch_ids:
+                self.snapshot.set_status(case_id, False, False)
+            for case_id, closed, deleted in rows:
+                self.snapshot.set_status(case_id, closed, deleted)
+                result.append((case_id, closed, deleted))
+        return result
+
+    def _copy_status(self, case_id):
+        status = self.base.status.get(case_id)
+        if status is not None:
+            self.snapshot.set_status(case_id, *status)
+        return status
+
+    def _make_index(self, row):
+        case_id, identifier, referenced_type, referenced_id, relationship_id = row
+        return CommCareCaseIndex(
+            domain=self.domain,
+            case_id=case_id,
+            identifier=identifier,
+            referenced_type=referenced_type,
+            referenced_id=referenced_id,
+            relationship_id=relationship_id,
+        )
+
+
+def refresh_snapshot(domain, snapshot, timing_context):
+    """Bring a snapshot up to date with changes made since it was taken
+
+    :returns: The number of dirty cases that were re-read.
+    """
+    known_ids = snapshot.case_ids()
+    with timing_context("refresh_closure_snapshot(%s cases)" % len(known_ids)):
+        since = snapshot.date - CLOCK_SKEW_ALLOWANCE
+        modified = CommCareCase.objects.get_last_modified_dates(domain, list(known_ids))
+        # cases missing from `modified` have been hard deleted
+        dirty_ids = {
+            case_id for case_id in known_ids
+            if case_id not in modified or modified[case_id] >= since
+        }
+        snapshot.discard_cases(dirty_ids)
+
+        # fetch fresh index rows and status for dirty cases
+        if dirty_ids:
+            _add_related_indices(domain, snapshot, dirty_ids, exclude_indices=[])
+            for case_id in dirty_ids:
+                snapshot.set_status(case_id, False, False)
+            for case_id, closed, deleted in CommCareCase.objects.get_closed_and_deleted_ids(
+                    domain, list(dirty_ids)):
+                snapshot.set_status(case_id, closed, deleted)
+            snapshot.queried_ids.update(dirty_ids)
+
+        # find (open extension) indices that now point at clean cases
+        clean_ids = snapshot.queried_ids - dirty_ids
+        if clean_ids:
+            _add_related_indices(domain, snapshot, clean_ids, exclude_indices=set(snapshot.rows))
+    return len(dirty_ids)
+
+
+def _add_related_indices(domain, snapshot, case_ids, exclude_indices):
+    for index in CommCareCaseIndex.objects.get_related_indices(domain, list(case_ids), exclude_indices):
+        snapshot.add_index(index)
+        if index.case_id not in case_ids and index.relationship_id == CommCareCaseIndex.EXTENSION:
+            # reverse index: only open extensions are returned
+            snapshot.set_status(index.case_id, False, False)
+
+
+class LiveQueryClosureCache:
+    """Load and save closure snapshots for a restore
+
+    Snapshots are keyed on (domain, user, owner ids) so a change in the
+    owner set starts from scratch.
+    """
+
+    def __init__(self, restore_state):
+        self.domain = restore_state.domain
+        self.cache = CaseClosureSnapshotCache(
+            self.domain,
+            restore_state.restore_user.user_id,
+            restore_state.owner_ids,
+        )
+
+    def get_case_graph(self, timing_context):
+        snapshot = ClosureSnapshot.wrap(self.cache.get_value())
+        if snapshot is None:
+            metrics_counter('commcare.restore.closure_snapshot', tags={'domain': self.domain, 'result': 'miss'})
+            return CaseGraph(self.domain)
+        dirty_count = refresh_snapshot(self.domain, snapshot, timing_context)
+        logging.getLogger(__name__).debug("closure snapshot: %s dirty cases", dirty_count)
+        metrics_counter('commcare.restore.closure_snapshot', tags={'domain': self.domain, 'result': 'hit'})
+        metrics_counter('commcare.restore.closure_snapshot.dirty_cases', dirty_count, tags={'domain': self.domain})
+        return CaseGraph(self.domain, snapshot)
+
+    def save(self, case_graph):
+        self.cache.set_value(case_graph.snapshot.to_json())
+        metrics_counter(
+            'commcare.restore.closure_snapshot.served_cases',
+            case_graph.served_count,
+            tags={'domain': self.domain},
+        )
+
+
+def get_closure_cache(restore_state):
+    """Get closure cache for restore or None if not enabled
+
+    Snapshots are not used when reading from standby databases since
+    replication lag could hide changes made before the snapshot date.
+    """
+    if allow_read_from_plproxy_standby():
+        return None
+    if not LIVEQUERY_INCREMENTAL_CLOSURE.enabled(restore_state.restore_user.user_id, NAMESPACE_USER):
+        return None
+    return LiveQueryClosureCache(restore_state)
@@ -22,24 +22,39 @@ Example case graphs with outcomes:
    a(closed) <--ext-- b <--chi-- c(owned) >> []
 """
 import logging
-from collections import defaultdict
-from functools import partial, wraps
+import queue
+from collections import defaultdict, deque
+from concurrent.futures import Future
+from contextlib import nullcontext
+from functools import wraps
 from itertools import chain, islice
+from threading import Thread
+
+from django.db import connections
 
 from casexml.apps.case.const import CASE_INDEX_EXTENSION as EXTENSION
 from casexml.apps.phone.const import ASYNC_RETRY_AFTER
 from casexml.apps.phone.tasks import ASYNC_RESTORE_SENT
 
-from corehq.form_processor.models import CommCareCase, CommCareCaseIndex
-from corehq.sql_db.routers import read_from_plproxy_standbys
-from corehq.toggles import LIVEQUERY_READ_FROM_STANDBYS, NAMESPACE_USER
+from corehq.form_processor.models import CommCareCase
+from corehq.sql_db.routers import (
+    allow_read_from_plproxy_standby,
+    read_from_plproxy_standbys,
+)
+from corehq.sql_db.util import split_list_by_db_partition
+from corehq.toggles import (
+    LIVEQUERY_PIPELINED_RESTORE,
+    LIVEQUERY_READ_FROM_STANDBYS,
+    NAMESPACE_USER,
+)
 from corehq.util.metrics import metrics_counter, metrics_histogram
 from corehq.util.metrics.load_counters import case_load_counter
 from corehq.util.timer import TimingContext
 
-from .load_testing import get_xml_for_response
+from .closure import CaseGraph, get_closure_cache
 from .stock import get_stock_payload
 from .utils import get_case_sync_updates
+from .xml_cache import get_xml_for_updates
 
 
 def livequery_read_from_standbys(func):
@@ -74,7 +89,15 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
                 domain, owner_ids, closed=False)
             debug("owned: %r", owned_ids)
 
-        live_ids, indices = get_live_case_ids_and_indices(domain, owned_ids, timing_context)
+        closure_cache = get_closure_cache(restore_state)
+        if closure_cache is not None:
+            case_graph = closure_cache.get_case_graph(timing_context)
+        else:
+            case_graph = None
+        live_ids, indices = get_live_case_ids_and_indices(domain, owned_ids, timing_context, case_graph)
+        if closure_cache is not None:
+            with timing_context("save_closure_snapshot"):
+                closure_cache.save(case_graph)
 
         if restore_state.last_sync_log:
             with timing_context("discard_already_synced_cases"):
@@ -85,7 +108,7 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
 
         dependent_ids = live_ids - set(owned_ids)
         debug('updating synclog: live=%r dependent=%r', live_ids, dependent_ids)
-        restore_state.current_sync_log.case_ids_on_phone = live_ids
+        restore_state.current_sync_log.set_case_ids_on_phone(live_ids)
         restore_state.current_sync_log.dependent_case_ids_on_phone = dependent_ids
 
         total_cases = len(sync_ids)
@@ -102,11 +125,12 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
                 }
             )
             metrics_counter('commcare.restore.case_load.count', total_cases, {'domain': domain})
+            prefetch = get_prefetch_depth(restore_state, async_task, total_cases)
             compile_response(
                 timing_context,
                 restore_state,
                 response,
-                batch_cases(iaccessor, sync_ids),
+                batch_cases(iaccessor, sync_ids, prefetch),
                 init_progress(async_task, total_cases),
                 total_cases,
             )
@@ -130,7 +154,13 @@ def get_all_related_live_cases(domain, case_ids):
     return new_cases
 
 
-def get_live_case_ids_and_indices(domain, owned_ids, timing_context):
+def get_live_case_ids_and_indices(domain, owned_ids, timing_context, case_graph=None):
+    """Get the live closure of the given owned case ids
+
+    :param case_graph: Optional ``CaseGraph`` used to read case indices
+    and statuses. Defaults to reading everything from the database.
+    :returns: A tuple ``(live_ids, indices)``.
+    """
     def index_key(index):
         return '{} {}'.format(index.case_id, index.identifier)
 
@@ -257,7 +287,7 @@ def get_live_case_ids_and_indices(domain, owned_ids, timing_context):
             if index.relationship == 'extension'
         }
         check_cases = list(set(case_ids) - open_cases)
-        rows = CommCareCase.objects.get_closed_and_deleted_ids(domain, check_cases)
+        rows = case_graph.get_closed_and_deleted_ids(check_cases)
         for case_id, closed, deleted in rows:
             if deleted:
                 deleted_ids.add(case_id)
@@ -289,7 +319,10 @@ def get_live_case_ids_and_indices(domain, owned_ids, timing_context):
     next_ids = all_ids = set(owned_ids)
     owned_ids = set(owned_ids)  # owned, open case ids (may be extensions)
     open_ids = set(owned_ids)
-    get_related_indices = partial(CommCareCaseIndex.objects.get_related_indices, domain)
+    if case_graph is None:
+        case_graph = CaseGraph(domain)
+    case_graph.set_owned(owned_ids)
+    get_related_indices = case_graph.get_related_indices
     while next_ids:
         exclude = set(chain.from_iterable(seen_ix[id] for id in next_ids))
         with timing_context("get_related_indices({} cases, {} seen)".format(len(next_ids), len(exclude))):
@@ -356,19 +389,118 @@ class PrefetchIndexCaseAccessor:
         return CommCareCase.objects.get_cases(case_ids, self.domain, **kw)
 
 
-def batch_cases(accessor, case_ids):
+def batch_cases(accessor, case_ids, prefetch=0):
+    """Fetch cases in batches
+
+    :param prefetch: Number of batches to fetch ahead of the consumer
+    in worker threads. Case ids are batched per shard so each batch
+    touches one shard database, and the batches of different shards
+    are interleaved so concurrent fetches are spread over different
+    shards. Zero to fetch serially.
+    """
     def take(n, iterable):
         # https://docs.python.org/2/library/itertools.html#recipes
         return list(islice(iterable, n))
 
+    def iter_id_batches(ids):
+        ids = iter(ids)
+        while True:
+            next_ids = take(CASE_BATCH_SIZE, ids)
+            if not next_ids:
+                break
+            yield next_ids
+
     track_load = case_load_counter("livequery_restore", accessor.domain)
-    ids = iter(case_ids)
-    while True:
-        next_ids = take(1000, ids)
-        if not next_ids:
-            break
-        track_load(len(next_ids))
-        yield accessor.get_cases(next_ids)
+    if prefetch:
+        ids_by_shard = split_list_by_db_partition(case_ids)
+        id_batches = roundrobin(*(iter_id_batches(ids) for db, ids in ids_by_shard))
+        for next_ids, cases in iter_prefetched(accessor.get_cases, id_batches, prefetch):
+            track_load(len(next_ids))
+            yield cases
+    else:
+        for next_ids in iter_id_batches(case_ids):
+            track_load(len(next_ids))
+            yield accessor.get_cases(next_ids)
+
+
+def roundrobin(*iterables):
+    """Take one item from each iterable in turn until all are exhausted
+
+    roundrobin('ABC', 'D', 'EF') --> A D E B F C
+    """
+    iterators = deque(iter(it) for it in iterables)
+    while iterators:
+        iterator = iterators.popleft()
+        try:
+            yield next(iterator)
+        except StopIteration:
+            continue
+        iterators.append(iterator)
+
+
+def iter_prefetched(fetch, items, depth):
+    """Call ``fetch(item)`` for each item in worker threads
+
+    Results are yielded in order as ``(item, result)`` pairs. At most
+    ``depth`` results are fetched ahead of the consumer, which bounds
+    memory use. Exceptions raised by ``fetch`` are re-raised in the
+    consumer.
+
+    Each worker thread uses (and closes) its own database connections
+    and inherits the plproxy standby read setting of the caller.
+    """
+    def worker():
+        try:
+            with read_from_plproxy_standbys() if use_standbys else nullcontext():
+                while True:
+                    task = tasks.get()
+                    if task is None:
+                        return
+                    item, future = task
+                    try:
+                        future.set_result(fetch(item))
+                    except BaseException as err:
+                        future.set_exception(err)
+        finally:
+            connections.close_all()
+
+    def submit():
+        for item in islice(items, 1):
+            future = Future()
+            tasks.put((item, future))
+            pending.append((item, future))
+
+    use_standbys = allow_read_from_plproxy_standby()
+    tasks = queue.Queue()
+    pending = deque()
+    items = iter(items)
+    workers = [Thread(target=worker, daemon=True) for i in range(depth)]
+    for thread in workers:
+        thread.start()
+    try:
+        for i in range(depth):
+            submit()
+        while pending:
+            item, future = pending.popleft()
+            result = future.result()
+            submit()
+            yield item, result
+    finally:
+        for thread in workers:
+            tasks.put(None)
+
+
+def get_prefetch_depth(restore_state, async_task, total_cases):
+    """Get the number of case batches to prefetch for a restore
+
+    Only asynchronous restores with more than one batch of cases use
+    the pipelined mode.
+    """
+    if (async_task is None
+            or total_cases <= CASE_BATCH_SIZE
+            or not LIVEQUERY_PIPELINED_RESTORE.enabled(restore_state.restore_user.user_id, NAMESPACE_USER)):
+        return 0
+    return PIPELINED_RESTORE_PREFETCH_DEPTH
 
 
 def init_progress(async_task, total):
@@ -411,15 +543,12 @@ def compile_response(
                 restore_state.domain, cases, restore_state.last_sync_log)
 
         with timing_context("get_xml_for_response (%s updates)" % len(updates)):
-            response.extend(
-                item for update in updates
-                for item in get_xml_for_response(
-                    update, restore_state, total_cases
-                )
-            )
+            response.extend(get_xml_for_updates(updates, restore_state, total_cases))
 
         done += len(cases)
         update_progress(done)
 
 
+CASE_BATCH_SIZE = 1000
+PIPELINED_RESTORE_PREFETCH_DEPTH = 3
 RESTORE_CASE_LOAD_BUCKETS = [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000]
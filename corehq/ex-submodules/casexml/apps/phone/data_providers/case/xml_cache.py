@@ -0,0 +1,64 @@
+"""Cache of rendered case XML for restore payloads
+
+Users sharing cases (for example through location case sharing) often
+restore the same cases within minutes of each other. Rendered ``<case>``
+blocks are cached by content: the key includes everything the rendered
+bytes depend on, so entries never need to be invalidated and simply
+expire (or are evicted by Redis' LRU policy).
+"""
+import hashlib
+
+from dimagi.utils.couch.cache.cache_core import get_redis_default_cache
+
+from corehq.toggles import RESTORE_CASE_XML_CACHE
+from corehq.util.metrics import metrics_counter
+
+from .load_testing import get_xml_for_response
+
+CASE_XML_CACHE_KEY_PREFIX = 'restore-case-xml'
+CASE_XML_CACHE_TIMEOUT = 60 * 60
+
+
+def get_xml_for_updates(updates, restore_state, total_cases):
+    """Get rendered case XML for all updates, using cached fragments if enabled
+
+    :returns: List of XML bytes to be added to the restore response.
+    """
+    if (not RESTORE_CASE_XML_CACHE.enabled(restore_state.domain)
+            or restore_state.get_safe_loadtest_factor(total_cases) > 1):
+        return [
+            item for update in updates
+            for item in get_xml_for_response(update, restore_state, total_cases)
+        ]
+
+    keys = [_get_cache_key(restore_state.domain, update, restore_state.version) for update in updates]
+    cache = get_redis_default_cache()
+    cached = cache.get_many(keys)
+    to_cache = {}
+    items = []
+    for key, update in zip(keys, updates):
+        if key in cached:
+            items.append(cached[key])
+        else:
+            rendered = b''.join(get_xml_for_response(update, restore_state, total_cases))
+            to_cache[key] = rendered
+            items.append(rendered)
+    if to_cache:
+        cache.set_many(to_cache, timeout=CASE_XML_CACHE_TIMEOUT)
+
+    tags = {'domain': restore_state.domain}
+    metrics_counter('commcare.restore.case_xml_cache.hits', len(updates) - len(to_cache), tags=tags)
+    metrics_counter('commcare.restore.case_xml_cache.misses', len(to_cache), tags=tags)
+    return items
+
+
+def _get_cache_key(domain, update, version):
+    case = update.case
+    hashable_key = ','.join([
+        domain,
+        case.case_id,
+        case.server_modified_on.isoformat(),
+        version,
+        ' '.join(update.required_updates),
+    ])
+    return '{}-{}'.format(CASE_XML_CACHE_KEY_PREFIX, hashlib.md5(hashable_key.encode('utf-8')).hexdigest())
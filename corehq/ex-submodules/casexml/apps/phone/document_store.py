@@ -6,7 +6,7 @@ class SyncLogDocumentStore(DjangoDocumentStore):
     def __init__(self):
 
         def _to_doc(model):
-            return model.doc
+            return model.get_doc()
 
         super().__init__(SyncLogSQL, doc_generator_fn=_to_doc)
 
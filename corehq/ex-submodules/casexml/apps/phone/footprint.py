@@ -0,0 +1,175 @@
+"""Compact binary encoding of the case footprint of a SimplifiedSyncLog
+
+The case id sets and index trees make up nearly all of a sync log
+document. Stored as JSON every case id is repeated in full wherever it
+appears. The compact encoding instead:
+
+- interns every case id once in a table, packing UUID-formatted ids
+  (with or without dashes) into 16 bytes each,
+- stores the sets as delta-encoded lists of sorted table positions,
+- stores index trees as ``(case, identifier, referenced case)`` triples
+  of table positions,
+- and zlib-compresses the result.
+
+Sync logs written with the compact encoding keep the remaining fields
+in ``SyncLogSQL.doc`` and the footprint in ``SyncLogSQL.footprint``.
+Sync logs written before it have the footprint in ``doc`` and are read
+as before, so no data migration is needed: logs are converted as they
+are re-saved and old ones are pruned with their partitions.
+"""
+import json
+import re
+import struct
+import uuid
+import zlib
+
+FOOTPRINT_SET_FIELDS = (
+    'case_ids_on_phone',
+    'dependent_case_ids_on_phone',
+    'closed_cases',
+)
+FOOTPRINT_TREE_FIELDS = (
+    'index_tree',
+    'extension_index_tree',
+)
+FOOTPRINT_FIELDS = FOOTPRINT_SET_FIELDS + FOOTPRINT_TREE_FIELDS
+
+MAGIC = b'SLF1'
+_HEADER = struct.Struct('>4sI')
+_HEX_ID = re.compile(r'^[0-9a-f]{32}$')
+_DASHED_ID = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def split_footprint(doc):
+    """Split a sync log JSON document into (doc, compact footprint)
+
+    :returns: A tuple of the document without footprint fields and the
+    encoded footprint bytes.
+    """
+    doc = dict(doc)
+    footprint = {field: doc.pop(field) for field in FOOTPRINT_FIELDS if field in doc}
+    return doc, encode_footprint(footprint)
+
+
+def merge_footprint(doc, data):
+    """Inverse of ``split_footprint``"""
+    doc = dict(doc)
+    doc.update(decode_footprint(data))
+    return doc
+
+
+def encode_footprint(footprint):
+    """Encode the footprint fields of a sync log document
+
+    ``None`` case ids, like a referenced id of an index to a case that
+    is not known, are left out.
+    """
+    hex_ids, dashed_ids, other_ids = set(), set(), set()
+    for case_id in _iter_case_ids(footprint):
+        if _HEX_ID.match(case_id):
+            hex_ids.add(case_id)
+        elif _DASHED_ID.match(case_id):
+            dashed_ids.add(case_id)
+        else:
+            other_ids.add(case_id)
+    hex_ids, dashed_ids, other_ids = sorted(hex_ids), sorted(dashed_ids), sorted(other_ids)
+    positions = {case_id: i for i, case_id in enumerate(hex_ids + dashed_ids + other_ids)}
+
+    identifiers = sorted({
+        identifier
+        for field in FOOTPRINT_TREE_FIELDS
+        for indices in footprint.get(field, {}).get('indices', {}).values()
+        for identifier in indices
+    })
+    identifier_positions = {identifier: i for i, identifier in enumerate(identifiers)}
+
+    header = {
+        'hex': len(hex_ids),
+        'dashed': len(dashed_ids),
+        'other': other_ids,
+        'identifiers': identifiers,
+        'sets': {
+            field: _delta_encode(sorted(
+                positions[case_id] for case_id in footprint[field] if case_id is not None
+            ))
+            for field in FOOTPRINT_SET_FIELDS if field in footprint
+        },
+        'trees': {
+            field: [
+                [positions[case_id], identifier_positions[identifier], positions[referenced_id]]
+                for case_id, indices in sorted(footprint[field].get('indices', {}).items())
+                for identifier, referenced_id in sorted(indices.items())
+                if case_id is not None and referenced_id is not None
+            ]
+            for field in FOOTPRINT_TREE_FIELDS if field in footprint
+        },
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    body = b''.join([
+        _HEADER.pack(MAGIC, len(header_bytes)),
+        header_bytes,
+        b''.join(uuid.UUID(hex=case_id).bytes for case_id in hex_ids),
+        b''.join(uuid.UUID(case_id).bytes for case_id in dashed_ids),
+    ])
+    return zlib.compress(body)
+
+
+def decode_footprint(data):
+    body = zlib.decompress(bytes(data))
+    magic, header_size = _HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError("Unknown footprint format: {!r}".format(magic))
+    offset = _HEADER.size
+    header = json.loads(body[offset:offset + header_size])
+    offset += header_size
+    case_ids = []
+    for count, as_string in [(header['hex'], _uuid_hex), (header['dashed'], str)]:
+        for i in range(count):
+            case_ids.append(as_string(uuid.UUID(bytes=body[offset:offset + 16])))
+            offset += 16
+    case_ids.extend(header['other'])
+    identifiers = header['identifiers']
+
+    footprint = {}
+    for field, deltas in header['sets'].items():
+        footprint[field] = [case_ids[position] for position in _delta_decode(deltas)]
+    for field, triples in header['trees'].items():
+        indices = {}
+        for case_position, identifier_position, referenced_position in triples:
+            indices.setdefault(case_ids[case_position], {})[identifiers[identifier_position]] = \
+                case_ids[referenced_position]
+        footprint[field] = {'doc_type': 'IndexTree', 'indices': indices}
+    return footprint
+
+
+def _iter_case_ids(footprint):
+    for field in FOOTPRINT_SET_FIELDS:
+        for case_id in footprint.get(field, []):
+            if case_id is not None:
+                yield case_id
+    for field in FOOTPRINT_TREE_FIELDS:
+        for case_id, indices in footprint.get(field, {}).get('indices', {}).items():
+            for referenced_id in indices.values():
+                if case_id is not None and referenced_id is not None:
+                    yield case_id
+                    yield referenced_id
+
+
+def _uuid_hex(value):
+    return value.hex
+
+
+def _delta_encode(positions):
+    previous = 0
+    deltas = []
+    for position in positions:
+        deltas.append(position - previous)
+        previous = position
+    return deltas
+
+
+def _delta_decode(deltas):
+    position = 0
+    for delta in deltas:
+        position += delta
+        yield position
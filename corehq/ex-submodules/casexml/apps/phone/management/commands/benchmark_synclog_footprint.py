@@ -0,0 +1,96 @@
+import json
+import random
+import uuid
+from timeit import default_timer
+
+from django.core.management import BaseCommand
+
+from casexml.apps.phone.footprint import merge_footprint, split_footprint
+from casexml.apps.phone.models import (
+    IndexTree,
+    SimplifiedSyncLog,
+    get_properly_wrapped_sync_log,
+    properly_wrap_sync_log,
+)
+
+
+class Command(BaseCommand):
+    """
+    Compare load/save time and row size of the JSON and compact sync
+    log footprint encodings for a synthetic sync log.
+
+    Does not touch the database: "save" is serializing a sync log to
+    the values stored in SyncLogSQL and "load" is wrapping those values
+    back into a sync log.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=50000)
+        parser.add_argument('--dependent-ratio', type=float, default=0.2)
+        parser.add_argument('--indexed-ratio', type=float, default=0.5)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--log-id', help="Benchmark an existing sync log instead of a synthetic one")
+
+    def handle(self, cases, dependent_ratio, indexed_ratio, repeat, log_id=None, **options):
+        if log_id:
+            sync_log = get_properly_wrapped_sync_log(log_id)
+        else:
+            sync_log = _make_sync_log(cases, dependent_ratio, indexed_ratio)
+        print('cases on phone: {}'.format(len(sync_log.case_ids_on_phone)))
+
+        def save_json():
+            return json.dumps(sync_log.to_json())
+
+        def load_json():
+            return properly_wrap_sync_log(json.loads(json_row))
+
+        def save_compact():
+            doc, footprint = split_footprint(sync_log.to_json())
+            return json.dumps(doc), footprint
+
+        def load_compact():
+            return properly_wrap_sync_log(merge_footprint(json.loads(compact_doc), compact_footprint))
+
+        json_row = save_json()
+        compact_doc, compact_footprint = save_compact()
+        loaded = load_compact()
+        assert loaded.case_ids_on_phone == sync_log.case_ids_on_phone
+        assert loaded.dependent_case_ids_on_phone == sync_log.dependent_case_ids_on_phone
+        assert loaded.index_tree.indices == sync_log.index_tree.indices
+        assert loaded.extension_index_tree.indices == sync_log.extension_index_tree.indices
+
+        print('{:<10}{:>14}{:>12}{:>12}'.format('format', 'size (bytes)', 'save (s)', 'load (s)'))
+        for name, size, save, load in [
+            ('json', len(json_row.encode('utf-8')), save_json, load_json),
+            ('compact', len(compact_doc.encode('utf-8')) + len(compact_footprint), save_compact, load_compact),
+        ]:
+            save_time, load_time = _best_of(repeat, save), _best_of(repeat, load)
+            print('{:<10}{:>14}{:>12.3f}{:>12.3f}'.format(name, size, save_time, load_time))
+
+
+def _best_of(repeat, fn):
+    times = []
+    for i in range(repeat):
+        start = default_timer()
+        fn()
+        times.append(default_timer() - start)
+    return min(times)
+
+
+def _make_sync_log(cases, dependent_ratio, indexed_ratio):
+    case_ids = [str(uuid.uuid4()) for i in range(cases)]
+    dependent_ids = random.sample(case_ids, int(cases * dependent_ratio))
+    index_tree = IndexTree()
+    extension_index_tree = IndexTree()
+    for case_id in random.sample(case_ids, int(cases * indexed_ratio)):
+        tree = index_tree if random.random() < 0.8 else extension_index_tree
+        tree.set_index(case_id, 'parent' if tree is index_tree else 'host', random.choice(dependent_ids))
+    return SimplifiedSyncLog(
+        _id=uuid.uuid4().hex,
+        domain='benchmark',
+        user_id=uuid.uuid4().hex,
+        case_ids_on_phone=set(case_ids),
+        dependent_case_ids_on_phone=set(dependent_ids),
+        index_tree=index_tree,
+        extension_index_tree=extension_index_tree,
+    )
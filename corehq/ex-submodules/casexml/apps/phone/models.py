@@ -20,6 +20,7 @@ from casexml.apps.phone.exceptions import (
     IncompatibleSyncLogType,
     MissingSyncLog,
 )
+from casexml.apps.phone.footprint import merge_footprint, split_footprint
 from dimagi.ext.couchdbkit import (
     BooleanProperty,
     DateTimeProperty,
@@ -133,6 +134,9 @@ class OTARestoreUser(object):
     def get_fixture_data_items(self):
         raise NotImplementedError()
 
+    def get_lookup_table_owners(self):
+        raise NotImplementedError()
+
     def get_commtrack_location_id(self):
         raise NotImplementedError()
 
@@ -172,6 +176,9 @@ class OTARestoreWebUser(OTARestoreUser):
     def get_fixture_data_items(self):
         return []
 
+    def get_lookup_table_owners(self):
+        return []
+
     def get_commtrack_location_id(self):
         return None
 
@@ -210,6 +217,11 @@ class OTARestoreCommCareUser(OTARestoreUser):
 
         return LookupTableRow.objects.iter_by_user(self._couch_user)
 
+    def get_lookup_table_owners(self):
+        from corehq.apps.fixtures.models import get_user_owners
+
+        return get_user_owners(self._couch_user)
+
     def get_commtrack_location_id(self):
         from corehq.apps.commtrack.util import get_commtrack_location_id
 
@@ -428,7 +440,10 @@ def synclog_to_sql_object(synclog_json_object):
     ]
     for from_field, to_field in field_mapping:
         setattr(synclog, to_field, getattr(synclog_json_object, from_field, None))
-    synclog.doc = synclog_json_object.to_json()
+    synclog.set_doc(
+        synclog_json_object.to_json(),
+        compact=toggles.COMPACT_SYNCLOG_FOOTPRINT.enabled(synclog_json_object.domain),
+    )
     return synclog
 
 
@@ -461,6 +476,20 @@ class SyncLogSQL(models.Model):
     case_count = models.IntegerField(null=True)
     request_user_id = models.CharField(max_length=255, null=True)
     auth_type = models.CharField(max_length=128, null=True)
+    # compact encoding of the case footprint fields of `doc`, see footprint.py
+    footprint = models.BinaryField(null=True)
+
+    def get_doc(self):
+        """Get the full sync log document, including the case footprint"""
+        if self.footprint is None:
+            return self.doc
+        return merge_footprint(self.doc, self.footprint)
+
+    def set_doc(self, doc, compact=False):
+        if compact:
+            self.doc, self.footprint = split_footprint(doc)
+        else:
+            self.doc, self.footprint = doc, None
 
     def save(self, *args, **kwargs):
         super(SyncLogSQL, self).save(*args, **kwargs)
@@ -614,8 +643,20 @@ class SimplifiedSyncLog(AbstractSyncLog):
     extensions_checked = BooleanProperty(default=False)
     device_id = StringProperty()
     auth_type = StringProperty()
+    # running checksum of case_ids_on_phone (see Checksum.state), kept up to
+    # date by update_phone_lists so the state hash doesn't need recomputing
+    case_ids_checksum = StringProperty()
 
     _purged_cases = None
+    # the case_ids_on_phone set that case_ids_checksum is the checksum of
+    _checksum_case_ids = None
+
+    @classmethod
+    def wrap(cls, data):
+        sync_log = super(SimplifiedSyncLog, cls).wrap(data)
+        # the checksum is saved with the case ids
+        sync_log._checksum_case_ids = sync_log.case_ids_on_phone
+        return sync_log
 
     @property
     def purged_cases(self):
@@ -639,6 +680,29 @@ class SimplifiedSyncLog(AbstractSyncLog):
     def get_footprint_of_cases_on_phone(self):
         return list(self.case_ids_on_phone)
 
+    def get_state_hash(self):
+        return CaseStateHash(self._get_case_ids_checksum(self.case_ids_on_phone).hexdigest())
+
+    def set_case_ids_on_phone(self, case_ids):
+        """Replace the case ids on the phone, and their checksum"""
+        self.case_ids_on_phone = case_ids
+        self._set_case_ids_checksum(Checksum(self.case_ids_on_phone))
+
+    def _set_case_ids_checksum(self, checksum):
+        self.case_ids_checksum = checksum.state
+        self._checksum_case_ids = self.case_ids_on_phone
+
+    def _get_case_ids_checksum(self, case_ids):
+        """Get the stored checksum, or compute it if it is missing or stale
+
+        The stored checksum is stale if case_ids_on_phone was replaced
+        without updating it. It is kept up to date when case ids are
+        added and removed by update_phone_lists.
+        """
+        if self.case_ids_checksum and self._checksum_case_ids is self.case_ids_on_phone:
+            return Checksum.from_state(self.case_ids_checksum)
+        return Checksum(case_ids)
+
     @property
     def primary_case_ids(self):
         return self.case_ids_on_phone - self.dependent_case_ids_on_phone
@@ -842,6 +906,7 @@ class SimplifiedSyncLog(AbstractSyncLog):
         # classification from the radon code static analysis
 
         made_changes = False
+        case_ids_before = set(self.case_ids_on_phone)
         _get_logger().debug('updating sync log for {}'.format(self.user_id))
         _get_logger().debug('case ids before update: {}'.format(', '.join(self.case_ids_on_phone)))
         _get_logger().debug('dependent case ids before update: {}'.format(
@@ -975,12 +1040,25 @@ class SimplifiedSyncLog(AbstractSyncLog):
             ', '.join(self.dependent_case_ids_on_phone)))
         _get_logger().debug('index tree after update: {}'.format(self.index_tree))
         _get_logger().debug('extension index tree after update: {}'.format(self.extension_index_tree))
+        self._update_case_ids_checksum(case_ids_before)
         if made_changes or not self.last_submitted:
             _get_logger().debug('made changes')
             self.last_submitted = datetime.utcnow()
             self.rev_before_last_submitted = self._rev
         return made_changes
 
+    def _update_case_ids_checksum(self, case_ids_before):
+        added = self.case_ids_on_phone - case_ids_before
+        removed = case_ids_before - self.case_ids_on_phone
+        if not (added or removed) and self._checksum_case_ids is self.case_ids_on_phone:
+            return
+        checksum = self._get_case_ids_checksum(case_ids_before)
+        for case_id in added:
+            checksum.add(case_id)
+        for case_id in removed:
+            checksum.remove(case_id)
+        self._set_case_ids_checksum(checksum)
+
 
 class CaseUpdate:
 
@@ -1040,7 +1118,7 @@ def get_properly_wrapped_sync_log(doc_id):
     try:
         synclog = SyncLogSQL.objects.filter(synclog_id=doc_id).first()
         if synclog:
-            return properly_wrap_sync_log(synclog.doc, synclog)
+            return properly_wrap_sync_log(synclog.get_doc(), synclog)
     except ValidationError:
         # this occurs if doc_id is not a valid UUID
         pass
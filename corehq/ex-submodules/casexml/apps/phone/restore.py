@@ -1,6 +1,6 @@
+import io
 import logging
 import os
-import shutil
 import tempfile
 import uuid
 from datetime import datetime, timedelta
@@ -116,7 +116,8 @@ class RestoreContent(object):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.response_body.close()
+        if self.response_body is not None:
+            self.response_body.close()
 
     def append(self, xml_element):
         self.num_items += 1
@@ -131,31 +132,88 @@ class RestoreContent(object):
         for element in iterable:
             self.append(element)
 
-    def _write_to_file(self, fileobj):
+    def _get_start_tag(self):
         # Add 1 to num_items to account for message element
         items = (self.items_template % ('%s' % (self.num_items + 1)).encode('utf-8')) if self.items else b''
-        fileobj.write(self.start_tag_template % {
+        return self.start_tag_template % {
             b"items": items,
             b"username": self.username.encode("utf8"),
             b"nature": ResponseNature.OTA_RESTORE_SUCCESS.encode("utf8"),
-        })
-
-        self.response_body.seek(0)
-        shutil.copyfileobj(self.response_body, fileobj)
-
-        fileobj.write(self.closing_tag)
+        }
 
     def get_fileobj(self):
-        fileobj = tempfile.TemporaryFile('w+b')
+        """Get a file-like object with the complete response content
+
+        The start tag depends on the number of items, so it can only be
+        rendered once all items have been appended. Rather than copying
+        the (possibly very large) body into a new file after it, the
+        returned object reads through the start tag, body and closing
+        tag in turn. It takes ownership of the body file, so no more
+        items can be appended after this is called.
+        """
+        body, self.response_body = self.response_body, None
         try:
-            self._write_to_file(fileobj)
-            fileobj.seek(0)
-            return fileobj
+            return RestorePayloadFile([self._get_start_tag(), body, self.closing_tag])
         except:  # noqa
-            fileobj.close()
+            body.close()
             raise
 
 
+class RestorePayloadFile(io.RawIOBase):
+    """Read-only, seekable concatenation of bytes and binary files"""
+
+    def __init__(self, parts):
+        self._parts = []
+        offset = 0
+        for part in parts:
+            if isinstance(part, bytes):
+                part = BytesIO(part)
+            size = part.seek(0, os.SEEK_END)
+            self._parts.append((offset, size, part))
+            offset += size
+        self._size = offset
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        for offset, size, part in self._parts:
+            if offset <= self._position < offset + size:
+                part.seek(self._position - offset)
+                length = min(len(buffer), offset + size - self._position)
+                length = part.readinto(memoryview(buffer)[:length])
+                self._position += length
+                return length
+        return 0
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError("invalid whence: {!r}".format(whence))
+        if position < 0:
+            raise ValueError("negative seek position {}".format(position))
+        self._position = position
+        return position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            for offset, size, part in self._parts:
+                part.close()
+        super().close()
+
+
 class RestoreResponse(object):
 
     def __init__(self, fileobj):
@@ -216,8 +274,9 @@ class AsyncRestoreResponse(object):
 
 
 class CachedResponse(object):
+    compressed_suffix = '.gz'
 
-    def __init__(self, name):
+    def __init__(self, name, parent_id=None):
         if name and name.startswith("restore-response-"):
             # Name template was 'restore-response-{}.xml' before new
             # blob metadata API was implemented. This can be removed
@@ -226,25 +285,36 @@ class CachedResponse(object):
             # '_default' is the bucket name from the old blob db API.
             name = "_default/" + name
         self.name = name
+        self.parent_id = parent_id
 
     @classmethod
     def save_for_later(cls, fileobj, timeout, domain, restore_user_id):
         """Save restore response for later
 
+        Content is gzip-compressed in chunks as it is written to the
+        blob db, so it is never held in memory or on disk uncompressed.
+
         :param fileobj: A file-like object.
         :param timeout: Minimum content expiration in seconds.
         :returns: A new `CachedResponse` pointing to the saved content.
         """
-        name = 'restore-{}.xml'.format(uuid4().hex)
-        get_blob_db().put(
+        name = 'restore-{}.xml{}'.format(uuid4().hex, cls.compressed_suffix)
+        meta = get_blob_db().put(
             NoClose(fileobj),
             domain=domain,
             parent_id=restore_user_id,
             type_code=CODES.restore,
             key=name,
             timeout=max(timeout // 60, 60),
+            compressed_length=-1,
         )
-        return cls(name)
+        response = cls(name, restore_user_id)
+        response._meta = meta
+        return response
+
+    @property
+    def is_compressed(self):
+        return bool(self.name) and self.name.endswith(self.compressed_suffix)
 
     def __bool__(self):
         try:
@@ -262,10 +332,30 @@ class CachedResponse(object):
         try:
             value = self._fileobj
         except AttributeError:
-            value = get_blob_db().get(key=self.name, type_code=CODES.restore) if self.name else None
+            if not self.name:
+                value = None
+            elif self.is_compressed:
+                # compressed content must be read with its metadata
+                value = get_blob_db().get(meta=self._get_meta())
+            else:
+                value = get_blob_db().get(key=self.name, type_code=CODES.restore)
             self._fileobj = value
         return value
 
+    def _get_meta(self):
+        try:
+            return self._meta
+        except AttributeError:
+            pass
+        if not self.parent_id:
+            raise NotFound(self.name)
+        db = get_blob_db()
+        try:
+            self._meta = db.metadb.get(parent_id=self.parent_id, key=self.name)
+        except db.metadb.DoesNotExist:
+            raise NotFound(self.name)
+        return self._meta
+
     def get_http_response(self):
         file = self.as_file()
         headers = {'Content-Length': file.content_length}
@@ -635,7 +725,7 @@ class RestoreConfig(object):
 
         cache_payload_path = self.restore_payload_path_cache.get_value()
 
-        return CachedResponse(cache_payload_path)
+        return CachedResponse(cache_payload_path, self.restore_user.user_id)
 
     def generate_payload(self, async_task=None):
         if async_task:
@@ -692,7 +782,7 @@ class RestoreConfig(object):
             if isinstance(response_or_name, bytes):
                 response_or_name = response_or_name.decode('utf-8')
             if isinstance(response_or_name, str):
-                response = CachedResponse(response_or_name)
+                response = CachedResponse(response_or_name, self.restore_user.user_id)
             else:
                 response = response_or_name
         except TimeoutError:
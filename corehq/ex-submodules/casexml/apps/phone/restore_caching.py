@@ -8,7 +8,11 @@ from corehq import privileges
 from corehq.apps.accounting.utils import domain_has_privilege
 from corehq.util.quickcache import quickcache
 
-from .const import ASYNC_RESTORE_CACHE_KEY_PREFIX, RESTORE_CACHE_KEY_PREFIX
+from .const import (
+    ASYNC_RESTORE_CACHE_KEY_PREFIX,
+    CASE_CLOSURE_CACHE_KEY_PREFIX,
+    RESTORE_CACHE_KEY_PREFIX,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -101,3 +105,25 @@ class RestorePayloadPathCache(_RestoreCache):
 class AsyncRestoreTaskIdCache(_RestoreCache):
     timeout = 24 * 60 * 60
     prefix = ASYNC_RESTORE_CACHE_KEY_PREFIX
+
+
+class CaseClosureSnapshotCache(_CacheAccessor):
+    """Livequery case graph snapshot for a user and set of owner ids"""
+    timeout = 3 * 24 * 60 * 60
+    prefix = CASE_CLOSURE_CACHE_KEY_PREFIX
+
+    def __init__(self, domain, user_id, owner_ids):
+        self.cache_key = self._make_cache_key(domain, user_id, owner_ids)
+        self.debug_info = (self.__class__.__name__, domain, user_id)
+
+    @classmethod
+    def _make_cache_key(cls, domain, user_id, owner_ids):
+        hashable_key = ','.join([str(part) for part in [
+            domain,
+            cls.prefix,
+            user_id,
+            ' '.join(sorted(owner_ids)),
+            _get_domain_freshness_token(domain),
+            _get_user_freshness_token(domain, user_id),
+        ]])
+        return hashlib.md5(hashable_key.encode('utf-8')).hexdigest()
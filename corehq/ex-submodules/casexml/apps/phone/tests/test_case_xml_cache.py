@@ -0,0 +1,76 @@
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.data_providers.case import xml_cache
+from casexml.apps.phone.data_providers.case.xml_cache import (
+    get_xml_for_updates,
+)
+
+from corehq.util.test_utils import flag_enabled
+
+DOMAIN = 'xml-cache-test'
+
+
+class FakeCache:
+
+    def __init__(self):
+        self.data = {}
+
+    def get_many(self, keys):
+        return {key: self.data[key] for key in keys if key in self.data}
+
+    def set_many(self, data, timeout=None):
+        self.data.update(data)
+
+
+def _update(case_id, modified_on):
+    case = Mock(case_id=case_id, server_modified_on=modified_on)
+    return Mock(case=case, required_updates=['create', 'update'])
+
+
+@flag_enabled('RESTORE_CASE_XML_CACHE')
+class CaseXMLCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = FakeCache()
+        self.rendered = []
+        restore_state = Mock(domain=DOMAIN, version='2.0')
+        restore_state.get_safe_loadtest_factor.return_value = 1
+        self.restore_state = restore_state
+        for p in [
+            patch.object(xml_cache, 'get_redis_default_cache', return_value=self.cache),
+            patch.object(xml_cache, 'get_xml_for_response', self._render),
+        ]:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _render(self, update, restore_state, total_cases):
+        self.rendered.append(update.case.case_id)
+        return [b'<case id="%s">' % update.case.case_id.encode(), b'</case>']
+
+    def _get_xml(self, updates):
+        return get_xml_for_updates(updates, self.restore_state, len(updates))
+
+    def test_cached_fragments_reused(self):
+        now = datetime.utcnow()
+        updates = [_update('a', now), _update('b', now)]
+        first = self._get_xml(updates)
+        second = self._get_xml(updates)
+        self.assertEqual(first, [b'<case id="a"></case>', b'<case id="b"></case>'])
+        self.assertEqual(second, first)
+        self.assertEqual(self.rendered, ['a', 'b'])
+
+    def test_modified_case_rendered_again(self):
+        self._get_xml([_update('a', datetime(2020, 1, 1))])
+        self._get_xml([_update('a', datetime(2020, 1, 2))])
+        self.assertEqual(self.rendered, ['a', 'a'])
+
+    def test_loadtest_bypasses_cache(self):
+        self.restore_state.get_safe_loadtest_factor.return_value = 2
+        updates = [_update('a', datetime.utcnow())]
+        self._get_xml(updates)
+        self._get_xml(updates)
+        self.assertEqual(self.rendered, ['a', 'a'])
+        self.assertEqual(self.cache.data, {})
@@ -0,0 +1,70 @@
+import doctest
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from casexml.apps.phone import checksum
+from casexml.apps.phone.checksum import EMPTY_HASH, CaseStateHash, Checksum
+from casexml.apps.phone.models import SimplifiedSyncLog
+
+
+def test_doctests():
+    results = doctest.testmod(checksum)
+    assert results.failed == 0
+
+
+class ChecksumTest(SimpleTestCase):
+
+    def test_update_matches_add(self):
+        ids = ['case{}'.format(i) for i in range(101)]
+        added = Checksum()
+        for case_id in ids:
+            added.add(case_id)
+        self.assertEqual(Checksum(ids).hexdigest(), added.hexdigest())
+        self.assertEqual(Checksum(ids).count, 101)
+
+    def test_remove_all(self):
+        checksum = Checksum(['a', 'b'])
+        checksum.remove('a')
+        checksum.remove('b')
+        self.assertEqual(checksum.hexdigest(), EMPTY_HASH)
+
+    def test_state_round_trip(self):
+        checksum = Checksum(['a', 'b', 'c'])
+        restored = Checksum.from_state(checksum.state)
+        self.assertEqual(restored.count, 3)
+        self.assertEqual(restored.hexdigest(), checksum.hexdigest())
+
+
+class SyncLogChecksumTest(SimpleTestCase):
+
+    def test_incremental_update(self):
+        log = SimplifiedSyncLog(case_ids_on_phone={'a', 'b', 'c'})
+        before = set(log.case_ids_on_phone)
+        log.case_ids_on_phone.remove('a')
+        log.case_ids_on_phone.add('d')
+        log._update_case_ids_checksum(before)
+        self.assertIsNotNone(log.case_ids_checksum)
+        self.assertEqual(log.get_state_hash(), CaseStateHash(Checksum(['b', 'c', 'd']).hexdigest()))
+
+    def test_stale_checksum_is_ignored(self):
+        log = SimplifiedSyncLog(case_ids_on_phone={'a', 'b'})
+        log.case_ids_checksum = Checksum(['a']).state
+        self.assertEqual(log.get_state_hash(), CaseStateHash(Checksum(['a', 'b']).hexdigest()))
+
+    def test_replaced_case_ids_with_same_count(self):
+        log = SimplifiedSyncLog(case_ids_on_phone={'a', 'b'})
+        log._update_case_ids_checksum(set())
+        log = SimplifiedSyncLog.wrap(log.to_json())
+        log.case_ids_on_phone = {'a', 'c'}
+        self.assertEqual(log.get_state_hash(), CaseStateHash(Checksum(['a', 'c']).hexdigest()))
+
+    def test_set_case_ids_on_phone(self):
+        log = SimplifiedSyncLog()
+        log.set_case_ids_on_phone({'a', 'b'})
+        self.assertEqual(log.case_ids_checksum, Checksum(['a', 'b']).state)
+        expected = CaseStateHash(Checksum(['a', 'b']).hexdigest())
+        log = SimplifiedSyncLog.wrap(log.to_json())
+        with patch.object(Checksum, 'update') as update:
+            self.assertEqual(log.get_state_hash(), expected)
+        update.assert_not_called()
@@ -0,0 +1,64 @@
+import uuid
+
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.footprint import merge_footprint, split_footprint
+from casexml.apps.phone.models import (
+    IndexTree,
+    SimplifiedSyncLog,
+    SyncLogSQL,
+    properly_wrap_sync_log,
+)
+
+
+class FootprintEncodingTest(SimpleTestCase):
+
+    def setUp(self):
+        hex_id = uuid.uuid4().hex
+        dashed_id = str(uuid.uuid4())
+        other_id = 'Not-A-UUID'
+        self.sync_log = SimplifiedSyncLog(
+            _id=uuid.uuid4().hex,
+            domain='footprint-test',
+            case_ids_on_phone={hex_id, dashed_id, other_id},
+            dependent_case_ids_on_phone={other_id},
+            closed_cases={dashed_id},
+            index_tree=IndexTree(indices={hex_id: {'parent': other_id}}),
+            extension_index_tree=IndexTree(indices={dashed_id: {'host': hex_id, 'other': other_id}}),
+        )
+
+    def assert_footprint_equal(self, actual, expected):
+        self.assertEqual(actual.case_ids_on_phone, expected.case_ids_on_phone)
+        self.assertEqual(actual.dependent_case_ids_on_phone, expected.dependent_case_ids_on_phone)
+        self.assertEqual(actual.closed_cases, expected.closed_cases)
+        self.assertEqual(actual.index_tree.indices, expected.index_tree.indices)
+        self.assertEqual(actual.extension_index_tree.indices, expected.extension_index_tree.indices)
+
+    def test_round_trip(self):
+        doc, footprint = split_footprint(self.sync_log.to_json())
+        self.assertNotIn('case_ids_on_phone', doc)
+        self.assertNotIn('index_tree', doc)
+        self.assertEqual(doc['domain'], 'footprint-test')
+        loaded = properly_wrap_sync_log(merge_footprint(doc, footprint))
+        self.assert_footprint_equal(loaded, self.sync_log)
+
+    def test_empty_footprint(self):
+        sync_log = SimplifiedSyncLog(_id=uuid.uuid4().hex)
+        doc, footprint = split_footprint(sync_log.to_json())
+        self.assert_footprint_equal(properly_wrap_sync_log(merge_footprint(doc, footprint)), sync_log)
+
+    def test_none_case_ids_are_skipped(self):
+        hex_id = self.sync_log.index_tree.indices.copy().popitem()[0]
+        self.sync_log.index_tree.indices[hex_id]['unknown'] = None
+        doc, footprint = split_footprint(self.sync_log.to_json())
+        loaded = properly_wrap_sync_log(merge_footprint(doc, footprint))
+        self.assertNotIn('unknown', loaded.index_tree.indices[hex_id])
+        del self.sync_log.index_tree.indices[hex_id]['unknown']
+        self.assert_footprint_equal(loaded, self.sync_log)
+
+    def test_synclog_sql_doc(self):
+        for compact in [True, False]:
+            synclog = SyncLogSQL()
+            synclog.set_doc(self.sync_log.to_json(), compact=compact)
+            self.assertEqual(synclog.footprint is not None, compact)
+            self.assert_footprint_equal(properly_wrap_sync_log(synclog.get_doc()), self.sync_log)
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.data_providers.case.closure import (
+    CaseGraph,
+    ClosureSnapshot,
+    refresh_snapshot,
+)
+from casexml.apps.phone.data_providers.case.livequery import (
+    get_live_case_ids_and_indices,
+)
+
+from corehq.form_processor.models import CommCareCase, CommCareCaseIndex
+from corehq.util.timer import TimingContext
+
+DOMAIN = 'closure-test'
+CHILD = CommCareCaseIndex.CHILD
+EXTENSION = CommCareCaseIndex.EXTENSION
+
+
+class FakeCaseDB:
+    """In-memory implementation of the case queries used by livequery"""
+
+    def __init__(self):
+        self.cases = {}  # case_id -> [closed, deleted, server_modified_on]
+        self.indices = {}  # (case_id, identifier) -> (referenced_id, relationship_id)
+        self.queries = 0
+
+    def add_case(self, case_id, closed=False, modified_on=None):
+        self.cases[case_id] = [closed, False, modified_on or datetime.utcnow()]
+
+    def touch(self, case_id, **kw):
+        for i, attr in enumerate(['closed', 'deleted']):
+            if attr in kw:
+                self.cases[case_id][i] = kw[attr]
+        self.cases[case_id][2] = datetime.utcnow()
+
+    def add_index(self, case_id, referenced_id, relationship_id, identifier='parent'):
+        self.indices[(case_id, identifier)] = (referenced_id, relationship_id)
+        self.touch(case_id)
+
+    def get_related_indices(self, domain, case_ids, exclude_indices):
+        self.queries += 1
+        exclude_indices = set(exclude_indices)
+        result = []
+        for (case_id, identifier), (ref_id, relationship_id) in self.indices.items():
+            if '{} {}'.format(case_id, identifier) in exclude_indices:
+                continue
+            closed, deleted, _ = self.cases[case_id]
+            if case_id in case_ids or (
+                    ref_id in case_ids and relationship_id == EXTENSION and not closed and not deleted):
+                result.append(CommCareCaseIndex(
+                    domain=domain,
+                    case_id=case_id,
+                    identifier=identifier,
+                    referenced_type='',
+                    referenced_id=ref_id,
+                    relationship_id=relationship_id,
+                ))
+        return result
+
+    def get_closed_and_deleted_ids(self, domain, case_ids):
+        self.queries += 1
+        return [
+            (case_id, self.cases[case_id][0], self.cases[case_id][1])
+            for case_id in case_ids
+            if case_id in self.cases and (self.cases[case_id][0] or self.cases[case_id][1])
+        ]
+
+    def get_last_modified_dates(self, domain, case_ids):
+        self.queries += 1
+        return {case_id: self.cases[case_id][2] for case_id in case_ids if case_id in self.cases}
+
+    def patch(self):
+        patches = [
+            patch.object(CommCareCaseIndex.objects, 'get_related_indices', self.get_related_indices),
+            patch.object(CommCareCase.objects, 'get_closed_and_deleted_ids', self.get_closed_and_deleted_ids),
+            patch.object(CommCareCase.objects, 'get_last_modified_dates', self.get_last_modified_dates),
+        ]
+        for p in patches:
+            p.start()
+        return patches
+
+
+class TestIncrementalClosure(SimpleTestCase):
+
+    def setUp(self):
+        self.db = FakeCaseDB()
+        for p in self.db.patch():
+            self.addCleanup(p.stop)
+        past = datetime.utcnow() - timedelta(days=1)
+        # a <--ext-- b <--ext-- c(owned) <--chi-- d(owned) ; e(closed) --ext--> a
+        for case_id in 'abcd':
+            self.db.add_case(case_id, modified_on=past)
+        self.db.add_case('e', closed=True, modified_on=past)
+        for sub, ref, rel in [('b', 'a', EXTENSION), ('c', 'b', EXTENSION),
+                              ('d', 'c', CHILD), ('e', 'a', EXTENSION)]:
+            self.db.indices[(sub, 'parent')] = (ref, rel)
+        self.owned_ids = ['c', 'd']
+
+    def _get_live_ids(self, case_graph):
+        live_ids, indices = get_live_case_ids_and_indices(
+            DOMAIN, self.owned_ids, TimingContext(), case_graph)
+        return live_ids
+
+    def _get_snapshot(self):
+        graph = CaseGraph(DOMAIN)
+        graph.snapshot.date -= timedelta(hours=1)  # outside clock skew allowance
+        self._get_live_ids(graph)
+        return graph.snapshot
+
+    def _assert_incremental_matches_full(self, snapshot):
+        refresh_snapshot(DOMAIN, snapshot, TimingContext())
+        self.db.queries = 0
+        incremental = self._get_live_ids(CaseGraph(DOMAIN, snapshot))
+        incremental_queries = self.db.queries
+        full = self._get_live_ids(CaseGraph(DOMAIN))
+        self.assertEqual(incremental, full)
+        return incremental, incremental_queries
+
+    def test_unchanged_graph_served_from_snapshot(self):
+        snapshot = ClosureSnapshot.wrap(self._get_snapshot().to_json())
+        live_ids, queries = self._assert_incremental_matches_full(snapshot)
+        self.assertEqual(live_ids, {'a', 'b', 'c', 'd'})
+        self.assertEqual(queries, 0)
+
+    def test_closed_case(self):
+        snapshot = self._get_snapshot()
+        self.db.touch('d', closed=True)
+        self.owned_ids = ['c']
+        live_ids, queries = self._assert_incremental_matches_full(snapshot)
+        self.assertEqual(live_ids, {'a', 'b', 'c'})
+
+    def test_new_extension_of_known_case(self):
+        snapshot = self._get_snapshot()
+        self.db.add_case('f')
+        self.db.add_index('f', 'c', EXTENSION)
+        live_ids, queries = self._assert_incremental_matches_full(snapshot)
+        self.assertEqual(live_ids, {'a', 'b', 'c', 'd', 'f'})
+
+    def test_reopened_extension(self):
+        snapshot = self._get_snapshot()
+        self.db.touch('e', closed=False)
+        self.owned_ids = ['c', 'd', 'e']
+        live_ids, queries = self._assert_incremental_matches_full(snapshot)
+        self.assertEqual(live_ids, {'a', 'b', 'c', 'd', 'e'})
+
+    def test_removed_index(self):
+        snapshot = self._get_snapshot()
+        del self.db.indices[('c', 'parent')]
+        self.db.touch('c')
+        live_ids, queries = self._assert_incremental_matches_full(snapshot)
+        self.assertEqual(live_ids, {'c', 'd'})
+
+    def test_deleted_case(self):
+        snapshot = self._get_snapshot()
+        self.db.touch('b', deleted=True)
+        self._assert_incremental_matches_full(snapshot)
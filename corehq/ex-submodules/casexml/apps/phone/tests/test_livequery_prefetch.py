@@ -0,0 +1,52 @@
+from threading import Event, get_ident
+
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.data_providers.case.livequery import iter_prefetched, roundrobin
+
+
+class IterPrefetchedTest(SimpleTestCase):
+
+    def test_results_in_order(self):
+        results = list(iter_prefetched(lambda x: x * 2, range(20), depth=3))
+        self.assertEqual(results, [(x, x * 2) for x in range(20)])
+
+    def test_fetch_runs_in_worker_threads(self):
+        main_thread = get_ident()
+        results = list(iter_prefetched(lambda x: get_ident(), range(5), depth=2))
+        self.assertNotIn(main_thread, {thread for x, thread in results})
+
+    def test_bounded_lookahead(self):
+        fetched = []
+        gate = Event()
+
+        def fetch(item):
+            fetched.append(item)
+            if item > 0:
+                gate.wait(5)
+            return item
+
+        batches = iter_prefetched(fetch, range(100), depth=2)
+        self.assertEqual(next(batches), (0, 0))
+        self.assertLessEqual(len(fetched), 3)
+        gate.set()
+        self.assertEqual([item for item, result in batches], list(range(1, 100)))
+
+    def test_exception_is_raised_in_consumer(self):
+        def fetch(item):
+            if item == 3:
+                raise ValueError(item)
+            return item
+
+        batches = iter_prefetched(fetch, range(10), depth=2)
+        with self.assertRaises(ValueError):
+            list(batches)
+
+
+class RoundRobinTest(SimpleTestCase):
+
+    def test_roundrobin(self):
+        self.assertEqual(''.join(roundrobin('ABC', 'D', 'EF')), 'ADEBFC')
+
+    def test_roundrobin_empty(self):
+        self.assertEqual(list(roundrobin()), [])
@@ -1,3 +1,5 @@
+import os
+
 from django.test import TestCase
 from django.test.testcases import SimpleTestCase
 from corehq.apps.users.dbaccessors import delete_all_users
@@ -73,3 +75,17 @@ class TestRestoreContent(SimpleTestCase):
             response.append(body.encode('utf-8'))
             with response.get_fileobj() as fileobj:
                 self.assertEqual(expected, fileobj.read().decode('utf-8'))
+
+    def test_seek_and_partial_reads(self):
+        user = 'user1'
+        body = ''.join('<elem>data%s</elem>' % i for i in range(1000))
+        expected = self._expected(user, body, items=1001).encode('utf-8')
+        with RestoreContent(user, True) as response:
+            for i in range(1000):
+                response.append(('<elem>data%s</elem>' % i).encode('utf-8'))
+            with response.get_fileobj() as fileobj:
+                self.assertEqual(fileobj.seek(0, os.SEEK_END), len(expected))
+                fileobj.seek(0)
+                self.assertEqual(b''.join(iter(lambda: fileobj.read(100), b'')), expected)
+                fileobj.seek(50)
+                self.assertEqual(fileobj.read(200), expected[50:250])
@@ -18,6 +18,7 @@ def get_writer(format, use_formatted_cells=False):
             Format.JSON: writers.JsonExportWriter,
             Format.XLS: writers.Excel2003ExportWriter,
             Format.UNZIPPED_CSV: writers.UnzippedCsvExportWriter,
+            Format.PARQUET: writers.ParquetExportWriter,
             Format.PYTHON_DICT: writers.PythonDictWriter,
         }[format]()
     except KeyError:
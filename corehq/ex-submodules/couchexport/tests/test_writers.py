@@ -1,10 +1,13 @@
 from codecs import BOM_UTF8
 from contextlib import closing
+import datetime
 import io
 import os
+import zipfile
 
 from django.test import SimpleTestCase
 from lxml import html, etree
+import pyarrow.parquet as pq
 from unittest.mock import patch, Mock
 
 from couchexport.export import export_from_tables
@@ -12,6 +15,8 @@ from couchexport.models import Format
 from couchexport.writers import (
     MAX_XLS_COLUMNS,
     CsvFileWriter,
+    ParquetExportWriter,
+    ParquetFileWriter,
     PythonDictWriter,
     XlsLengthException,
     ZippedExportWriter,
@@ -107,6 +112,81 @@ class HtmlExportWriterTests(SimpleTestCase):
                           ['<td>spam</td>', '<td>spam</td>', '<td/>', '<td>spam</td>']])
 
 
+class ParquetExportWriterTests(SimpleTestCase):
+
+    def test_typed_columns(self):
+        headers = ['name', 'age', 'weight', 'dob', 'received']
+        rows = [
+            ['Alice', '34', '61.5', '1990-02-01', '2015-07-22T14:16:49.584880Z'],
+            [None, '---', '', '', '2015-07-22 14:16:49'],
+            [42, 'old', 70, datetime.date(1980, 1, 1), datetime.datetime(2020, 1, 1, 12)],
+        ]
+        writer = ParquetExportWriter()
+        with closing(io.BytesIO()) as file_:
+            writer.open(
+                [('people', [headers])],
+                file_,
+                table_titles={'people': 'People'},
+                archive_basepath='export',
+                table_datatypes={'people': ['string', 'integer', 'decimal', 'date', 'datetime']},
+            )
+            writer.write([('people', rows)])
+            writer.close()
+            with zipfile.ZipFile(file_) as archive:
+                self.assertEqual(archive.namelist(), ['export/People.parquet'])
+                table = pq.read_table(io.BytesIO(archive.read('export/People.parquet')))
+
+        self.assertEqual(
+            [str(field.type) for field in table.schema],
+            ['string', 'int64', 'double', 'date32[day]', 'timestamp[us]'],
+        )
+        self.assertEqual(table.to_pylist(), [
+            {
+                'name': 'Alice',
+                'age': 34,
+                'weight': 61.5,
+                'dob': datetime.date(1990, 2, 1),
+                'received': datetime.datetime(2015, 7, 22, 14, 16, 49, 584880),
+            },
+            {
+                'name': None,
+                'age': None,
+                'weight': None,
+                'dob': None,
+                'received': datetime.datetime(2015, 7, 22, 14, 16, 49),
+            },
+            {
+                'name': '42',
+                'age': None,
+                'weight': 70.0,
+                'dob': datetime.date(1980, 1, 1),
+                'received': datetime.datetime(2020, 1, 1, 12),
+            },
+        ])
+
+    def test_row_groups(self):
+        writer = ParquetFileWriter(['integer'], row_group_size=2)
+        writer.open('numbers')
+        writer.write_row(['number'])
+        for number in range(5):
+            writer.write_row([number])
+        writer.finish()
+        parquet_file = pq.ParquetFile(writer.get_file())
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        self.assertEqual(parquet_file.read().column('number').to_pylist(), [0, 1, 2, 3, 4])
+        writer.close()
+
+    def test_untyped_columns_are_strings(self):
+        writer = ParquetFileWriter()
+        writer.open('no types')
+        writer.write_row(['a', b'b'])
+        writer.write_row([1, None])
+        writer.finish()
+        table = pq.read_table(writer.get_file())
+        self.assertEqual(table.to_pylist(), [{'a': '1', 'b': None}])
+        writer.close()
+
+
 class Excel2007ExportWriterTests(SimpleTestCase):
 
     def test_bytestrings(self):
@@ -1,5 +1,6 @@
 import io
 from codecs import BOM_UTF8
+import datetime
 import os
 import re
 import tempfile
@@ -7,9 +8,11 @@ import zipfile
 import csv
 import json
 from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
 import openpyxl
 import math
 
+from dateutil.parser import isoparse
 from django.template.loader import render_to_string, get_template
 from django.utils.functional import Promise
 import xlwt
@@ -18,9 +21,17 @@ from couchexport.models import Format
 from openpyxl.styles import numbers
 from openpyxl.cell import WriteOnlyCell
 
+from corehq.apps.userreports.datatypes import (
+    DATA_TYPE_DATE,
+    DATA_TYPE_DATETIME,
+    DATA_TYPE_DECIMAL,
+    DATA_TYPE_INTEGER,
+    DATA_TYPE_SMALL_INTEGER,
+)
 from couchexport.util import get_excel_format_value, get_legacy_excel_safe_value
 
 MAX_XLS_COLUMNS = 256
+PARQUET_ROW_GROUP_SIZE = 50000
 
 
 class XlsLengthException(Exception):
@@ -157,21 +168,176 @@ class HtmlFileWriter(PartialHtmlFileWriter):
         self._write_from_template({"section": "doc_end"})
 
 
+class ParquetFileWriter(ExportFileWriter):
+    """
+    Writes a table to a Parquet file. The first row written is the header
+    row. The values of each column are converted to the column's data type
+    (see corehq.apps.userreports.datatypes), or written as nulls if they
+    can't be converted. Rows are written in row groups of
+    ``row_group_size`` rows, so a table is never held in memory.
+    """
+
+    def __init__(self, datatypes=None, row_group_size=PARQUET_ROW_GROUP_SIZE):
+        super(ParquetFileWriter, self).__init__()
+        self.datatypes = datatypes or []
+        self.row_group_size = row_group_size
+        self._schema = None
+        self._converters = None
+        self._parquet_writer = None
+        self._columns = None
+        self._row_count = 0
+
+    def write_row(self, row):
+        row = list(row)
+        if self._schema is None:
+            self._write_headers(row)
+            return
+        for index, column in enumerate(self._columns):
+            column.append(row[index] if index < len(row) else None)
+        self._row_count += 1
+        if self._row_count >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_headers(self, headers):
+        # pyarrow is only needed by Parquet exports
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        fields = []
+        self._converters = []
+        for index, header in enumerate(headers):
+            if isinstance(header, bytes):
+                header = header.decode('utf-8')
+            datatype = self.datatypes[index] if index < len(self.datatypes) else None
+            arrow_type, converter = _get_parquet_type(datatype)
+            fields.append(pa.field(str(header), arrow_type))
+            self._converters.append(converter)
+        self._schema = pa.schema(fields)
+        self._columns = [[] for field in fields]
+        self._parquet_writer = pq.ParquetWriter(self._file, self._schema)
+
+    def _write_row_group(self):
+        import pyarrow as pa
+
+        arrays = [
+            pa.array([convert(value) for value in values], type=field.type)
+            for values, field, convert in zip(self._columns, self._schema, self._converters)
+        ]
+        self._parquet_writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self._columns = [[] for column in self._columns]
+        self._row_count = 0
+
+    def _end_file(self):
+        if self._parquet_writer is not None:
+            if self._row_count:
+                self._write_row_group()
+            self._parquet_writer.close()
+
+
+def _get_parquet_type(datatype):
+    """
+    Return the Arrow type of Parquet columns of the given data type, and a
+    function converting values to that type
+    """
+    import pyarrow as pa
+
+    if datatype in (DATA_TYPE_INTEGER, DATA_TYPE_SMALL_INTEGER):
+        return pa.int64(), _to_parquet_integer
+    if datatype == DATA_TYPE_DECIMAL:
+        return pa.float64(), _to_parquet_decimal
+    if datatype == DATA_TYPE_DATE:
+        return pa.date32(), _to_parquet_date
+    if datatype == DATA_TYPE_DATETIME:
+        return pa.timestamp('us'), _to_parquet_datetime
+    return pa.string(), _to_parquet_string
+
+
+def _to_parquet_string(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def _to_decimal(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        value = value.strip()
+    try:
+        number = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return number if number.is_finite() else None
+
+
+def _to_parquet_integer(value):
+    number = _to_decimal(value)
+    if number is None or number != number.to_integral_value():
+        return None
+    number = int(number)
+    if not -2 ** 63 <= number < 2 ** 63:
+        return None
+    return number
+
+
+def _to_parquet_decimal(value):
+    number = _to_decimal(value)
+    return None if number is None else float(number)
+
+
+def _parse_datetime(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        try:
+            return isoparse(value.strip())
+        except (ValueError, OverflowError):
+            return None
+    if isinstance(value, datetime.date):
+        return value
+    return None
+
+
+def _to_parquet_date(value):
+    value = _parse_datetime(value)
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def _to_parquet_datetime(value):
+    value = _parse_datetime(value)
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return None
+
+
 class ExportWriter(object):
     max_table_name_size = 500
     target_app = 'Excel'  # Where does this writer export to? Export button to say "Export to Excel"
 
-    def open(self, header_table, file, max_column_size=2000, table_titles=None, archive_basepath=''):
+    def open(self, header_table, file, max_column_size=2000, table_titles=None, archive_basepath='',
+             table_datatypes=None):
         """
         Create any initial files, headings, etc necessary.
         :param header_table: tuple of one of the following formats
             tuple(sheet_name, [['col1header', 'col2header', ....]])
             tuple(sheet_name, [FormattedRow])
+        :param table_datatypes: dict of sheet_name to the data type of each
+            column (see corehq.apps.userreports.datatypes). Only used by
+            writers of formats with typed columns.
         """
         table_titles = table_titles or {}
 
         self._isopen = True
         self.max_column_size = max_column_size
+        self.table_datatypes = table_datatypes or {}
         self._current_primary_id = 0
         self.file = file
         self.archive_basepath = archive_basepath
@@ -187,7 +353,7 @@ class ExportWriter(object):
                 table_title=table_titles.get(table_index)
             )
 
-    def add_table(self, table_index, headers, table_title=None):
+    def add_table(self, table_index, headers, table_title=None, datatypes=None):
         def _clean_name(name):
             if isinstance(name, bytes):
                 name = name.decode('utf8')
@@ -207,6 +373,8 @@ class ExportWriter(object):
             except AttributeError:
                 headers = [g.next_unique(header) for header in headers]
 
+        if datatypes is not None:
+            self.table_datatypes[table_index] = datatypes
         self._init_table(table_index, table_title_truncated)
         self.write_row(table_index, headers)
 
@@ -280,11 +448,14 @@ class OnDiskExportWriter(ExportWriter):
         self.table_names = OrderedDict()
 
     def _init_table(self, table_index, table_title):
-        writer = self.writer_class()
+        writer = self._get_table_writer(table_index)
         self.tables[table_index] = writer
         writer.open(table_title)
         self.table_names[table_index] = table_title
 
+    def _get_table_writer(self, table_index):
+        return self.writer_class()
+
     def _write_row(self, sheet_index, row):
 
         def _transform(val):
@@ -357,6 +528,23 @@ class UnzippedCsvExportWriter(OnDiskExportWriter):
         self.file.seek(0)
 
 
+class ParquetExportWriter(ZippedExportWriter):
+    """
+    Writer that creates a zip file containing a Parquet file for each table.
+    Columns are typed with the table's ``table_datatypes``.
+    """
+    format = Format.PARQUET
+    writer_class = ParquetFileWriter
+    table_file_extension = ".parquet"
+
+    def _get_table_writer(self, table_index):
+        return self.writer_class(self.table_datatypes.get(table_index))
+
+    def _write_row(self, sheet_index, row):
+        # unlike the CSV writers, values are not converted to strings
+        self.tables[sheet_index].write_row(row)
+
+
 class Excel2007ExportWriter(ExportWriter):
     format = Format.XLS_2007
     max_table_name_size = 31
@@ -167,10 +167,11 @@ class BulkElasticProcessor(ElasticProcessor, BulkPillowProcessor):
 
         try:
             with self._datadog_timing('bulk_load'):
-                _, errors = self.adapter.bulk(
-                    es_actions,
-                    raise_errors=False,
-                )
+                if settings.ES_ADAPTIVE_BULK_INDEXING:
+                    bulk = self.adapter.adaptive_bulk
+                else:
+                    bulk = self.adapter.bulk
+                _, errors = bulk(es_actions, raise_errors=False)
         except Exception as e:
             pillow_logging.exception("Elastic bulk error: %s", e)
             error_changes.extend([
@@ -13,7 +13,7 @@ from casexml.apps.case.xform import get_case_updates
 from corehq.form_processor.backends.sql.update_strategy import SqlCaseUpdateStrategy
 from corehq.form_processor.backends.sql.dbaccessors import LedgerAccessorSQL
 from corehq.form_processor.change_publishers import (
-    publish_form_saved, publish_case_saved, publish_ledger_v2_saved)
+    publish_case_saved, publish_form_changes_saved)
 from corehq.form_processor.exceptions import CaseNotFound, KafkaPublishingError
 from corehq.form_processor.interfaces.processor import CaseUpdateMetadata
 from corehq.form_processor.models import (
@@ -142,14 +142,8 @@ class FormProcessorSQL(object):
 
     @staticmethod
     def publish_changes_to_kafka(processed_forms, cases, stock_result):
-        publish_form_saved(processed_forms.submitted)
-        cases = cases or []
-        for case in cases:
-            publish_case_saved(case, send_post_save_signal=False)
-
-        if stock_result:
-            for ledger in stock_result.models_to_save:
-                publish_ledger_v2_saved(ledger)
+        ledger_values = stock_result.models_to_save if stock_result else []
+        publish_form_changes_saved(processed_forms.submitted, cases or [], ledger_values)
 
     @classmethod
     def apply_deprecation(cls, existing_xform, new_xform):
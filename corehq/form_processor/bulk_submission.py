@@ -0,0 +1,189 @@
+"""
+Processing of many form submissions received in a single request.
+
+Forms are grouped by the cases they update: forms that share a case
+(directly, or through other forms of the request) are in the same group and
+are processed in the order they were submitted. Each group is processed
+in batches of at most ``MAX_FORMS_PER_LOCK`` forms, each with one case
+cache that holds the locks of all cases of the batch, so that the cases
+are loaded and locked once per batch rather than once per form. Batches
+are small so that the locks do not expire while they are held. Forms are
+still saved one at a time so that each form gets its own result, exactly
+as if it had been submitted on its own.
+"""
+import logging
+
+from casexml.apps.case.exceptions import IllegalCaseId
+from casexml.apps.case.xform import get_case_updates
+from couchforms.openrosa_response import OpenRosaResponse, ResponseNature
+from dimagi.utils.chunked import chunked
+
+from corehq.form_processor.exceptions import SubmissionRateLimited, XFormLockError
+from corehq.form_processor.interfaces.processor import FormProcessorInterface
+from corehq.form_processor.submission_post import SubmissionPost
+from corehq.form_processor.utils import convert_xform_to_json
+from corehq.util.metrics import metrics_counter, metrics_histogram
+
+BULK_SUBMISSION_MAX_FORMS = 1000
+# forms processed while holding the same case locks, which expire after
+# two minutes and are not renewed
+MAX_FORMS_PER_LOCK = 20
+
+# submission types after which the cases in the case cache reflect what was saved
+CLEAN_SUBMISSION_TYPES = ('normal', 'duplicate', 'ignored')
+
+
+class BulkSubmissionPost(object):
+    """Process a list of form instances
+
+    :param instances: List of form XML (bytes), in submission order.
+    :param is_rate_limited: Optional function called before each form is
+    processed. Once it returns true, the remaining forms are rejected with
+    ``SubmissionRateLimited``.
+    :param submission_kwargs: Passed to ``SubmissionPost`` for each form.
+    """
+
+    def __init__(self, instances, domain, is_rate_limited=None, **submission_kwargs):
+        assert len(instances) <= BULK_SUBMISSION_MAX_FORMS, len(instances)
+        self.instances = instances
+        self.domain = domain
+        self.is_rate_limited = is_rate_limited
+        self.rate_limited = False
+        self.submission_kwargs = submission_kwargs
+        self.interface = FormProcessorInterface(domain)
+
+    def run(self):
+        """
+        :returns: list of ``FormProcessingResult`` or exceptions, one for
+        each instance, in the order of the instances
+        """
+        results = [None] * len(self.instances)
+        case_ids_by_index = [_get_case_ids(instance) for instance in self.instances]
+        groups = group_by_case_ids(case_ids_by_index)
+        for group in groups:
+            for batch in chunked(group, MAX_FORMS_PER_LOCK, list):
+                case_ids = set().union(*(case_ids_by_index[index] for index in batch))
+                for index, result in self._process_batch(batch, case_ids):
+                    results[index] = result
+        metrics_histogram(
+            'commcare.bulk_submission.forms', len(self.instances),
+            bucket_tag='forms', buckets=(1, 10, 100, 1000), bucket_unit='',
+            tags={'domain': self.domain},
+        )
+        metrics_counter('commcare.bulk_submission.groups', len(groups), tags={'domain': self.domain})
+        return results
+
+    def _process_batch(self, batch, case_ids):
+        case_db_cache = self.interface.casedb_cache(
+            domain=self.domain, lock=True, deleted_ok=True, load_src="bulk_form_submission",
+        )
+        with case_db_cache as case_db:
+            try:
+                for case_id in sorted(case_ids):
+                    # acquire the case locks for the whole batch
+                    try:
+                        case_db.get(case_id)
+                    except IllegalCaseId:
+                        # reported when the form is processed
+                        pass
+            except Exception as e:
+                logging.exception('Unable to load cases for bulk submission')
+                for index in batch:
+                    yield index, e
+                return
+
+            for index in batch:
+                if self._check_rate_limit():
+                    yield index, SubmissionRateLimited()
+                    continue
+                # drop the forms of the batch that were processed before
+                case_db.cached_xforms = []
+                submission_post = SubmissionPost(
+                    instance=self.instances[index],
+                    domain=self.domain,
+                    case_db=case_db,
+                    **self.submission_kwargs
+                )
+                try:
+                    result = submission_post.run()
+                except Exception as e:
+                    yield index, e
+                    result = None
+                else:
+                    yield index, result
+                if result is None or result.submission_type not in CLEAN_SUBMISSION_TYPES:
+                    # discard changes made by a form that was not saved
+                    case_db.cache.clear()
+                    case_db.clear_changed()
+                    case_db.populate(case_ids)
+
+    def _check_rate_limit(self):
+        if not self.rate_limited and self.is_rate_limited is not None:
+            self.rate_limited = bool(self.is_rate_limited())
+        return self.rate_limited
+
+
+def group_by_case_ids(case_ids_by_index):
+    """Group the indexes of a list of case ID sets so that sets sharing
+    a case ID are in the same group
+
+    Groups are ordered by their first index and indexes are in order
+    within each group.
+    """
+    parents = list(range(len(case_ids_by_index)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    first_index_by_case_id = {}
+    for index, case_ids in enumerate(case_ids_by_index):
+        for case_id in case_ids:
+            if case_id in first_index_by_case_id:
+                root, other = find(index), find(first_index_by_case_id[case_id])
+                parents[max(root, other)] = min(root, other)
+            else:
+                first_index_by_case_id[case_id] = index
+
+    groups = {}
+    for index in range(len(case_ids_by_index)):
+        groups.setdefault(find(index), []).append(index)
+    return [groups[root] for root in sorted(groups)]
+
+
+def _get_case_ids(instance):
+    try:
+        form_json = convert_xform_to_json(instance)
+    except Exception:
+        # reported when the form is processed
+        return set()
+    return {update.id for update in get_case_updates(form_json) if update.id}
+
+
+def get_bulk_result_response(result):
+    """Get the OpenRosa response for a form of a bulk submission
+
+    :param result: ``FormProcessingResult`` or the exception raised
+    while processing the form
+    """
+    if isinstance(result, SubmissionRateLimited):
+        return OpenRosaResponse(
+            message="Too many submissions",
+            nature=ResponseNature.SUBMIT_ERROR,
+            status=429,
+        ).response()
+    if isinstance(result, XFormLockError):
+        return OpenRosaResponse(
+            message="Form is locked by another process",
+            nature=ResponseNature.SUBMIT_ERROR,
+            status=423,
+        ).response()
+    if isinstance(result, Exception):
+        return OpenRosaResponse(
+            message="Unexpected error processing form",
+            nature=ResponseNature.SUBMIT_ERROR,
+            status=500,
+        ).response()
+    return result.response
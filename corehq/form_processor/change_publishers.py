@@ -8,6 +8,20 @@ def publish_form_saved(form):
     producer.send_change(topics.FORM_SQL, change_meta_from_sql_form(form))
 
 
+def publish_form_changes_saved(form, cases, ledger_values):
+    """
+    Publish a form along with the cases and ledgers it saved in a single
+    batch. Case post-save signals are not sent.
+    """
+    changes = [(topics.FORM_SQL, change_meta_from_sql_form(form))]
+    changes.extend((topics.CASE_SQL, change_meta_from_sql_case(case)) for case in cases)
+    changes.extend(
+        (topics.LEDGER, change_meta_from_ledger_v2(ledger_value.ledger_reference, ledger_value.domain))
+        for ledger_value in ledger_values
+    )
+    producer.send_changes(changes)
+
+
 def change_meta_from_sql_form(form):
     return ChangeMeta(
         document_id=form.form_id,
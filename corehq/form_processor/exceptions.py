@@ -69,3 +69,7 @@ class XFormLockError(Exception):
 
 class MissingFormXml(Exception):
     pass
+
+
+class SubmissionRateLimited(Exception):
+    """Exception raised when a form of a bulk submission is rate limited"""
@@ -0,0 +1,111 @@
+import uuid
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase
+
+from casexml.apps.case.mock import CaseBlock
+
+from corehq.form_processor.bulk_submission import (
+    BulkSubmissionPost,
+    get_bulk_result_response,
+    group_by_case_ids,
+)
+from corehq.form_processor.exceptions import SubmissionRateLimited
+from corehq.form_processor.models import CommCareCase
+from corehq.form_processor.tests.utils import FormProcessorTestUtils, sharded
+from corehq.form_processor.utils.xform import FormSubmissionBuilder
+
+DOMAIN = 'bulk-submission'
+
+
+class GroupByCaseIdsTest(SimpleTestCase):
+
+    def test_groups_keep_submission_order(self):
+        self.assertEqual(
+            group_by_case_ids([{'a'}, {'b'}, {'c', 'a'}, set(), {'b', 'c'}, {'d'}]),
+            [[0, 1, 2, 4], [3], [5]],
+        )
+
+    def test_transitive_groups(self):
+        self.assertEqual(group_by_case_ids([{'x'}, {'y'}, {'z'}, {'x', 'y', 'z'}]), [[0, 1, 2, 3]])
+
+    def test_no_forms(self):
+        self.assertEqual(group_by_case_ids([]), [])
+
+
+@sharded
+class BulkSubmissionPostTest(TestCase):
+
+    def tearDown(self):
+        FormProcessorTestUtils.delete_all_cases_forms_ledgers(DOMAIN)
+        super().tearDown()
+
+    def _form(self, case_block):
+        return FormSubmissionBuilder(
+            form_id=uuid.uuid4().hex,
+            case_blocks=[case_block],
+        ).as_xml_string()
+
+    def test_forms_processed_in_order(self):
+        case_id, other_case_id = uuid.uuid4().hex, uuid.uuid4().hex
+        instances = [
+            self._form(CaseBlock(case_id, create=True, case_name='first')),
+            self._form(CaseBlock(other_case_id, create=True, case_name='other')),
+            self._form(CaseBlock(case_id, update={'step': '2'})),
+            self._form(CaseBlock(case_id, case_name='last')),
+        ]
+        results = BulkSubmissionPost(instances, domain=DOMAIN).run()
+
+        self.assertEqual([r.submission_type for r in results], ['normal'] * 4)
+        self.assertEqual([get_bulk_result_response(r).status_code for r in results], [201] * 4)
+        case = CommCareCase.objects.get_case(case_id, DOMAIN)
+        self.assertEqual(case.name, 'last')
+        self.assertEqual(case.get_case_property('step'), '2')
+        self.assertEqual(len(case.xform_ids), 3)
+        self.assertEqual(CommCareCase.objects.get_case(other_case_id, DOMAIN).name, 'other')
+
+    def test_group_processed_in_batches(self):
+        case_id = uuid.uuid4().hex
+        instances = [
+            self._form(CaseBlock(case_id, create=True, case_name='first')),
+            self._form(CaseBlock(case_id, update={'step': '2'})),
+            self._form(CaseBlock(case_id, case_name='last')),
+        ]
+        with patch('corehq.form_processor.bulk_submission.MAX_FORMS_PER_LOCK', 2):
+            results = BulkSubmissionPost(instances, domain=DOMAIN).run()
+
+        self.assertEqual([r.submission_type for r in results], ['normal'] * 3)
+        case = CommCareCase.objects.get_case(case_id, DOMAIN)
+        self.assertEqual(case.name, 'last')
+        self.assertEqual(case.get_case_property('step'), '2')
+        self.assertEqual(len(case.xform_ids), 3)
+
+    def test_rate_limited(self):
+        case_id = uuid.uuid4().hex
+        instances = [
+            self._form(CaseBlock(case_id, create=True, case_name='first')),
+            self._form(CaseBlock(case_id, case_name='second')),
+            self._form(CaseBlock(uuid.uuid4().hex, create=True, case_name='other')),
+        ]
+        checks = iter([False, True, False])
+        results = BulkSubmissionPost(instances, domain=DOMAIN, is_rate_limited=lambda: next(checks)).run()
+
+        self.assertEqual(results[0].submission_type, 'normal')
+        self.assertIsInstance(results[1], SubmissionRateLimited)
+        self.assertIsInstance(results[2], SubmissionRateLimited)
+        self.assertEqual(get_bulk_result_response(results[1]).status_code, 429)
+        self.assertEqual(CommCareCase.objects.get_case(case_id, DOMAIN).name, 'first')
+
+    def test_error_does_not_affect_later_forms(self):
+        case_id = uuid.uuid4().hex
+        instances = [
+            self._form(CaseBlock(case_id, create=True, case_name='first')),
+            self._form(CaseBlock(case_id, case_name='invalid', index={'parent': ('person', uuid.uuid4().hex)})),
+            self._form(CaseBlock(case_id, case_name='last')),
+        ]
+        results = BulkSubmissionPost(instances, domain=DOMAIN).run()
+
+        self.assertEqual([r.submission_type for r in results], ['normal', 'error', 'normal'])
+        case = CommCareCase.objects.get_case(case_id, DOMAIN)
+        self.assertEqual(case.name, 'last')
+        self.assertEqual(len(case.xform_ids), 2)
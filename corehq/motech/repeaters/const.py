@@ -15,6 +15,11 @@ MAX_BACKOFF_ATTEMPTS = 6
 # Limit the number of records to forward at a time so that one repeater
 # can't hold up the rest.
 RECORDS_AT_A_TIME = 1000
+# Requests sent concurrently by one repeater. (See delivery.py)
+MAX_CONCURRENT_REQUESTS = settings.REPEATER_MAX_CONCURRENT_REQUESTS
+# How long to wait for the rate limit of an endpoint before leaving the
+# remaining repeat records for the next time the repeater is processed
+RATE_LIMIT_WAIT = timedelta(seconds=15)
 
 RECORD_PENDING_STATE = 'PENDING'
 RECORD_SUCCESS_STATE = 'SUCCESS'
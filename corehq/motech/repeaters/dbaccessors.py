@@ -1,5 +1,8 @@
 import datetime
 
+from django.conf import settings
+
+from dimagi.utils.chunked import chunked
 from dimagi.utils.couch.database import iter_docs
 from dimagi.utils.parsing import json_format_datetime
 
@@ -14,6 +17,12 @@ from .const import (
     RECORD_SUCCESS_STATE,
     RECORD_EMPTY_STATE,
 )
+from .schedule import (
+    get_due_record_count,
+    is_waiting,
+    iter_due_record_ids,
+    unschedule_record_ids,
+)
 
 
 def get_pending_repeat_record_count(domain, repeater_id):
@@ -70,6 +79,9 @@ def get_sql_repeat_record_count(domain, repeater_id=None, state=None):
 def get_overdue_repeat_record_count(overdue_threshold=datetime.timedelta(minutes=10)):
     from .models import RepeatRecord
     overdue_datetime = datetime.datetime.utcnow() - overdue_threshold
+    if settings.USE_REPEAT_RECORD_SCHEDULE:
+        # stale records are removed from the schedule by check_repeaters
+        return get_due_record_count(overdue_datetime)
     results = RepeatRecord.view(
         "repeaters/repeat_records_by_next_check",
         startkey=[None],
@@ -228,6 +240,24 @@ def iterate_repeat_records_for_ids(doc_ids):
     return (RepeatRecord.wrap(doc) for doc in iter_docs(RepeatRecord.get_db(), doc_ids))
 
 
+def iterate_scheduled_repeat_records(partition, due_before):
+    """
+    Yields the waiting repeat records of the partition that are due before
+    ``due_before``, according to the repeat record schedule. Records that
+    were deleted, or processed without updating the schedule, are removed
+    from it.
+    """
+    for chunked_ids in chunked(iter_due_record_ids(partition, due_before), 1000):
+        records = [
+            record for record in iterate_repeat_records_for_ids(chunked_ids)
+            if is_waiting(record)
+        ]
+        stale_ids = set(chunked_ids) - {record._id for record in records}
+        if stale_ids:
+            unschedule_record_ids(stale_ids)
+        yield from records
+
+
 def iterate_repeat_record_ids(due_before, chunk_size=10000):
     """
     Yields repeat record ids only.
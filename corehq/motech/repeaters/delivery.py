@@ -0,0 +1,159 @@
+"""
+Concurrent delivery of repeat records.
+
+``process_repeater`` sends the repeat records of a repeater one at a
+time. For domains with the CONCURRENT_REPEATER_DELIVERY toggle enabled,
+``deliver_concurrently`` sends them from up to MAX_CONCURRENT_REQUESTS
+threads instead:
+
+- Repeat records are grouped by payload. The repeat records of a
+  payload are sent in order by one thread, and the rest of them are not
+  sent after one of them fails.
+- Like ``process_repeater``, no more requests are sent after a request
+  fails, and the repeater backs off (or retries) as usual. The backoff
+  is applied once all of the threads are done, so that it is not
+  cleared by a request that succeeded at the same time.
+- Requests are limited by the rate limits of the repeater's endpoint
+  (its connection settings), which are configured by the
+  "repeater_endpoint:<connection settings ID>" DynamicRateDefinition.
+  The repeat records left when the wait for the rate limit times out
+  are sent the next time the repeater is processed.
+- Each thread reuses its HTTP session for its requests.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from queue import Empty, SimpleQueue
+
+from django.db import connections
+
+from corehq.motech.requests import session_pool
+from corehq.project_limits.rate_limiter import (
+    RateDefinition,
+    RateLimiter,
+    get_dynamic_rate_definition,
+)
+from corehq.util.metrics import (
+    make_buckets_from_timedeltas,
+    metrics_counter,
+    metrics_gauge,
+    metrics_histogram_timer,
+)
+
+from .const import MAX_CONCURRENT_REQUESTS, RATE_LIMIT_WAIT, RECORDS_AT_A_TIME
+from .models import get_payload, send_request
+
+_delivery_buckets = make_buckets_from_timedeltas(
+    timedelta(seconds=1),
+    timedelta(seconds=10),
+    timedelta(minutes=1),
+    timedelta(minutes=10),
+    timedelta(hours=1),
+)
+
+# Unlimited unless a rate is set for the endpoint
+repeater_endpoint_rate_limiter = RateLimiter(
+    feature_key='repeater_endpoint_requests',
+    get_rate_limits=lambda scope: get_dynamic_rate_definition(
+        f'repeater_endpoint:{scope}',
+        default=RateDefinition(),
+    ).get_rate_limits(scope),
+)
+
+
+def deliver_concurrently(repeater, max_workers=MAX_CONCURRENT_REQUESTS):
+    """
+    Send the repeat records of ``repeater`` that are ready, with up to
+    ``max_workers`` requests in flight at a time.
+    """
+    tags = {'domain': repeater.domain}
+    metrics_gauge('commcare.repeaters.delivery.queue_depth',
+                  repeater.repeat_records_ready.count(), tags=tags)
+    repeat_records = list(repeater.repeat_records_ready[:RECORDS_AT_A_TIME])
+    delivery = ConcurrentDelivery(repeater, repeat_records)
+    with metrics_histogram_timer(
+        'commcare.repeaters.delivery.duration',
+        timing_buckets=_delivery_buckets,
+        tags=tags,
+    ):
+        delivery.run(max_workers)
+
+
+class ConcurrentDelivery(object):
+
+    def __init__(self, repeater, repeat_records):
+        self.repeater = repeater
+        self.rate_limit_scope = str(repeater.connection_settings_id)
+        self.tags = {'domain': repeater.domain}
+        self.payloads = SimpleQueue()
+        self.payload_count = 0
+        for payload_records in _group_by_payload(repeat_records):
+            self.payloads.put(payload_records)
+            self.payload_count += 1
+        # set when no more requests should be sent
+        self.stopped = threading.Event()
+
+    def run(self, max_workers):
+        workers = min(max_workers, self.payload_count)
+        if not workers:
+            return
+        with self.repeater.defer_next_attempt_updates():
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='repeater') as executor:
+                futures = [executor.submit(self._work) for __ in range(workers)]
+        for future in futures:
+            future.result()
+
+    def _work(self):
+        try:
+            with session_pool():
+                while not self.stopped.is_set():
+                    try:
+                        payload_records = self.payloads.get_nowait()
+                    except Empty:
+                        return
+                    self._send_payload_records(payload_records)
+        finally:
+            connections.close_all()
+
+    def _send_payload_records(self, payload_records):
+        for repeat_record in payload_records:
+            if self.stopped.is_set():
+                return
+            try:
+                payload = get_payload(self.repeater, repeat_record)
+            except Exception:
+                # The repeat record is cancelled if there is an error
+                # getting the payload. We can safely move to the next one.
+                continue
+            if not self._wait_for_rate_limit():
+                metrics_counter('commcare.repeaters.delivery.rate_limited', tags=self.tags)
+                self.stopped.set()
+                return
+            succeeded = send_request(self.repeater, repeat_record, payload)
+            metrics_counter('commcare.repeaters.delivery.sent', tags={
+                **self.tags,
+                'result': 'success' if succeeded else 'retry',
+            })
+            if not succeeded:
+                # The rest of this payload's repeat records must wait
+                # for this one, and the endpoint may need to back off.
+                self.stopped.set()
+                return
+
+    def _wait_for_rate_limit(self):
+        limiter = repeater_endpoint_rate_limiter
+        if not limiter.wait(self.rate_limit_scope, timeout=RATE_LIMIT_WAIT.total_seconds()):
+            return False
+        limiter.report_usage(self.rate_limit_scope)
+        return True
+
+
+def _group_by_payload(repeat_records):
+    """
+    Return the repeat records of each payload, in order of their first
+    repeat record
+    """
+    records_by_payload = {}
+    for repeat_record in repeat_records:
+        records_by_payload.setdefault(repeat_record.payload_id, []).append(repeat_record)
+    return list(records_by_payload.values())
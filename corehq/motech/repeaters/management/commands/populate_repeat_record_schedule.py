@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from dimagi.utils.chunked import chunked
+from dimagi.utils.parsing import string_to_utc_datetime
+
+from corehq.motech.repeaters.models import RepeatRecord
+from corehq.motech.repeaters.schedule import (
+    clear_schedule,
+    schedule_record_ids,
+)
+from corehq.util.couch_helpers import paginate_view
+
+
+class Command(BaseCommand):
+    help = """
+    Add the waiting repeat records to the repeat record schedule. Run this
+    after setting USE_REPEAT_RECORD_SCHEDULE (with --clear if it was set
+    before), and after changing CHECK_REPEATERS_PARTITION_COUNT.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Remove all repeat records from the schedule first',
+        )
+
+    def handle(self, clear, **options):
+        if clear:
+            clear_schedule()
+        rows = paginate_view(
+            RepeatRecord.get_db(),
+            'repeaters/repeat_records_by_next_check',
+            chunk_size=10000,
+            startkey=[None],
+            endkey=[None, {}],
+            reduce=False,
+            include_docs=False,
+        )
+        count = 0
+        for chunk in chunked(rows, 1000):
+            schedule_record_ids({
+                row['id']: string_to_utc_datetime(row['key'][1])
+                for row in chunk
+            })
+            count += len(chunk)
+        print(f"Scheduled {count} repeat records")
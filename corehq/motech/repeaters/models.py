@@ -68,10 +68,12 @@ import json
 import traceback
 import uuid
 import warnings
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Any, Optional
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
+from django.conf import settings
 from django.db import models
 from django.db.models.base import Deferred
 from django.utils import timezone
@@ -152,6 +154,7 @@ from .repeater_generators import (
     ShortFormRepeaterJsonPayloadGenerator,
     UserPayloadGenerator,
 )
+from .schedule import unschedule_record_ids, update_schedule
 
 
 def log_repeater_timeout_in_datadog(domain):
@@ -282,6 +285,9 @@ class Repeater(RepeaterSuperProxy):
 
     _has_config = False
 
+    # See `defer_next_attempt_updates()`
+    _deferred_next_attempt_updates = None
+
     def __str__(self):
         return self.name or self.connection_settings.name
 
@@ -363,6 +369,9 @@ class Repeater(RepeaterSuperProxy):
         return self.repeat_records_ready.exists()
 
     def set_next_attempt(self):
+        if self._deferred_next_attempt_updates is not None:
+            self._deferred_next_attempt_updates.add('set')
+            return
         now = datetime.utcnow()
         interval = _get_retry_interval(self.last_attempt_at, now)
         self.last_attempt_at = now
@@ -370,11 +379,35 @@ class Repeater(RepeaterSuperProxy):
         self.save()
 
     def reset_next_attempt(self):
+        if self._deferred_next_attempt_updates is not None:
+            self._deferred_next_attempt_updates.add('reset')
+            return
         if self.last_attempt_at or self.next_attempt_at:
             self.last_attempt_at = None
             self.next_attempt_at = None
             self.save()
 
+    @contextmanager
+    def defer_next_attempt_updates(self):
+        """
+        Apply the changes to the repeater's next attempt once, when the
+        context exits, instead of when each repeat record is sent.
+
+        Used when repeat records are sent from several threads, which
+        share this instance: a backoff set by a failure is kept, instead
+        of being cleared by a success that was in flight, and the
+        repeater is not saved by several threads at once.
+        """
+        self._deferred_next_attempt_updates = updates = set()
+        try:
+            yield
+        finally:
+            self._deferred_next_attempt_updates = None
+            if 'set' in updates:
+                self.set_next_attempt()
+            elif 'reset' in updates:
+                self.reset_next_attempt()
+
     def get_attempt_info(self, repeat_record):
         return None
 
@@ -926,6 +959,17 @@ class RepeatRecord(Document):
             )]
         return self
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if settings.USE_REPEAT_RECORD_SCHEDULE:
+            update_schedule(self)
+
+    def delete(self, *args, **kwargs):
+        record_id = self._id
+        super().delete(*args, **kwargs)
+        if settings.USE_REPEAT_RECORD_SCHEDULE:
+            unschedule_record_ids([record_id])
+
     @property
     @memoized
     def repeater(self):
@@ -0,0 +1,130 @@
+"""
+Schedule of waiting repeat records.
+
+``check_repeaters_in_partition`` reads the IDs of all of the waiting
+(Couch) repeat records that are due from the
+"repeaters/repeat_records_by_next_check" view, and keeps the ones in its
+partition, so every partition reads the whole view on every run.
+
+With ``settings.USE_REPEAT_RECORD_SCHEDULE`` enabled, it reads the IDs
+of the due repeat records of its partition from the schedule instead:
+a Redis sorted set for each partition, of the IDs of its waiting repeat
+records scored by their ``next_check``. While the setting is enabled,
+repeat records are added to, moved in and removed from the schedule when
+they are saved and deleted, so reading the due repeat records of a
+partition is proportional to the number that are due.
+
+Use the ``populate_repeat_record_schedule`` management command to add
+existing repeat records to the schedule after enabling it (with
+``--clear`` if it was enabled before), and after changing
+``CHECK_REPEATERS_PARTITION_COUNT``.
+"""
+import zlib
+from datetime import datetime
+
+from dimagi.utils.couch import get_redis_client
+
+from .const import CHECK_REPEATERS_PARTITION_COUNT
+
+SCHEDULE_KEY_PREFIX = 'repeat-record-schedule'
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def get_partition(record_id, partition_count=None):
+    partition_count = partition_count or CHECK_REPEATERS_PARTITION_COUNT
+    # Unlike hash(), stable across processes
+    return zlib.crc32(record_id.encode('utf-8')) % partition_count
+
+
+def get_schedule_key(partition, partition_count=None):
+    partition_count = partition_count or CHECK_REPEATERS_PARTITION_COUNT
+    return f'{SCHEDULE_KEY_PREFIX}:{partition_count}:{partition}'
+
+
+def is_waiting(repeat_record):
+    """Matches the repeat records in "repeat_records_by_next_check" """
+    return bool(
+        not repeat_record.succeeded
+        and repeat_record.next_check
+        and not repeat_record.cancelled
+    )
+
+
+def update_schedule(repeat_record):
+    """Add the repeat record to the schedule at its ``next_check`` if it is
+    waiting, otherwise remove it"""
+    if is_waiting(repeat_record):
+        schedule_record_ids({repeat_record.record_id: repeat_record.next_check})
+    else:
+        unschedule_record_ids([repeat_record.record_id])
+
+
+def schedule_record_ids(next_check_by_record_id):
+    client = _get_client()
+    scores_by_key = {}
+    for record_id, next_check in next_check_by_record_id.items():
+        key = get_schedule_key(get_partition(record_id))
+        scores_by_key.setdefault(key, {})[record_id] = _get_score(next_check)
+    for key, scores in scores_by_key.items():
+        client.zadd(key, scores)
+
+
+def unschedule_record_ids(record_ids):
+    client = _get_client()
+    record_ids_by_key = {}
+    for record_id in record_ids:
+        key = get_schedule_key(get_partition(record_id))
+        record_ids_by_key.setdefault(key, []).append(record_id)
+    for key, key_record_ids in record_ids_by_key.items():
+        client.zrem(key, *key_record_ids)
+
+
+def iter_due_record_ids(partition, due_before, chunk_size=1000):
+    """
+    Yield the IDs of the repeat records in the partition that are due
+    before ``due_before``, in order of their ``next_check``
+
+    Repeat records may be rescheduled while the IDs are being read.
+    """
+    client = _get_client()
+    key = get_schedule_key(partition)
+    max_score = _get_score(due_before)
+    min_score = '-inf'
+    while True:
+        chunk = client.zrangebyscore(key, min_score, max_score, start=0, num=chunk_size, withscores=True)
+        if not chunk:
+            return
+        last_score = chunk[-1][1]
+        record_ids = [record_id for record_id, score in chunk if score < last_score]
+        # all records with the last score, which may not all fit in the chunk
+        record_ids.extend(client.zrangebyscore(key, last_score, last_score))
+        for record_id in record_ids:
+            yield record_id.decode('utf-8')
+        min_score = f'({last_score!r}'
+
+
+def get_due_record_count(due_before):
+    client = _get_client()
+    max_score = _get_score(due_before)
+    return sum(
+        client.zcount(get_schedule_key(partition), '-inf', max_score)
+        for partition in range(CHECK_REPEATERS_PARTITION_COUNT)
+    )
+
+
+def clear_schedule(partition_count=None):
+    partition_count = partition_count or CHECK_REPEATERS_PARTITION_COUNT
+    client = _get_client()
+    client.delete(*[
+        get_schedule_key(partition, partition_count)
+        for partition in range(partition_count)
+    ])
+
+
+def _get_score(next_check):
+    return (next_check - _EPOCH).total_seconds()
+
+
+def _get_client():
+    return get_redis_client().client.get_client()
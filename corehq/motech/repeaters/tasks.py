@@ -11,6 +11,7 @@ from dimagi.utils.couch.undo import DELETED_SUFFIX
 
 from corehq.apps.celery import periodic_task, task
 from corehq.motech.models import RequestLog
+from corehq.toggles import CONCURRENT_REPEATER_DELIVERY
 from corehq.util.metrics import (
     make_buckets_from_timedeltas,
     metrics_counter,
@@ -33,7 +34,9 @@ from .dbaccessors import (
     get_overdue_repeat_record_count,
     iterate_repeat_record_ids,
     iterate_repeat_records_for_ids,
+    iterate_scheduled_repeat_records,
 )
+from .delivery import deliver_concurrently
 from .models import (
     RepeatRecord,
     Repeater,
@@ -94,6 +97,9 @@ def _iterate_record_ids_for_partition(start, partition, total_partitions):
 
 
 def _iterate_repeat_records_for_partition(start, partition, total_partitions):
+    if settings.USE_REPEAT_RECORD_SCHEDULE:
+        yield from iterate_scheduled_repeat_records(partition, start)
+        return
     # chunk the fetching of documents from couch
     for chunked_ids in chunked(_iterate_record_ids_for_partition(start, partition, total_partitions), 1000):
         yield from iterate_repeat_records_for_ids(chunked_ids)
@@ -218,6 +224,10 @@ def process_repeater(repeater_id: int):
     """
     Worker task to send SQLRepeatRecords in chronological order.
 
+    With the CONCURRENT_REPEATER_DELIVERY toggle enabled, the repeat
+    records of different payloads are sent concurrently. (See
+    ``delivery.deliver_concurrently()``.)
+
     This function assumes that ``repeater`` checks have already
     been performed. Call via ``models.attempt_forward_now()``.
     """
@@ -226,6 +236,9 @@ def process_repeater(repeater_id: int):
         [f'process-repeater-{repeater.repeater_id}'],
         fail_hard=False, block=False, timeout=5 * 60 * 60,
     ):
+        if CONCURRENT_REPEATER_DELIVERY.enabled(repeater.domain):
+            deliver_concurrently(repeater)
+            return
         for repeat_record in repeater.repeat_records_ready[:RECORDS_AT_A_TIME]:
             try:
                 payload = get_payload(repeater, repeat_record)
@@ -0,0 +1,103 @@
+import threading
+from collections import defaultdict
+from unittest.mock import MagicMock, Mock, patch
+
+from django.test import SimpleTestCase
+
+from ..delivery import ConcurrentDelivery
+
+DOMAIN = 'concurrent-delivery'
+
+
+class FakeRepeatRecord(object):
+
+    def __init__(self, id, payload_id):
+        self.id = id
+        self.payload_id = payload_id
+
+    def __repr__(self):
+        return f'FakeRepeatRecord({self.id!r}, {self.payload_id!r})'
+
+
+class ConcurrentDeliveryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.repeater = MagicMock(domain=DOMAIN, connection_settings_id=1)
+        self.lock = threading.Lock()
+        self.sent = []
+        # payload ID: repeat record ID to fail
+        self.fail = {}
+        self.allow_usage = True
+        for name, target in [
+            ('get_payload', lambda repeater, record: record.id),
+            ('send_request', self._send_request),
+            ('metrics_counter', Mock()),
+            ('repeater_endpoint_rate_limiter', Mock(wait=lambda *args, **kwargs: self.allow_usage)),
+        ]:
+            patcher = patch(f'corehq.motech.repeaters.delivery.{name}', target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _send_request(self, repeater, repeat_record, payload):
+        with self.lock:
+            self.sent.append(repeat_record)
+        return self.fail.get(repeat_record.payload_id) != repeat_record.id
+
+    def _deliver(self, repeat_records, max_workers=4):
+        ConcurrentDelivery(self.repeater, repeat_records).run(max_workers)
+        sent_by_payload = defaultdict(list)
+        for repeat_record in self.sent:
+            sent_by_payload[repeat_record.payload_id].append(repeat_record.id)
+        return dict(sent_by_payload)
+
+    def test_records_of_a_payload_are_sent_in_order(self):
+        repeat_records = [
+            FakeRepeatRecord(i, payload_id)
+            for i, payload_id in enumerate(['a', 'b', 'a', 'c', 'b', 'a', 'd'])
+        ]
+        self.assertEqual(self._deliver(repeat_records), {
+            'a': [0, 2, 5],
+            'b': [1, 4],
+            'c': [3],
+            'd': [6],
+        })
+
+    def test_requests_are_concurrent(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def send_request(repeater, repeat_record, payload):
+            # fails with BrokenBarrierError unless 3 requests are in flight
+            barrier.wait()
+            return True
+
+        repeat_records = [FakeRepeatRecord(i, payload_id) for i, payload_id in enumerate('abc')]
+        with patch('corehq.motech.repeaters.delivery.send_request', send_request):
+            ConcurrentDelivery(self.repeater, repeat_records).run(max_workers=3)
+
+    def test_failure_stops_delivery(self):
+        self.fail = {'a': 1}
+        repeat_records = [FakeRepeatRecord(i, 'a') for i in range(3)]
+        repeat_records += [FakeRepeatRecord(i, 'b') for i in range(3, 6)]
+        # the records after the failed one are not sent, nor are the
+        # records of other payloads
+        self.assertEqual(self._deliver(repeat_records, max_workers=1), {'a': [0, 1]})
+
+    def test_payload_error_skips_record(self):
+        def get_payload(repeater, repeat_record):
+            if repeat_record.id == 1:
+                raise ValueError
+            return repeat_record.id
+
+        repeat_records = [FakeRepeatRecord(i, 'a') for i in range(3)]
+        with patch('corehq.motech.repeaters.delivery.get_payload', get_payload):
+            self.assertEqual(self._deliver(repeat_records), {'a': [0, 2]})
+
+    def test_rate_limited(self):
+        self.allow_usage = False
+        repeat_records = [FakeRepeatRecord(i, payload_id) for i, payload_id in enumerate('abc')]
+        self.assertEqual(self._deliver(repeat_records), {})
+
+    def test_next_attempt_updates_are_deferred(self):
+        repeat_records = [FakeRepeatRecord(i, payload_id) for i, payload_id in enumerate('ab')]
+        self._deliver(repeat_records)
+        self.repeater.defer_next_attempt_updates.assert_called_once_with()
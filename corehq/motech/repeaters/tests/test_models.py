@@ -399,6 +399,28 @@ class AddAttemptsTests(RepeaterTestCase):
         self.assertEqual(self.repeat_record.attempts[0].message, message)
         self.assertEqual(self.repeat_record.attempts[0].traceback, tb_str)
 
+    def test_deferred_backoff_is_not_cleared_by_success(self):
+        other_record = self.repeater.repeat_records.create(
+            domain=DOMAIN,
+            payload_id='spam',
+            registered_at=timezone.now(),
+        )
+        with self.repeater.defer_next_attempt_updates():
+            self.repeat_record.add_server_failure_attempt(message='504: Gateway Timeout')
+            other_record.add_success_attempt(response=True)
+            self.assertEqual(self.repeater.next_attempt_at, self.just_now)
+        self.repeater.refresh_from_db()
+        self.assertGreater(self.repeater.last_attempt_at, self.just_now)
+        self.assertEqual(self.repeater.next_attempt_at,
+                         self.repeater.last_attempt_at + MIN_RETRY_WAIT)
+
+    def test_deferred_reset(self):
+        with self.repeater.defer_next_attempt_updates():
+            self.repeat_record.add_success_attempt(response=True)
+            self.assertEqual(self.repeater.next_attempt_at, self.just_now)
+        self.repeater.refresh_from_db()
+        self.assertIsNone(self.repeater.next_attempt_at)
+
 
 class TestAreRepeatRecordsMigrated(RepeaterTestCase):
 
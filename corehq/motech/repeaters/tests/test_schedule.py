@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from ..dbaccessors import get_overdue_repeat_record_count
+from ..schedule import (
+    clear_schedule,
+    get_due_record_count,
+    get_partition,
+    iter_due_record_ids,
+    schedule_record_ids,
+    unschedule_record_ids,
+    update_schedule,
+)
+
+
+class FakeRepeatRecord(object):
+
+    def __init__(self, record_id, next_check, succeeded=False, cancelled=False):
+        self.record_id = record_id
+        self.next_check = next_check
+        self.succeeded = succeeded
+        self.cancelled = cancelled
+
+
+class RepeatRecordScheduleTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = datetime.utcnow()
+        self.addCleanup(clear_schedule)
+
+    def _due_record_ids(self, partition=0, **kwargs):
+        return list(iter_due_record_ids(partition, self.now, **kwargs))
+
+    def test_due_records_in_next_check_order(self):
+        schedule_record_ids({
+            'later': self.now - timedelta(minutes=1),
+            'first': self.now - timedelta(hours=1),
+            'not-due': self.now + timedelta(minutes=1),
+        })
+        self.assertEqual(self._due_record_ids(), ['first', 'later'])
+        self.assertEqual(get_due_record_count(self.now), 2)
+
+    def test_chunks(self):
+        next_checks = {f'record{i:02}': self.now - timedelta(minutes=i // 2) for i in range(20)}
+        schedule_record_ids(next_checks)
+        record_ids = self._due_record_ids(chunk_size=3)
+        self.assertEqual(len(record_ids), 20)
+        self.assertEqual(record_ids, sorted(record_ids, key=next_checks.get))
+
+    def test_rescheduled_while_reading(self):
+        schedule_record_ids({f'record{i}': self.now - timedelta(minutes=10 - i) for i in range(5)})
+        record_ids = []
+        for record_id in iter_due_record_ids(0, self.now, chunk_size=2):
+            record_ids.append(record_id)
+            update_schedule(FakeRepeatRecord(record_id, self.now + timedelta(hours=48)))
+        self.assertEqual(record_ids, [f'record{i}' for i in range(5)])
+        self.assertEqual(self._due_record_ids(), [])
+
+    def test_update_schedule(self):
+        update_schedule(FakeRepeatRecord('waiting', self.now))
+        update_schedule(FakeRepeatRecord('succeeded', self.now))
+        update_schedule(FakeRepeatRecord('succeeded', self.now, succeeded=True))
+        update_schedule(FakeRepeatRecord('cancelled', self.now, cancelled=True))
+        update_schedule(FakeRepeatRecord('no-next-check', None))
+        self.assertEqual(self._due_record_ids(), ['waiting'])
+        unschedule_record_ids(['waiting'])
+        self.assertEqual(self._due_record_ids(), [])
+
+    def test_partitions(self):
+        record_ids = [f'record{i}' for i in range(20)]
+        with patch('corehq.motech.repeaters.schedule.CHECK_REPEATERS_PARTITION_COUNT', 3):
+            schedule_record_ids({record_id: self.now for record_id in record_ids})
+            due_by_partition = [
+                set(iter_due_record_ids(partition, self.now)) for partition in range(3)
+            ]
+            self.assertEqual(get_due_record_count(self.now), 20)
+            clear_schedule()
+        for partition, due in enumerate(due_by_partition):
+            self.assertEqual(due, {r for r in record_ids if get_partition(r, 3) == partition})
+
+    @override_settings(USE_REPEAT_RECORD_SCHEDULE=True)
+    def test_overdue_count(self):
+        schedule_record_ids({
+            'overdue': self.now - timedelta(hours=1),
+            'due': self.now - timedelta(minutes=1),
+        })
+        self.assertEqual(get_overdue_repeat_record_count(), 1)
@@ -1,4 +1,6 @@
 import logging
+import threading
+from contextlib import contextmanager
 from functools import wraps
 from typing import Callable, Optional
 
@@ -32,6 +34,8 @@ from corehq.util.urlvalidate.urlvalidate import (
 )
 from corehq.util.view_utils import absolute_reverse
 
+_session_pool = threading.local()
+
 
 def log_request(self, func, logger):
 
@@ -77,6 +81,40 @@ def log_request(self, func, logger):
     return request_wrapper
 
 
+@contextmanager
+def session_pool():
+    """
+    Reuse sessions, and so their connections, for the requests sent by
+    the current thread in this context, instead of opening a session
+    for each request.
+
+    Sessions are reused by domain and auth manager class, so requests in
+    this context must all be sent to the same remote API, with the same
+    credentials.
+    """
+    if getattr(_session_pool, 'sessions', None) is not None:
+        # already pooled
+        yield
+        return
+    _session_pool.sessions = {}
+    try:
+        yield
+    finally:
+        sessions, _session_pool.sessions = _session_pool.sessions, None
+        for session in sessions.values():
+            session.close()
+
+
+def _get_pooled_session(domain_name, auth_manager):
+    sessions = getattr(_session_pool, 'sessions', None)
+    if sessions is None:
+        return None
+    key = (domain_name, auth_manager.__class__)
+    if key not in sessions:
+        sessions[key] = auth_manager.get_session(domain_name)
+    return sessions[key]
+
+
 class Requests(object):
     """
     Wraps the requests library to simplify use with JSON REST APIs.
@@ -137,8 +175,9 @@ class Requests(object):
         if not self.verify:
             kwargs['verify'] = False
         kwargs.setdefault('timeout', REQUEST_TIMEOUT)
-        if self._session:
-            response = self._session.request(method, url, *args, **kwargs)
+        session = self._session or _get_pooled_session(self.domain_name, self.auth_manager)
+        if session:
+            response = session.request(method, url, *args, **kwargs)
         else:
             # Mimics the behaviour of requests.api.request()
             with self:
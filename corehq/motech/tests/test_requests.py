@@ -11,7 +11,7 @@ from unittest.mock import patch
 from corehq.motech.auth import AuthManager, BasicAuthManager, DigestAuthManager
 from corehq.motech.const import OAUTH2_PWD, REQUEST_TIMEOUT
 from corehq.motech.models import ConnectionSettings
-from corehq.motech.requests import get_basic_requests
+from corehq.motech.requests import get_basic_requests, session_pool
 from corehq.motech.views import ConnectionSettingsListView
 from corehq.util.urlvalidate.urlvalidate import PossibleSSRFAttempt
 from corehq.util.urlvalidate.ip_resolver import CannotResolveHost
@@ -138,6 +138,20 @@ class SessionTests(SimpleTestCase):
         req.get('me')
         self.assertEqual(self.close_mock.call_count, 2)
 
+    def test_session_pool(self):
+        """
+        Requests in a session pool should share a session
+        """
+        with session_pool():
+            for __ in range(3):
+                req = get_basic_requests(
+                    DOMAIN, BASE_URL, USERNAME, PASSWORD,
+                    logger=noop_logger
+                )
+                req.get('me')
+            self.assertEqual(self.close_mock.call_count, 0)
+        self.assertEqual(self.close_mock.call_count, 1)
+
 
 class NotifyErrorTests(SimpleTestCase):
 
@@ -1,6 +1,11 @@
+from unittest.mock import MagicMock, patch
+
 from django.test import SimpleTestCase
 
-from corehq.sql_db.util import create_unique_index_name
+from corehq.sql_db.util import (
+    create_unique_index_name,
+    paginate_query_across_partitioned_databases_concurrently,
+)
 
 
 class TestCreateUniqueIndexName(SimpleTestCase):
@@ -42,3 +47,45 @@ class TestCreateUniqueIndexName(SimpleTestCase):
     def test_raises_error_if_fields_is_not_a_list(self):
         with self.assertRaises(AssertionError):
             create_unique_index_name('app', 'table', 'field_one')
+
+
+class TestPaginateQueryConcurrently(SimpleTestCase):
+
+    rows_by_db = {
+        'p1': [(pk, 'p1-{}'.format(pk)) for pk in range(1, 30, 3)],
+        'p2': [(pk, 'p2-{}'.format(pk)) for pk in range(2, 30, 3)],
+        'p3': [],
+    }
+
+    def _paginate(self, iter_rows=None, **kwargs):
+        def default_iter_rows(db_name, **kw):
+            yield from self.rows_by_db[db_name]
+
+        with patch('corehq.sql_db.util.get_db_aliases_for_partitioned_query',
+                   return_value=list(self.rows_by_db)), \
+                patch('corehq.sql_db.util._iter_query_rows', iter_rows or default_iter_rows), \
+                patch('corehq.sql_db.util.connections', MagicMock()):
+            return list(paginate_query_across_partitioned_databases_concurrently(
+                MagicMock(), MagicMock(), query_size=4, **kwargs
+            ))
+
+    def test_ordered_merge(self):
+        rows = self._paginate(ordered=True)
+        self.assertEqual(rows, [row for pk, row in sorted(
+            self.rows_by_db['p1'] + self.rows_by_db['p2']
+        )])
+
+    def test_interleaved(self):
+        rows = self._paginate(max_workers=1)
+        self.assertEqual(sorted(rows), sorted(
+            row for rows in self.rows_by_db.values() for pk, row in rows
+        ))
+
+    def test_error_is_raised(self):
+        def iter_rows(db_name, **kw):
+            yield from self.rows_by_db[db_name]
+            if db_name == 'p2':
+                raise ValueError(db_name)
+
+        with self.assertRaises(ValueError):
+            self._paginate(iter_rows=iter_rows)
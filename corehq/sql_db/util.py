@@ -1,10 +1,16 @@
 import hashlib
+import heapq
+import queue
 import random
 import re
+import threading
 import uuid
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from looseversion import LooseVersion
-from functools import wraps
+from functools import partial, wraps
+from operator import itemgetter
 
 from django.conf import settings
 from django.db import OperationalError, connections, transaction
@@ -12,6 +18,7 @@ from django.db.utils import DEFAULT_DB_ALIAS, DatabaseError
 from django.db.utils import InterfaceError as DjangoInterfaceError
 
 from corehq.sql_db.config import plproxy_config, plproxy_standby_config
+from dimagi.utils.chunked import chunked
 from corehq.util.metrics.load_counters import load_counter_for_model
 from corehq.util.quickcache import quickcache
 from memoized import memoized
@@ -90,6 +97,65 @@ def paginate_query(db_name, model_class, q_expression, annotate=None, query_size
     :return: A generator with the results
     """
 
+    for value, row in _iter_query_rows(db_name, model_class, q_expression, annotate, query_size, values,
+                                       load_source):
+        yield row
+
+
+def paginate_query_across_partitioned_databases_concurrently(
+        model_class, q_expression, annotate=None, query_size=5000, values=None, load_source=None,
+        ordered=False, server_side_cursor=False, max_workers=None, prefetch_pages=2):
+    """
+    Like ``paginate_query_across_partitioned_databases`` but with the
+    partitioned databases queried concurrently, each by its own thread.
+
+    Each thread reads up to ``prefetch_pages`` pages of ``query_size``
+    results ahead of the consumer of the generator.
+
+    :param ordered: If True, results are merged in primary key order across
+    databases. Otherwise results are produced in the order they arrive.
+    All databases are queried at the same time in ordered mode.
+
+    :param server_side_cursor: If True, stream results from a single query
+    per database through a server-side cursor rather than one query per
+    page. Only suitable when concurrent writes need not be seen.
+
+    :param max_workers: Number of threads (default: one per database).
+    Ignored in ordered mode.
+
+    :return: A generator with the results
+    """
+    db_names = get_db_aliases_for_partitioned_query()
+    if ordered:
+        max_workers = len(db_names)
+    scan = _ConcurrentShardScan(
+        db_names,
+        partial(
+            _iter_query_rows,
+            model_class=model_class,
+            q_expression=q_expression,
+            annotate=annotate,
+            query_size=query_size,
+            values=values,
+            load_source=load_source,
+            server_side_cursor=server_side_cursor,
+        ),
+        page_size=query_size,
+        prefetch_pages=prefetch_pages,
+        ordered=ordered,
+    )
+    with scan.start(max_workers or len(db_names)):
+        if ordered:
+            rows = heapq.merge(*(scan.iter_db_rows(db_name) for db_name in db_names), key=itemgetter(0))
+        else:
+            rows = scan.iter_rows()
+        for value, row in rows:
+            yield row
+
+
+def _iter_query_rows(db_name, model_class, q_expression, annotate=None, query_size=5000, values=None,
+                     load_source=None, server_side_cursor=False):
+    """Iterate over ``(pk, result)`` tuples in primary key order"""
     track_load = load_counter_for_model(model_class)(load_source, None)
     sort_col = 'pk'
 
@@ -106,17 +172,23 @@ def paginate_query(db_name, model_class, q_expression, annotate=None, query_size
     if return_values:
         qs = qs.values_list(*return_values)
 
+    def get_row(row):
+        track_load()
+        if return_values:
+            return row[0], row[1:]
+        return row.pk, row
+
+    if server_side_cursor:
+        for row in qs.iterator(chunk_size=query_size):
+            yield get_row(row)
+        return
+
     filter_expression = {}
     while True:
         results = qs.filter(**filter_expression)[:query_size]
         for row in results:
-            track_load()
-            if return_values:
-                value = row[0]
-                yield row[1:]
-            else:
-                value = row.pk
-                yield row
+            value, row = get_row(row)
+            yield value, row
 
         if len(results) < query_size:
             break
@@ -124,6 +196,85 @@ def paginate_query(db_name, model_class, q_expression, annotate=None, query_size
         filter_expression = {'{}__gt'.format(sort_col): value}
 
 
+class _ConcurrentShardScan(object):
+    """Runs a row iterator for each database in a thread pool, passing
+    pages of rows to the consuming thread through bounded queues"""
+    _done = object()
+
+    def __init__(self, db_names, iter_rows, page_size, prefetch_pages, ordered):
+        self.db_names = db_names
+        self.iter_rows_for_db = iter_rows
+        self.page_size = page_size
+        self.ordered = ordered
+        if ordered:
+            self.queues = {db_name: queue.Queue(maxsize=prefetch_pages) for db_name in db_names}
+        else:
+            # pages of all databases, in the order they are read
+            self.pages = queue.Queue(maxsize=prefetch_pages * len(db_names))
+        self.stopped = threading.Event()
+
+    @contextmanager
+    def start(self, max_workers):
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shard-scan')
+        self.futures = [executor.submit(self._scan, db_name) for db_name in self.db_names]
+        try:
+            yield
+        finally:
+            self.stopped.set()
+            executor.shutdown(wait=True)
+
+    def iter_rows(self):
+        """Iterate over the rows of all databases as they are read (unordered mode)"""
+        remaining = len(self.db_names)
+        while remaining:
+            db_name, page = self.pages.get()
+            self._raise_for_error(page)
+            if page is self._done:
+                remaining -= 1
+                continue
+            yield from page
+
+    def iter_db_rows(self, db_name):
+        """Iterate over the rows of one database (ordered mode)"""
+        db_queue = self.queues[db_name]
+        while True:
+            page = db_queue.get()
+            self._raise_for_error(page)
+            if page is self._done:
+                return
+            yield from page
+
+    def _scan(self, db_name):
+        try:
+            for page in chunked(self.iter_rows_for_db(db_name), self.page_size, list):
+                if not self._put(db_name, page):
+                    return
+            self._put(db_name, self._done)
+        except Exception as e:
+            self._put(db_name, e)
+        finally:
+            connections[db_name].close()
+
+    def _put(self, db_name, item):
+        # wait for space as long as the consumer has not stopped
+        if self.ordered:
+            target, value = self.queues[db_name], item
+        else:
+            target, value = self.pages, (db_name, item)
+        while not self.stopped.is_set():
+            try:
+                target.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    @staticmethod
+    def _raise_for_error(page):
+        if isinstance(page, Exception):
+            raise page
+
+
 def estimate_partitioned_row_count(model_class, q_expression):
     """Estimate query row count summed across all partitions"""
     db_names = get_db_aliases_for_partitioned_query()
@@ -1921,6 +1921,198 @@ LIVEQUERY_READ_FROM_STANDBYS = DynamicallyPredictablyRandomToggle(
     """
 )
 
+LIVEQUERY_PIPELINED_RESTORE = DynamicallyPredictablyRandomToggle(
+    'livequery_pipelined_restore',
+    'Fetch cases for asynchronous restores concurrently with rendering the restore payload',
+    TAG_INTERNAL,
+    [NAMESPACE_USER],
+    description="""
+    Large asynchronous restores fetch the next batches of cases in
+    worker threads while the current batch is rendered to XML.
+    """
+)
+
+LIVEQUERY_INCREMENTAL_CLOSURE = DynamicallyPredictablyRandomToggle(
+    'livequery_incremental_closure',
+    'Reuse the case graph from the previous sync when computing the livequery case closure',
+    TAG_INTERNAL,
+    [NAMESPACE_USER],
+    description="""
+    Persist a snapshot of the case index graph after each restore and
+    only re-read the parts of the graph that changed since then on the
+    next restore.
+    """
+)
+
+COMPACT_SYNCLOG_FOOTPRINT = StaticToggle(
+    'compact_synclog_footprint',
+    'Store the case footprint of sync logs in a compact binary encoding',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Reduces the size of sync log rows and the time to load and save
+    them for users with many cases on the phone.
+    """
+)
+
+RESTORE_CASE_XML_CACHE = StaticToggle(
+    'restore_case_xml_cache',
+    'Cache rendered case XML to share it between restores',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Useful for projects where many users sync the same cases, for
+    example through location based case sharing.
+    """
+)
+
+UCR_SHARED_EXPRESSIONS = StaticToggle(
+    'ucr_shared_expressions',
+    'Evaluate expressions shared by UCR data sources once per document',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    For projects with many data sources over the same document type.
+    Takes effect when the UCR pillows next bootstrap.
+    """
+)
+
+UCR_RELATED_DOC_PREFETCH = StaticToggle(
+    'ucr_related_doc_prefetch',
+    'Load documents referenced by UCR related_doc expressions in bulk',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Applies to the UCR pillow and to data source rebuilds. Related
+    documents are loaded once for each chunk of documents processed
+    instead of once per document.
+    """
+)
+
+UCR_PARALLEL_REBUILD = StaticToggle(
+    'ucr_parallel_rebuild',
+    'Allow rebuilding form and case data sources with parallel tasks',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Adds a "Rebuild Data Source in Parallel" option to the data source
+    page. Documents are split by database shard and ID range across
+    several tasks, and progress is saved per range so that the rebuild
+    can be resumed.
+    """
+)
+
+BULK_FORM_SUBMISSION = StaticToggle(
+    'bulk_form_submission',
+    'Allow submitting many forms in one request to the bulk submission API',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Enables the receiver/api/bulk/ endpoint, which accepts up to 1000
+    forms per request and returns the result of each form.
+    """
+)
+
+EXPORT_SLICED_SCROLL = StaticToggle(
+    'export_sliced_scroll',
+    'Fetch export documents with concurrent sliced scrolls',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Exports fetch their documents from Elasticsearch with several
+    concurrent scrolls (one per slice of the query) in a single pass,
+    instead of saving the IDs of all documents to disk and fetching the
+    documents by ID. Requires Elasticsearch 5 or later.
+    """
+)
+
+INCREMENTAL_SAVED_EXPORTS = StaticToggle(
+    'incremental_saved_exports',
+    'Rebuild daily saved exports incrementally',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Daily saved form and case exports save the rows of each of their
+    documents, and only fetch the documents modified since their last
+    rebuild. They are still rebuilt in full when their configuration
+    changes, when many of their documents changed, and at least weekly.
+    """
+)
+
+EXPORT_PARQUET_FORMAT = StaticToggle(
+    'export_parquet_format',
+    'Allow exports in the Parquet format',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Adds "Parquet (Zip file)" to the file formats of form and case exports.
+    Each table is exported to a Parquet file with typed columns, for
+    loading into data warehouses.
+    """
+)
+
+CONCURRENT_REPEATER_DELIVERY = StaticToggle(
+    'concurrent_repeater_delivery',
+    'Send repeat records with concurrent requests',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Repeaters send the repeat records of different payloads concurrently,
+    up to settings.REPEATER_MAX_CONCURRENT_REQUESTS at a time, subject to
+    the rate limits of their connection settings. The repeat records of
+    the same payload are still sent in order.
+    """
+)
+
+CASE_IMPORTER_LOOKAHEAD = StaticToggle(
+    'case_importer_lookahead',
+    'Look up the cases of case imports in bulk',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    The case importer looks up the cases, parent cases and owners of the
+    rows of a spreadsheet in batches of rows, instead of one row at a
+    time.
+    """
+)
+
+CASE_IMPORTER_PIPELINE = StaticToggle(
+    'case_importer_pipeline',
+    'Submit the cases of case imports concurrently',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    The case importer submits chunks of cases from a few threads while
+    it goes on to read the next rows of the spreadsheet, instead of
+    waiting for each chunk to be processed.
+    """
+)
+
+LOOKUP_TABLE_FIXTURE_BUCKETS = StaticToggle(
+    'lookup_table_fixture_buckets',
+    'Cache the lookup table fixtures of owners',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Lookup table fixtures of rows that are owned by users, groups and
+    locations are rendered once for each combination of owners of a
+    table, and cached until the lookup tables of the domain are changed,
+    instead of being rendered for each restore.
+    """
+)
+
+LOCATION_FIXTURE_FRAGMENTS = StaticToggle(
+    'location_fixture_fragments',
+    'Cache the rendered locations of location fixtures',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Location fixtures are assembled from the cached XML of each location,
+    so only the locations that changed since they were last rendered are
+    rendered again. Useful for projects with large location hierarchies.
+    """
+)
+
 ACCOUNTING_TESTING_TOOLS = StaticToggle(
     'accounting_testing_tools',
     'Enable Accounting Testing Tools',
@@ -840,6 +840,19 @@ REPEATERS_WHITELIST = None
 # how many tasks to split the check_repeaters process into
 CHECK_REPEATERS_PARTITION_COUNT = 1
 
+# how many requests a repeater may have in flight at once, for domains with
+# the CONCURRENT_REPEATER_DELIVERY toggle enabled
+REPEATER_MAX_CONCURRENT_REQUESTS = 4
+
+# read due repeat records from the schedule in Redis instead of a couch view
+# (then populate it with the populate_repeat_record_schedule command)
+USE_REPEAT_RECORD_SCHEDULE = False
+
+# query location ancestors and descendants from the location closure table
+# instead of recursive queries (populate it first with the
+# populate_location_closure command)
+USE_LOCATION_CLOSURE_TABLE = False
+
 # If ENABLE_PRELOGIN_SITE is set to true, redirect to Dimagi.com urls
 ENABLE_PRELOGIN_SITE = False
 
@@ -855,6 +868,9 @@ ELASTICSEARCH_PORT = 9200
 ELASTICSEARCH_MAJOR_VERSION = 2
 # If elasticsearch queries take more than this, they result in timeout errors
 ES_SEARCH_TIMEOUT = 30
+# Send pillow bulk changes to elasticsearch in requests sized by bytes and latency
+# (see corehq.apps.es.client.AdaptiveBulkIndexer)
+ES_ADAPTIVE_BULK_INDEXING = False
 
 # The variables should be used while reindexing an index.
 # When the variables are set to true the data will be written to both primary and secondary indexes.